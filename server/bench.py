@@ -0,0 +1,424 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+import harmonize
+from jsonstream import write_records
+from prereq_parser import parse
+import search
+import synth
+
+"""
+times the data pipeline on synth.py's fake inputs:
+
+  read_semesters    read_semester_file over every semester file, then merge_semesters
+  sync_classes      one document per course
+  parse_grades      parse_grade_files (one process per file)
+  add_grades        grade rows onto courses by CRN
+  sync_grades       per-instructor averages
+  geneds            build_course_index + add_geneds
+  prereqs           add_prereqs
+  finalize          fullTitle, detailId, int course codes
+  prereq_graph      add_prereq_graph
+  write             write_records of the whole catalog
+  prereq_parse      prereq_parser.parse over every prerequisite text
+  push_load         push.py's document writes (its "load" stage)
+  push              all of push.py: writes, index build and alias swap (needs RediSearch)
+  search_build      search.SearchIndex over the catalog
+  search            -queries searches like the site's (title words, prefixes, course numbers,
+                    instructors, subject pages) against the in-memory index
+  search_redis      the same searches against idx:classes (needs RediSearch), printed with
+                    how often the two agree
+
+each stage's best time over -repeat runs is appended to -results along with the commit and
+scale, and compared with the last run at the same scale:
+
+  python3 bench.py -semesters 15 -courses 10000
+  python3 bench.py -semesters 60 -courses 100000 -redis localhost:6380
+
+the inputs are generated into -data the first time and reused while the scale matches.
+
+the Redis stages run against a throwaway Redis Stack started on a free port for the run:
+redis-stack-server, or redis-server with the modules in /opt/redis-stack/lib like script.sh.
+without either, push.py's writes are timed against fakeredis, which has RedisJSON but not
+RediSearch, so push stops before building the index and push and search_redis are left out.
+fakeredis runs in Python, so its push_load is only comparable with other fakeredis runs.
+-redis uses an existing server instead; it must be a scratch Redis Stack, since push.py
+repoints its idx:classes alias and drops the older generations. -no-redis skips them all.
+"""
+
+stages = ["read_semesters", "sync_classes", "parse_grades", "add_grades", "sync_grades", "geneds",
+          "prereqs", "finalize", "prereq_graph", "write", "prereq_parse", "push_load", "push", "search_build", "search",
+          "search_redis"]
+redis_stack_modules = "/opt/redis-stack/lib"
+schedule_types = ["Clinic", "Distance Learning", "Experiential", "Individual Study", "Laboratory", "Laboratory Preparation",
+                  "Lecture", "Practice Study Observation", "Presentation", "Recitation", "Research", "Studio"]
+
+
+class Timer:
+    def __init__(self):
+        self.times = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        yield
+        self.times[name] = time.perf_counter() - start
+
+
+def ensure_data(args):
+    """
+    generates the inputs unless -data already holds them at the requested scale
+    """
+    scale = {"semesters": args.semesters, "courses": args.courses, "grade_semesters": args.grade_semesters, "seed": args.seed, "format": args.format}
+    try:
+        with open(os.path.join(args.data, "synth.json")) as f:
+            existing = json.load(f)
+        if {key: existing.get(key) for key in scale} == scale:
+            return existing["records"]
+    except (FileNotFoundError, ValueError):
+        pass
+    print(f"generating {args.courses} courses over {args.semesters} semesters into {args.data}...")
+    return synth.generate(args.data, args.semesters, args.courses, args.grade_semesters, args.seed, args.format)
+
+
+def run_harmonize(timer, data, outfile, workers):
+    folder = os.path.join(data, "data") + "/"
+    gradefolder = os.path.join(folder, "grades") + "/"
+
+    with timer.stage("read_semesters"):
+        grouped = harmonize.merge_semesters([harmonize.read_semester_file(folder + name) for name in harmonize.list_inputs(folder)])
+    with timer.stage("sync_classes"):
+        course_data = list(harmonize.sync_classes(grouped).values())
+    with timer.stage("parse_grades"):
+        grade_rows = harmonize.parse_grade_files([gradefolder + name for name in harmonize.list_inputs(gradefolder)], workers)
+    with timer.stage("add_grades"):
+        harmonize.add_grades(course_data, grade_rows)
+    with timer.stage("sync_grades"):
+        harmonize.sync_grades(course_data)
+    with timer.stage("geneds"):
+        course_index = harmonize.build_course_index(course_data)
+        harmonize.add_geneds(course_data, harmonize.load_json(folder + "gened/classes_gened.json"), course_index)
+    with timer.stage("prereqs"):
+        harmonize.add_prereqs(course_data, harmonize.load_json(folder + "prereqs/classes_prereqs.json"), course_index)
+    with timer.stage("finalize"):
+        harmonize.finalize(course_data)
+    with timer.stage("prereq_graph"):
+        harmonize.add_prereq_graph(course_data)
+    with timer.stage("write"):
+        write_records(outfile, course_data)
+    return course_data
+
+
+def run_prereq_parse(timer, data, course_data):
+    with open(os.path.join(data, "data", "prereqs", "prereq_texts.json")) as f:
+        texts = list(json.load(f).values())
+    ids = {}
+    for course in course_data:
+        ids.setdefault((course["subjectCode"], str(course["courseCode"])), course["detailId"])
+    resolve = lambda subject, number: ids.get((subject, number))
+    with timer.stage("prereq_parse"):
+        for text in texts:
+            parse(text, resolve)
+
+
+def redis_ready(host, port):
+    """
+    None if host:port runs Redis with the search module, otherwise why not
+    """
+    try:
+        import redis
+        r = redis.Redis(host=host, port=port, socket_connect_timeout=2)
+        modules = r.execute_command("MODULE", "LIST")
+    except Exception as e:
+        return f"no Redis at {host}:{port} ({e})"
+    names = set()
+    for module in modules:
+        info = module if isinstance(module, dict) else dict(zip(module[::2], module[1::2]))
+        name = info.get(b"name", info.get("name", b""))
+        names.add(name.decode() if isinstance(name, bytes) else name)
+    if "search" not in names or "ReJSON" not in names:
+        return f"{host}:{port} lacks RediSearch or RedisJSON"
+    return None
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_redis(tmp):
+    """
+    starts a throwaway Redis Stack; returns (process, "host:port"), or None if there is no
+    Redis Stack to start
+    """
+    port = free_port()
+    # nothing is saved, the data goes away with the process
+    options = ["--port", str(port), "--bind", "127.0.0.1", "--save", "", "--appendonly", "no", "--dir", tmp]
+    if shutil.which("redis-stack-server") is not None:
+        command = ["redis-stack-server", *options]
+    elif shutil.which("redis-server") is not None and os.path.exists(os.path.join(redis_stack_modules, "redisearch.so")):
+        command = ["redis-server", *options,
+                   "--loadmodule", os.path.join(redis_stack_modules, "redisearch.so"),
+                   "--loadmodule", os.path.join(redis_stack_modules, "rejson.so")]
+    else:
+        return None
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 15
+    while True:
+        reason = redis_ready("127.0.0.1", port)
+        if reason is None:
+            return process, f"127.0.0.1:{port}"
+        if process.poll() is not None or time.monotonic() > deadline:
+            process.kill()
+            process.wait()
+            print(f"couldn't start {command[0]}: {reason}")
+            return None
+        time.sleep(0.1)
+
+
+def start_fakeredis():
+    """
+    serves fakeredis over TCP from a thread, so push.py can connect to it like to Redis.
+    returns (server, "host:port"), or None if fakeredis isn't installed
+    """
+    try:
+        from fakeredis import TcpFakeServer
+    except ImportError:
+        return None
+    port = free_port()
+    server = TcpFakeServer(("127.0.0.1", port), server_type="redis")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"127.0.0.1:{port}"
+
+
+def run_push(timer, outfile, redis_addr, tmp, fake=False):
+    """
+    times push.py; against fakeredis only its document writes can be timed. returns whether
+    idx:classes is there to search afterwards
+    """
+    host, _, port = redis_addr.partition(":")
+    if not fake:
+        reason = redis_ready(host, int(port or 6379))
+        if reason is not None:
+            print(f"skipping push: {reason}")
+            return False
+    here = os.path.dirname(os.path.abspath(__file__))
+    push_report = os.path.join(tmp, "push.json")
+    start = time.perf_counter()
+    code = subprocess.run([sys.executable, os.path.join(here, "push.py"), "-data", outfile, "-host", host, "-port", port or "6379",
+                           "-report", push_report], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode
+    elapsed = time.perf_counter() - start
+    with open(push_report) as f:
+        load = [stage for stage in json.load(f)["stages"] if stage["name"] == "load"]
+    # fakeredis has no FT.* commands, so there push.py is expected to fail right after the load
+    if len(load) == 0 or load[0].get("error") is not None or (code != 0 and not fake):
+        raise RuntimeError(f"push.py failed with exit status {code}; see {push_report}")
+    timer.times["push_load"] = load[0]["wall"]
+    if fake:
+        return False
+    timer.times["push"] = elapsed
+    return True
+
+
+def search_queries(course_data, count, seed):
+    """
+    searches shaped like the site's: the default filters, with a query typed into the search
+    bar or a subject page's empty query
+    """
+    rng = random.Random(seed)
+    queries = []
+    for course in rng.sample(course_data, min(count, len(course_data))):
+        words = course["title"].split()
+        names = [name for term in course["instructor"].values() for name in term if name != "TBA"]
+        q = rng.choice([
+            words[0][:rng.randint(1, len(words[0]))],
+            " ".join(words[:2]),
+            f"{course['subjectCode']} {str(course['courseCode'])[:3]}",
+            names[0] if len(names) > 0 else words[0],
+            "",
+        ])
+        queries.append({"q": q, "sub": [course["subjectCode"]] if q == "" else [], "term": [], "gen": [], "cmin": 0, "cmax": 18,
+                        "levels": [100, 200, 300, 400, 500, 600, 700, 800, 900], "sched": schedule_types,
+                        "size": 1000 if q == "" else 100})
+    return queries
+
+
+def percentiles(seconds):
+    seconds = sorted(seconds)
+    return f"p50 {seconds[len(seconds) // 2] * 1000:.3f}ms, p99 {seconds[int(len(seconds) * 0.99)] * 1000:.3f}ms"
+
+
+def run_search(timer, course_data, queries, redis_addr):
+    """
+    times the in-memory index and, if given, idx:classes on the same queries; returns a
+    summary line
+    """
+    with timer.stage("search_build"):
+        index = search.SearchIndex(course_data)
+    local = []
+    local_times = []
+    with timer.stage("search"):
+        for query in queries:
+            start = time.perf_counter()
+            total, hits = index.search(query["q"], query["sub"] or None, query["term"] or None, query["gen"] or None,
+                                       (query["cmin"], query["cmax"]), search.level_ranges(query["levels"]), query["sched"], query["size"])
+            local_times.append(time.perf_counter() - start)
+            local.append((total, [name for name, _ in hits]))
+    summary = f"in memory: {percentiles(local_times)}"
+    if redis_addr is None:
+        return summary
+
+    import redis
+    host, _, port = redis_addr.partition(":")
+    r = redis.Redis(host=host, port=int(port or 6379))
+    remote = []
+    remote_times = []
+    with timer.stage("search_redis"):
+        for query in queries:
+            start = time.perf_counter()
+            reply = r.execute_command("FT.SEARCH", "idx:classes", search.redis_query(query["q"], query["sub"], query["term"], query["gen"],
+                                                                                      query["cmin"], query["cmax"], query["levels"], query["sched"]),
+                                      "LIMIT", 0, query["size"])
+            # what the site gets back: parsed documents
+            documents = [json.loads(fields[1]) for fields in reply[2::2]]
+            remote_times.append(time.perf_counter() - start)
+            remote.append((reply[0], [key.decode().split("classes:", 1)[1] for key in reply[1::2]]))
+    same_total = sum(a[0] == b[0] for a, b in zip(local, remote)) / len(queries)
+    overlap = [len(set(a[1][:10]) & set(b[1][:10])) / max(1, len(set(a[1][:10]) | set(b[1][:10]))) for a, b in zip(local, remote)]
+    return (f"{summary}; redis: {percentiles(remote_times)}; same match count {same_total:.0%}, "
+            f"top 10 overlap {sum(overlap) / len(overlap):.0%}")
+
+
+def git_commit():
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=here, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=here, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("-dirty" if dirty else "")
+
+
+def previous_run(path, scale):
+    last = None
+    try:
+        with open(path) as f:
+            for line in f:
+                run = json.loads(line)
+                # runs from before -format were all JSON, and ones from before "redis" pushed
+                # to a Redis Stack if they pushed at all
+                if dict({"format": "json", "redis": "stack" if "push" in run["stages"] else "none"}, **run["scale"]) == scale:
+                    last = run
+    except FileNotFoundError:
+        pass
+    return last
+
+
+def report(times, previous, max_slowdown):
+    """
+    prints each stage against the previous run and returns the stages that got slower by
+    more than max_slowdown (a fraction)
+    """
+    slower = []
+    before = previous["stages"] if previous is not None else {}
+    if previous is not None:
+        print(f"compared with {previous['commit']} ({previous['date']}):")
+    for name in stages:
+        if name not in times:
+            continue
+        line = f"  {name:<16}{times[name]:>9.3f}s"
+        if name in before:
+            change = times[name] / max(before[name], 1e-9) - 1
+            line += f"{before[name]:>9.3f}s {change:>+7.1%}"
+            if max_slowdown is not None and change > max_slowdown:
+                slower.append(name)
+                line += "  slower"
+        print(line)
+    return slower
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark the data pipeline on generated data")
+    parser.add_argument("-data", default="bench_data/", dest="data", help="where the generated inputs are kept")
+    parser.add_argument("-semesters", default=15, type=int, dest="semesters")
+    parser.add_argument("-courses", default=10000, type=int, dest="courses")
+    parser.add_argument("-grade-semesters", default=7, type=int, dest="grade_semesters")
+    parser.add_argument("-seed", default=0, type=int, dest="seed")
+    parser.add_argument("-format", default="json", choices=["json", "msgpack"], dest="format", help="format of the generated semester and grade files")
+    parser.add_argument("-repeat", default=3, type=int, dest="repeat", help="runs per stage, the best one counts")
+    parser.add_argument("-workers", default=None, type=int, dest="workers", help="processes for parse_grades (default: one per CPU)")
+    parser.add_argument("-redis", default=None, dest="redis", help="host:port of a scratch Redis Stack to time push.py and searches against (default: start one)")
+    parser.add_argument("-no-redis", action="store_true", dest="no_redis", help="leave out push and search_redis")
+    parser.add_argument("-queries", default=1000, type=int, dest="queries", help="searches timed per run")
+    parser.add_argument("-results", default="bench_results.jsonl", dest="results", help="every run is appended here")
+    parser.add_argument("-max-slowdown", default=None, type=float, dest="max_slowdown", help="exit 1 if a stage is slower than the last run by more than this fraction (e.g. 0.2)")
+    args = parser.parse_args()
+
+    records = ensure_data(args)
+
+    best = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        redis_addr = args.redis
+        redis_kind = "none" if args.no_redis else "stack"
+        server = None
+        if redis_addr is None and not args.no_redis:
+            server = start_redis(tmp)
+            if server is None:
+                server = start_fakeredis()
+                redis_kind = "none" if server is None else "fakeredis"
+                print("no Redis Stack to start: " + ("timing push.py's writes against fakeredis, no search_redis" if server is not None
+                                                      else "skipping push and search_redis (install redis-stack-server or fakeredis)"))
+            if server is not None:
+                redis_addr = server[1]
+        try:
+            outfile = os.path.join(tmp, "classes_out.json")
+            for _ in range(args.repeat):
+                timer = Timer()
+                course_data = run_harmonize(timer, args.data, outfile, args.workers)
+                run_prereq_parse(timer, args.data, course_data)
+                pushed = redis_kind != "none" and run_push(timer, outfile, redis_addr, tmp, fake=redis_kind == "fakeredis")
+                queries = search_queries(course_data, args.queries, args.seed)
+                search_summary = run_search(timer, course_data, queries, redis_addr if pushed else None)
+                for name, seconds in timer.times.items():
+                    best[name] = min(best.get(name, seconds), seconds)
+        finally:
+            if server is not None and redis_kind == "fakeredis":
+                server[0].shutdown()
+                server[0].server_close()
+            elif server is not None:
+                server[0].terminate()
+                server[0].wait()
+    scale = {"semesters": args.semesters, "courses": args.courses, "grade_semesters": args.grade_semesters, "seed": args.seed, "format": args.format,
+             "redis": redis_kind}
+
+    previous = previous_run(args.results, scale)
+    run = {
+        "commit": git_commit(),
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "scale": scale,
+        "records": records,
+        "courses": len(course_data),
+        "stages": {name: round(best[name], 4) for name in stages if name in best},
+    }
+    with open(args.results, "a") as f:
+        f.write(json.dumps(run) + "\n")
+
+    print(f"{records} semester records, {len(course_data)} courses")
+    print(f"search over {len(queries)} queries, {search_summary}")
+    slower = report(run["stages"], previous, args.max_slowdown)
+    if len(slower) > 0:
+        print(f"{len(slower)} stages slower than the last run by more than {args.max_slowdown:.0%}: {', '.join(slower)}")
+        exit(1)
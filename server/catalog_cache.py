@@ -0,0 +1,139 @@
+import sqlite3
+import threading
+import time
+import zlib
+from urllib.parse import urlsplit, parse_qs
+from schedule_parser import catalog_html
+
+"""
+on-disk cache of raw catalog pages, shared by scrape.py ("View Catalog Entry" pages) and
+prereqs.py (course detail pages). catalog text rarely changes between terms, so pages are
+keyed by page type and course rather than by the term-specific URL, and a full historical
+rescrape fetches each course's page about once.
+
+entries older than the TTL are revalidated with If-None-Match / If-Modified-Since when the
+server gave us validators, otherwise they are fetched again.
+
+only complete pages are stored: an error or maintenance page comes back with a 200 too, but
+without the catalog entry cell, and is returned to the caller without being cached.
+"""
+
+default_path = "data/catalog_cache.sqlite"
+default_ttl = 30 * 24 * 60 * 60
+
+# query parameters naming the subject and course number on each catalog page type
+course_params = {
+    "bwckctlg.p_display_courses": ("one_subj", "sel_crse_strt"),
+    "bwckctlg.p_disp_course_detail": ("subj_code_in", "crse_numb_in"),
+}
+
+
+def complete(body):
+    # both catalog page types keep their content in the ntdefault cell
+    return catalog_html(body) is not None
+
+
+def course_key(url):
+    """
+    "<page type>:<subject> <course number>" for catalog URLs, the URL itself otherwise
+    """
+    parts = urlsplit(url)
+    page = parts.path.rsplit("/", 1)[-1]
+    if page not in course_params:
+        return url
+    query = parse_qs(parts.query)
+    subj, crse = course_params[page]
+    if subj not in query or crse not in query:
+        return url
+    return f"{page}:{query[subj][0]} {query[crse][0]}"
+
+
+class CatalogCache:
+    def __init__(self, path=default_path, ttl=default_ttl):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "key TEXT PRIMARY KEY, url TEXT, body BLOB, etag TEXT, last_modified TEXT, fetched_at REAL)"
+        )
+        self.db.commit()
+        self.hits = 0
+        self.revalidated = 0
+        self.fetched = 0
+
+    def lookup(self, key):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT url, body, etag, last_modified, fetched_at FROM pages WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        url, body, etag, last_modified, fetched_at = row
+        return {
+            "url": url,
+            "body": zlib.decompress(body).decode(),
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": fetched_at,
+        }
+
+    def store(self, key, url, body, etag=None, last_modified=None):
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)",
+                (key, url, zlib.compress(body.encode()), etag, last_modified, time.time()),
+            )
+            self.db.commit()
+
+    def touch(self, key):
+        with self.lock:
+            self.db.execute("UPDATE pages SET fetched_at = ? WHERE key = ?", (time.time(), key))
+            self.db.commit()
+
+    def get(self, url, fetch, key=None):
+        """
+        page body for url, from the cache when fresh. fetch(url, etag, last_modified) must return
+        (body, etag, last_modified), with body None when the server answered 304 Not Modified.
+        a fetched page without the catalog entry cell is returned but not stored.
+        """
+        key = key or course_key(url)
+        entry = self.lookup(key)
+        if entry is not None and not complete(entry["body"]):
+            # an error page stored before pages were checked
+            entry = None
+        if entry is not None and time.time() - entry["fetched_at"] < self.ttl:
+            # scrape.py calls this from many threads, and += on an attribute isn't atomic
+            with self.lock:
+                self.hits += 1
+            return entry["body"]
+
+        if entry is not None:
+            body, etag, last_modified = fetch(url, entry["etag"], entry["last_modified"])
+        else:
+            body, etag, last_modified = fetch(url, None, None)
+        if body is None:
+            with self.lock:
+                self.revalidated += 1
+            self.touch(key)
+            return entry["body"]
+        with self.lock:
+            self.fetched += 1
+        if complete(body):
+            self.store(key, url, body, etag, last_modified)
+        return body
+
+    def pages(self, prefix=""):
+        """
+        (key, body) for every stored page whose key starts with prefix
+        """
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT key, body FROM pages WHERE substr(key, 1, ?) = ? ORDER BY key", (len(prefix), prefix)
+            ).fetchall()
+        for key, body in rows:
+            yield key, zlib.decompress(body).decode()
+
+    def close(self):
+        with self.lock:
+            self.db.close()
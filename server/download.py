@@ -1,63 +1,234 @@
 import subprocess
 import argparse
-import wget
+import hashlib
+import json
 import os
+import threading
+try:
+  import fcntl
+except ImportError:
+  # windows: parallel -only runs may drop each other's manifest entries, which costs a re-hash
+  fcntl = None
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests import RequestException
+from scheduler import Scheduler, Failed, TransientError
+from semesters import semesters, grade_semesters, sem_name
+import runreport
+
+"""
+fetches the data files from S3 into data/, keeping whatever is already there.
+
+files we already have are requested with If-None-Match / If-Modified-Since and skipped on
+304. transfers go to .download/parts/<file>.part and resume with a Range request (guarded by
+If-Range, so a changed object starts over); the finished body is checked against S3's ETag
+(the MD5 of single-part uploads) and its length before it replaces the old file. validators
+and checksums live in .download/manifest.json. none of this state is kept in data/, where
+harmonize.py and the other scripts look for their inputs.
+
+-only fetches one group of files (pipeline.py runs each group as its own node).
+"""
 
 print("into download.py")
-semesters = ["Fall 2026", "Spring 2026", "Fall 2025", "Spring 2025", "Fall 2024", "Spring 2024",  "Fall 2023",  "Spring 2023",  "Fall 2022",  "Spring 2022",  "Fall 2021",  "Spring 2021",  "Fall 2020",  "Spring 2020",  "Fall 2019"]
-grade_semesters = ["f21", "s22", "f22", "s23", "f23", "s24", "f24"]
 
 parser = argparse.ArgumentParser(description="scrape or download before running harmonize")
 parser.add_argument("--scrape", action='store_true', dest='scrape')
-link = "https://boilerclasses.s3.amazonaws.com/"
+parser.add_argument("-workers", default=8, type=int, dest="workers", help="files downloaded at once")
+parser.add_argument("-retries", default=3, type=int, dest="retries", help="times a file is retried before giving up")
+parser.add_argument("-bucket", default="https://boilerclasses.s3.amazonaws.com/", dest="bucket", help="base URL the data files are fetched from")
+parser.add_argument("-force", action="store_true", dest="force", help="download every file again, ignoring the local copies")
+parser.add_argument("-only", default=None, nargs="+", choices=["gened", "grades", "prereqs", "semesters"], dest="only", help="fetch just these groups of files")
+runreport.add_arguments(parser)
+state_dir = ".download"
+manifest_path = os.path.join(state_dir, "manifest.json")
+# where versions before state_dir kept the manifest
+legacy_manifest_path = "data/.download_manifest.json"
+chunk_size = 1 << 16
 
 args = parser.parse_args()
+runreport.start("download", args)
+link = args.bucket
+
+def load_manifest():
+  for path in (manifest_path, legacy_manifest_path):
+    try:
+      with open(path) as f:
+        return json.load(f)
+    except FileNotFoundError:
+      continue
+    except ValueError:
+      return {}
+  return {}
+
+os.makedirs(state_dir, exist_ok=True)
+manifest = load_manifest()
+manifest_lock = threading.Lock()
+touched = set()
+http = threading.local()
+
+def save_manifest():
+  # parallel -only runs share the manifest, so entries this run did not touch are re-read
+  # from disk under a file lock instead of being overwritten with our stale copy
+  with manifest_lock, open(manifest_path + ".lock", "w") as lock:
+    if fcntl is not None:
+      fcntl.flock(lock, fcntl.LOCK_EX)
+    merged = load_manifest()
+    for path in touched:
+      if path in manifest:
+        merged[path] = manifest[path]
+      else:
+        merged.pop(path, None)
+    tmp = manifest_path + ".tmp"
+    with open(tmp, "w") as f:
+      json.dump(merged, f, indent=4, sort_keys=True)
+    os.replace(tmp, manifest_path)
+    if os.path.exists(legacy_manifest_path):
+      os.remove(legacy_manifest_path)
+
+def update_manifest(path, entry):
+  with manifest_lock:
+    touched.add(path)
+    if entry is None:
+      manifest.pop(path, None)
+    else:
+      manifest[path] = entry
+  save_manifest()
+
+def session():
+  if not hasattr(http, "session"):
+    http.session = requests.Session()
+  return http.session
+
+def file_md5(path):
+  md5 = hashlib.md5()
+  with open(path, "rb") as f:
+    for chunk in iter(lambda: f.read(chunk_size), b""):
+      md5.update(chunk)
+  return md5.hexdigest()
+
+def expected_md5(etag):
+  # S3 ETags are the body's MD5 unless the object was uploaded in parts ("<hash>-<parts>")
+  if etag is None:
+    return None
+  etag = etag.strip('"')
+  if "-" in etag or len(etag) != 32:
+    return None
+  return etag
+
+def validators(path):
+  """
+  conditional request headers for the local copy of path, if it is still the one we fetched
+  """
+  if args.force or not os.path.exists(path):
+    return {}
+  entry = manifest.get(path, {})
+  if entry.get("size") == os.path.getsize(path) and "etag" in entry:
+    headers = {"If-None-Match": entry["etag"]}
+    if entry.get("last_modified") is not None:
+      headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+  # no record of this copy (an older download.py, or a manual edit): a single-part object's
+  # ETag is its MD5, so the file's own hash still lets S3 answer 304
+  return {"If-None-Match": f'"{file_md5(path)}"'}
+
+def download(path):
+  """
+  brings the local copy at path up to date with link + path. returns "unchanged",
+  "downloaded" or "resumed".
+  """
+  url = link + path
+  part = os.path.join(state_dir, "parts", path + ".part")
+  os.makedirs(os.path.dirname(part), exist_ok=True)
+  headers = validators(path)
+
+  partial = manifest.get(part, {})
+  offset = os.path.getsize(part) if os.path.exists(part) else 0
+  if offset > 0 and partial.get("etag") is not None:
+    headers["Range"] = f"bytes={offset}-"
+    headers["If-Range"] = partial["etag"]
+
+  runreport.count("s3 requests")
+  with session().get(url, headers=headers, stream=True, timeout=60) as res:
+    if res.status_code == 304:
+      if os.path.exists(part):
+        # left over from an interrupted refresh of a file that turned out unchanged
+        os.remove(part)
+        update_manifest(part, None)
+      return "unchanged"
+    if res.status_code == 416:
+      # the partial file is no prefix of the object any more
+      os.remove(part)
+      update_manifest(part, None)
+      raise TransientError(f"{path}: range not satisfiable, starting over")
+    res.raise_for_status()
+
+    etag = res.headers.get("ETag")
+    last_modified = res.headers.get("Last-Modified")
+    resumed = res.status_code == 206
+    if resumed:
+      total = int(res.headers["Content-Range"].split("/")[-1])
+    else:
+      total = int(res.headers["Content-Length"]) if "Content-Length" in res.headers else None
+    update_manifest(part, {"etag": etag})
+
+    with open(part, "ab" if resumed else "wb") as f:
+      for chunk in res.iter_content(chunk_size):
+        f.write(chunk)
+        runreport.count("bytes downloaded", len(chunk))
+
+  size = os.path.getsize(part)
+  if total is not None and size != total:
+    # cut off mid-transfer: keep the partial file so the retry resumes it
+    raise TransientError(f"{path}: got {size} of {total} bytes")
+  md5 = file_md5(part)
+  if expected_md5(etag) is not None and md5 != expected_md5(etag):
+    os.remove(part)
+    update_manifest(part, None)
+    raise TransientError(f"{path}: checksum mismatch")
+
+  os.replace(part, path)
+  update_manifest(part, None)
+  update_manifest(path, {"etag": etag, "last_modified": last_modified, "size": size, "md5": md5})
+  return "resumed" if resumed else "downloaded"
+
+for folder in ["data", "data/gened", "data/grades", "data/prereqs"]:
+  if not os.path.exists(folder):
+    os.mkdir(folder)
+
+# bucket keys match the local paths
+groups = {
+  "gened": ["data/gened/classes_gened.json"],
+  "grades": [f"data/grades/classes_{sem}.json" for sem in grade_semesters],
+  "prereqs": ["data/prereqs/classes_prereqs.json"],
+  "semesters": [] if args.scrape else [f"data/classes_{sem_name(sem)}.json" for sem in semesters],
+}
+files = []
+for group in groups:
+  if args.only is None or group in args.only:
+    files.extend(groups[group])
+
+scheduler = Scheduler(args.workers, retries=args.retries, retry_on=(RequestException, TransientError))
+counts = {}
+with runreport.stage("download", records_in=len(files)) as stage, ThreadPoolExecutor(max_workers=args.workers) as pool:
+  futures = [pool.submit(scheduler.run, path, download, path) for path in files]
+  for future in futures:
+    try:
+      status = future.result()
+    except Failed as e:
+      print(f"failed {e}")
+      status = "failed"
+    counts[status] = counts.get(status, 0) + 1
+  stage.records_out = counts.get("downloaded", 0) + counts.get("resumed", 0)
+print(", ".join(f"{n} {status}" for status, n in sorted(counts.items())))
+print(f"finished downloading {', '.join(group for group in groups if len(groups[group]) > 0 and (args.only is None or group in args.only))}...")
+if len(scheduler.failed) > 0:
+  exit(1)
 
-if not os.path.exists('data'):
-  os.mkdir("data")
-
-# clearing existing JSON files
-for foldername, subfolders, filenames in os.walk('data'):
-  for filename in filenames:
-
-    file_path = os.path.join(foldername, filename)
-    if "json" in file_path:
-      os.remove(file_path)
-
-for filename in os.listdir(os.getcwd()):
-  if "json" in filename:
-    os.remove(filename)
-
-# download gened
-if not os.path.exists('data/gened'):
-  os.mkdir("data/gened")
-url = link + "data/gened/classes_gened.json"
-filename = wget.download(url, out="data/gened/")
-print("finished downloading geneds...")
-
-# download grade data
-if not os.path.exists('data/grades'):
-  os.mkdir("data/grades")
-for sem in grade_semesters:
-  url = link + f"data/grades/classes_{sem}.json"
-  filename = wget.download(url, out="data/grades/")
-print("finished downloading grade data...")
-
-# download prereq data
-if not os.path.exists('data/prereqs'):
-  os.mkdir("data/prereqs")
-url = link + "data/prereqs/classes_prereqs.json"
-filename = wget.download(url, out="data/prereqs/")
-print("finished downloading prereq data...")
-
-
-# download/scrape class data
-if args.scrape:
-  for sem in semesters:
-    subprocess.run(["python3", "scrape.py", "-sem", sem])
-else:
-  for sem in semesters:
-    sem_name = sem.replace(" ", "").lower()
-    url = link + f"data/classes_{sem_name}.json"
-    filename = wget.download(url, out="data/")
-print("finished downloading class data...")
+# scrape class data
+if args.scrape and (args.only is None or "semesters" in args.only):
+  # each scrape.py run writes its own report. pipeline.py -scrape runs these in parallel and
+  # skips semesters that are already scraped
+  with runreport.stage("scrape", records_in=len(semesters)):
+    for sem in semesters:
+      subprocess.run(["python3", "scrape.py", "-sem", sem])
+  print("finished scraping class data...")
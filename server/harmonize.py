@@ -1,8 +1,16 @@
 import json
 import os
 import argparse
+import hashlib
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 from tqdm import tqdm
 import re
+from jsonstream import iter_records, load_records, write_records, extensions
+from prereq_parser import as_tree, to_tokens
+from prereq_graph import prereq_graph, closures, bits_to_nodes
+import runreport
 
 """
 structure for data:
@@ -23,150 +31,155 @@ structure for data:
     prof2: [A+, A, A-, .. F, average]
   }
   prereqs: [..]
+  prereqTree: {type: and/or, children: [..]} or {type: course, ..} (see prereq_parser.py)
+  prereqsAll: [detailId, ..]
+  unlocks: [detailId, ..]
+  unlocksAll: [detailId, ..]
 }
 """
 
-parser = argparse.ArgumentParser(description="in/out files")
-parser.add_argument(
-    "-folder",
-    default="data/",
-    dest="folder",
-    help="which folder for original class data: format is 'classes_<year>' ",
-)
-parser.add_argument(
-    "-grades",
-    default="data/grades/",
-    dest="gradefolder",
-    help="which folder for the grade data",
-)
-parser.add_argument(
-    "-gened",
-    default="data/gened/classes_gened.json",
-    dest="genedfile",
-    help="gened JSON file",
-)
-parser.add_argument(
-    "-prereqs",
-    default="data/prereqs/classes_prereqs.json",
-    dest="prereqsfile",
-    help="prereqs JSON file",
-)
-
-parser.add_argument(
-    "-outfile",
-    default="classes_out.json",
-    dest="outfile",
-    help="where to write result JSON",
-)
-
-args = parser.parse_args()
-
-
-# combining scraped JSONs into one file
-out = {}
-semesters = []
-all_classes = []
 # TODO: change for semester
 latest_sem = "Fall 2026"
 
-for file_name in os.listdir(args.folder):
-    path = args.folder + file_name
-    if "json" not in path:
-        continue
-    f = open(path)
-    data = json.load(f)
-    f.close()
-    semesters.append(data)
-    for class_data in data:
-        all_classes.append(
-            class_data["subjectCode"]
-            + " "
-            + class_data["courseCode"]
-            + ": "
-            + ''.join(e for e in class_data["title"] if e.isalnum())
-        )
-
-all_classes = list(set(all_classes))
-all_classes.sort()
-
-print("syncing up classes.....")
-for class_id in tqdm(all_classes):
-    s, c = class_id.split(": ")[0].split(" ")
-    t = ": ".join(class_id.split(": ")[1:])
-    instances = []
-    class_data = {}
-    class_data["terms"] = []
-    class_data["instructor"] = {}
-    class_data["crn"] = []
-    class_data["sched"] = []
-    for semester in semesters:
-        for class_sem in semester:
-            if (
-                class_sem["subjectCode"] == s
-                and class_sem["courseCode"] == c
-                and ''.join(e for e in class_sem["title"] if e.isalnum()) == t
-            ):
-                instances.append(class_sem)
-                class_data["crn"].extend(class_sem["crn"])
-                if "Distance Learning" in class_sem["sched"]:
-                    if class_sem["term"] == latest_sem:
-                        class_data["sched"].extend(class_sem["sched"])
-                else:
+grade_columns = [
+    "totalAplus",
+    "totalA",
+    "totalAminus",
+    "totalBplus",
+    "totalB",
+    "totalBminus",
+    "totalCplus",
+    "totalC",
+    "totalCminus",
+    "totalDplus",
+    "totalD",
+    "totalDminus",
+    "totalF",
+]
+
+
+def normalize_title(title):
+    return ''.join(e for e in title if e.isalnum())
+
+
+def list_inputs(folder):
+    """
+    the classes_* record files in folder (.json, .jsonl or .msgpack, see jsonstream.py). when
+    one is there in two formats, say after a conversion, the newer copy is read.
+    """
+    newest = {}
+    names = []
+    for file_name in os.listdir(folder):
+        stem, ext = os.path.splitext(file_name)
+        if not file_name.startswith("classes_") or ext not in extensions or stem.endswith(".tmp"):
+            continue
+        names.append(file_name)
+        mtime = os.path.getmtime(folder + file_name)
+        if stem not in newest or mtime > newest[stem][0]:
+            newest[stem] = (mtime, file_name)
+    return [file_name for file_name in names if newest[os.path.splitext(file_name)[0]][1] == file_name]
+
+
+def read_semester_file(path):
+    """
+    groups one semester file's records by (subjectCode, courseCode, normalized title), keeping file order
+    """
+    grouped = {}
+    for class_sem in iter_records(path):
+        key = (class_sem["subjectCode"], class_sem["courseCode"], normalize_title(class_sem["title"]))
+        if key in grouped:
+            grouped[key].append(class_sem)
+        else:
+            grouped[key] = [class_sem]
+    return grouped
+
+
+def merge_semesters(semester_groups):
+    """
+    merges per-file groups (in folder order) into one group per course
+    """
+    grouped = {}
+    for file_groups in semester_groups:
+        for key, records in file_groups.items():
+            if key in grouped:
+                grouped[key].extend(records)
+            else:
+                grouped[key] = list(records)
+    return grouped
+
+
+def class_id(key):
+    s, c, t = key
+    return f"{s} {c}: {t}"
+
+
+def sync_classes(grouped):
+    # combining scraped JSONs into one file
+    out = {}
+    all_classes = {class_id(key): key for key in grouped}
+
+    print("syncing up classes.....")
+    for cid in tqdm(sorted(all_classes)):
+        s, c, t = all_classes[cid]
+        instances = grouped[(s, c, t)]
+        class_data = {}
+        class_data["terms"] = []
+        class_data["instructor"] = {}
+        class_data["crn"] = []
+        class_data["sched"] = []
+        for class_sem in instances:
+            class_data["crn"].extend(class_sem["crn"])
+            if "Distance Learning" in class_sem["sched"]:
+                if class_sem["term"] == latest_sem:
                     class_data["sched"].extend(class_sem["sched"])
-                class_data["terms"].append(class_sem["term"])
-
-                # formatting instructor names to only First Last
-                instrs = []
-                for instr in class_sem["instructor"]:
-                    instrs.append(instr.split(" ")[0] + " " + instr.split(" ")[-1])
-                instrs = [x.replace("TBA TBA", "TBA") for x in instrs]
-                class_data["instructor"][class_sem["term"]] = instrs
-
-                if "<a href=" not in class_sem["description"]:
-                    class_data["description"] = class_sem["description"]
-
-    class_data["title"] = instances[0]["title"]
-    class_data["subjectCode"] = s
-    class_data["courseCode"] = c
-    class_data["crn"] = list(set(class_data["crn"]))
-    class_data["sched"] = list(set(class_data["sched"]))
-    if "description" not in class_data:
-        class_data["description"] = instances[0]["description"]
-    class_data["credits"] = next(
-        (instance["credits"] for instance in instances if "<a href=" not in instance["description"]),
-        [0, 0]
-    )
-    for instance in instances:
-        if "<a href=" not in instance["description"]:
-            class_data["credits"][0] = min(instance["credits"][0], class_data["credits"][0])
-            class_data["credits"][1] = max(instance["credits"][1], class_data["credits"][1])
-    out[class_id] = class_data
-
-course_data = []
-for x in out:
-    course_data.append(out[x])
-
-for i in range(len(course_data)):
-    course_data[i]["gened"] = []
-    if "gpa" not in course_data[i]:
-        course_data[i]["gpa"] = {}
-
-# adding grade information
-
-
-print("adding grades....")
-for file_name in tqdm(os.listdir(args.gradefolder)):
-    if "json" not in file_name:
-        continue
+            else:
+                class_data["sched"].extend(class_sem["sched"])
+            class_data["terms"].append(class_sem["term"])
+
+            # formatting instructor names to only First Last
+            instrs = []
+            for instr in class_sem["instructor"]:
+                instrs.append(instr.split(" ")[0] + " " + instr.split(" ")[-1])
+            instrs = [x.replace("TBA TBA", "TBA") for x in instrs]
+            class_data["instructor"][class_sem["term"]] = instrs
+
+            if "<a href=" not in class_sem["description"]:
+                class_data["description"] = class_sem["description"]
+
+        class_data["title"] = instances[0]["title"]
+        class_data["subjectCode"] = s
+        class_data["courseCode"] = c
+        class_data["crn"] = list(set(class_data["crn"]))
+        class_data["sched"] = list(set(class_data["sched"]))
+        if "description" not in class_data:
+            class_data["description"] = instances[0]["description"]
+        class_data["credits"] = list(next(
+            (instance["credits"] for instance in instances if "<a href=" not in instance["description"]),
+            [0, 0]
+        ))
+        for instance in instances:
+            if "<a href=" not in instance["description"]:
+                class_data["credits"][0] = min(instance["credits"][0], class_data["credits"][0])
+                class_data["credits"][1] = max(instance["credits"][1], class_data["credits"][1])
+        class_data["gened"] = []
+        class_data["gpa"] = {}
+        out[cid] = class_data
+    return out
+
+
+def parse_grade_file(path):
+    """
+    reads one grade file into (subject, courseCode, CRN, semester, instructor, grades) rows.
+    blank subject/course/semester/title cells carry over from the row above.
+    """
     currSubjectCode = ""
     currCourseCode = ""
     currTitle = ""
     currSemester = ""
 
-    grade_file = open(args.gradefolder + file_name)
-    grade_data = json.load(grade_file)
-    grade_file.close()
-    # count = 0
+    grade_data = load_records(path)
+
+    rows = []
     for grade in grade_data:
         if grade["subject"] != "":
             currSubjectCode = grade["subject"]
@@ -182,162 +195,494 @@ for file_name in tqdm(os.listdir(args.gradefolder)):
 
         if grade["avg gpa"] == "NaN" or "-Honors" in grade["title"]:
             continue
-        # found = False
-        for i in range(len(course_data)):
-            if (
-                int(grade["CRN"]) in course_data[i]["crn"]
-                and currSubjectCode == course_data[i]["subjectCode"]
-                and currCourseCode == course_data[i]["courseCode"]
-            ):
-                found = True
-                if currSemester in course_data[i]["gpa"]:
-                    course_data[i]["gpa"][currSemester].append(
-                        [
-                            grade["instructor"],
-                            [
-                                grade["totalAplus"],
-                                grade["totalA"],
-                                grade["totalAminus"],
-                                grade["totalBplus"],
-                                grade["totalB"],
-                                grade["totalBminus"],
-                                grade["totalCplus"],
-                                grade["totalC"],
-                                grade["totalCminus"],
-                                grade["totalDplus"],
-                                grade["totalD"],
-                                grade["totalDminus"],
-                                grade["totalF"],
-                                float(grade["avg gpa"]),
-                            ],
-                        ]
-                    )
-                else:
-                    course_data[i]["gpa"][currSemester] = [
-                        [
-                            grade["instructor"],
-                            [
-                                grade["totalAplus"],
-                                grade["totalA"],
-                                grade["totalAminus"],
-                                grade["totalBplus"],
-                                grade["totalB"],
-                                grade["totalBminus"],
-                                grade["totalCplus"],
-                                grade["totalC"],
-                                grade["totalCminus"],
-                                grade["totalDplus"],
-                                grade["totalD"],
-                                grade["totalDminus"],
-                                grade["totalF"],
-                                float(grade["avg gpa"]),
-                            ],
-                        ]
-                    ]
-        # if found:
-        #   count += 1
-    # print(count, len(grade_data))
-print("syncing grades....")
-for i in range(len(course_data)):
-    gpa_data = {}
-    gpa_data_count = {}
-    for semester, data in course_data[i]["gpa"].items():
-        for entry in data:
-            instructor = entry[0]
-            if instructor.find(",") == -1:
-                formattedInstructor = instructor
+
+        rows.append(
+            (
+                currSubjectCode,
+                currCourseCode,
+                int(grade["CRN"]),
+                currSemester,
+                grade["instructor"],
+                [grade[col] for col in grade_columns] + [float(grade["avg gpa"])],
+            )
+        )
+    return rows
+
+
+def parse_grade_files(paths, workers=None):
+    """
+    parses grade files concurrently, returning their rows in the same order as paths
+    """
+    if len(paths) == 0:
+        return []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(tqdm(executor.map(parse_grade_file, paths), total=len(paths)))
+
+
+def add_grades(course_data, grade_rows):
+    # adding grade information
+    print("adding grades....")
+    # (subject, courseCode, CRN) -> every course offered under that CRN
+    crn_index = {}
+    for class_data in course_data:
+        for crn in class_data["crn"]:
+            key = (class_data["subjectCode"], class_data["courseCode"], crn)
+            if key in crn_index:
+                crn_index[key].append(class_data)
             else:
-                formattedInstructor = (instructor.split(", ")[1] + " " + instructor.split(", ")[0]).strip()
-
-            formattedInstructor = formattedInstructor.split(" ")[0] + " " + formattedInstructor.split(" ")[-1]
-
-            if formattedInstructor in gpa_data:
-                if semester in gpa_data[formattedInstructor]:
-                    for k in range(len(gpa_data[formattedInstructor][semester])):
-                        gpa_data[formattedInstructor][semester][k] = round(
-                            (
-                                gpa_data[formattedInstructor][semester][k] * gpa_data_count[formattedInstructor][semester]
-                                + entry[1][k]
-                            )
-                            / (gpa_data_count[formattedInstructor][semester] + 1),
-                            2,
-                        )
+                crn_index[key] = [class_data]
+
+    # files are merged in folder order, so entries land in the same order as a serial run
+    for rows in grade_rows:
+        for subject, course_code, crn, semester, instructor, grades in rows:
+            for class_data in crn_index.get((subject, course_code, crn), []):
+                if semester in class_data["gpa"]:
+                    class_data["gpa"][semester].append([instructor, list(grades)])
+                else:
+                    class_data["gpa"][semester] = [[instructor, list(grades)]]
+
+
+def format_grade_instructor(instructor):
+    # grade files use "Last, First Middle"; courses use "First Last"
+    if instructor.find(",") == -1:
+        formattedInstructor = instructor
+    else:
+        formattedInstructor = (instructor.split(", ")[1] + " " + instructor.split(", ")[0]).strip()
+
+    return formattedInstructor.split(" ")[0] + " " + formattedInstructor.split(" ")[-1]
+
+
+def sync_grades(course_data):
+    """
+    averages each instructor's sections per semester. grade vectors are summed exactly
+    and divided by the section count once, so the result does not depend on file order.
+    """
+    print("syncing grades....")
+    for class_data in course_data:
+        # (instructor, semester) -> row in sums, in order of first appearance
+        groups = {}
+        ids = []
+        rows = []
+        for semester, data in class_data["gpa"].items():
+            for instructor, grades in data:
+                ids.append(groups.setdefault((format_grade_instructor(instructor), semester), len(groups)))
+                rows.append(grades)
+
+        gpa_data = {}
+        if len(rows) > 0:
+            sums = np.zeros((len(groups), len(grade_columns) + 1))
+            np.add.at(sums, ids, np.array(rows, dtype=np.float64))
+            means = (sums / np.bincount(ids)[:, None]).tolist()
+            for (instructor, semester), i in groups.items():
+                # python's round is correctly rounded, np.round can be off by one in the last place
+                mean = [round(x, 2) for x in means[i]]
+                if instructor in gpa_data:
+                    gpa_data[instructor][semester] = mean
                 else:
-                    gpa_data[formattedInstructor][semester] = entry[1]
-                    gpa_data_count[formattedInstructor][semester] = 1
+                    gpa_data[instructor] = {semester: mean}
+
+        class_data["gpa"] = gpa_data
+
+
+def build_course_index(course_data):
+    """
+    (subjectCode, courseCode) -> indices of every course with that code (titles can differ)
+    """
+    course_index = {}
+    for i in range(len(course_data)):
+        key = (course_data[i]["subjectCode"], course_data[i]["courseCode"])
+        if key in course_index:
+            course_index[key].append(i)
+        else:
+            course_index[key] = [i]
+    return course_index
+
+
+def load_json(path):
+    f = open(path)
+    data = json.load(f)
+    f.close()
+    return data
+
+
+def gened_tags(gened_data):
+    """
+    (subjectCode, courseCode) -> gened tags, listed in the order they appear in the gened file
+    """
+    tags = {}
+    for tag in gened_data:
+        for c in gened_data[tag]:
+            sub, code = c.split(" ")
+            if (sub, code) in tags:
+                tags[(sub, code)].add(tag)
             else:
-                gpa_data[formattedInstructor] = {semester: entry[1]}
-                gpa_data_count[formattedInstructor] = {semester: 1}
-
-    course_data[i]["gpa"] = gpa_data
-
-# adding geneds
-gened_file = open(args.genedfile)
-gened_data = json.load(gened_file)
-gened_file.close()
-
-print("adding geneds.....")
-tags = []
-for tag in tqdm(gened_data):
-    for c in gened_data[tag]:
-        sub, code = c.split(" ")
-        for i in range(len(course_data)):
-            if (
-                course_data[i]["subjectCode"] == sub
-                and course_data[i]["courseCode"] == code
-                and tag not in course_data[i]["gened"]
-            ):
-                course_data[i]["gened"].append(tag)
-
-# adding prereqs
-prereqs_file = open(args.prereqsfile)
-prereqs_data = json.load(prereqs_file)
-prereqs_file.close()
-
-print("adding prereqs.....")
-for class_data in tqdm(prereqs_data):
-    sub, code = class_data.split()
+                tags[(sub, code)] = {tag}
+    return {code: [tag for tag in gened_data if tag in tags[code]] for code in tags}
+
+
+def add_geneds(course_data, gened_data, course_index):
+    # adding geneds
+    print("adding geneds.....")
+    for code, tags in tqdm(gened_tags(gened_data).items()):
+        for i in course_index.get(code, []):
+            course_data[i]["gened"] = list(tags)
+
+
+def add_prereqs(course_data, prereqs_data, course_index):
+    # adding prereqs
+    print("adding prereqs.....")
+    unparsed = []
+    for class_data in tqdm(prereqs_data):
+        sub, code = class_data.split()
+        prereqs = prereqs_data[class_data]
+        tree = as_tree(prereqs)
+        if tree is None:
+            # the site falls back to the token list for these
+            unparsed.append(class_data)
+        # the flat token list stays for clients that read "prereqs"; files from before trees
+        # already have one
+        tokens = prereqs if isinstance(prereqs, list) else to_tokens(tree)
+        for i in course_index.get((sub, code), []):
+            course_data[i]["prereqs"] = tokens
+            if tree is not None:
+                course_data[i]["prereqTree"] = tree
+
+    if len(unparsed) > 0:
+        print(f"{len(unparsed)} courses have prerequisites that don't parse into a tree:")
+        print("  " + ", ".join(sorted(unparsed)))
+    runreport.count("prereqs unparsed", len(unparsed))
+
+
+def add_prereq_graph(course_data):
+    """
+    transitive prerequisites and direct/transitive dependents by detailId (see prereq_graph.py).
+    needs detailId, so runs after finalize, over every course.
+    """
+    print("building prereq graph.....")
+    ids, edges = prereq_graph(course_data)
+    descendants, ancestors, cycles = closures(edges)
+    unlocks = [[] for _ in ids]
+    for v, targets in enumerate(edges):
+        for w in targets:
+            unlocks[w].append(v)
+
+    if len(cycles) > 0:
+        print(f"{len(cycles)} prerequisite cycles:")
+        for members in cycles:
+            print("  " + " -> ".join(ids[v] for v in members))
+
+    node = {detailId: i for i, detailId in enumerate(ids)}
+    for course in course_data:
+        v = node[course["detailId"]]
+        # only set when non-empty, most courses neither need nor unlock anything
+        for field, nodes in (
+            ("prereqsAll", bits_to_nodes(descendants[v])),
+            ("unlocks", unlocks[v]),
+            ("unlocksAll", bits_to_nodes(ancestors[v])),
+        ):
+            if len(nodes) > 0:
+                course[field] = [ids[w] for w in nodes]
+
+
+def finalize(course_data):
+    """
+    adds fullTitle/detailId and converts courseCode to int, returning every detailId seen
+    """
+    test = []
+    invalid_indices = []
     for i in range(len(course_data)):
-        if (course_data[i]["subjectCode"] == sub and course_data[i]["courseCode"] == code):
-            course_data[i]["prereqs"] = prereqs_data[class_data]
-
-
-test = []
-invalid_indices = []
-for i in range(len(course_data)):
-    course_data[i]["fullTitle"] = " ".join(
-        [
-            course_data[i]["subjectCode"],
-            course_data[i]["courseCode"],
-            course_data[i]["title"],
-        ]
-    )
-    course_data[i]["detailId"] = re.sub("[^a-zA-Z0-9]", "", course_data[i]["fullTitle"])
-    test.append(course_data[i]["detailId"])
-    # THTR T1200 seems to be an issue here, can just remove (it is outdated)
+        course_data[i]["fullTitle"] = " ".join(
+            [
+                course_data[i]["subjectCode"],
+                course_data[i]["courseCode"],
+                course_data[i]["title"],
+            ]
+        )
+        course_data[i]["detailId"] = re.sub("[^a-zA-Z0-9]", "", course_data[i]["fullTitle"])
+        test.append(course_data[i]["detailId"])
+        # THTR T1200 seems to be an issue here, can just remove (it is outdated)
+        try:
+            course_data[i]["courseCode"] = int(course_data[i]["courseCode"])
+        except:
+            invalid_indices.append(i)
+
+    for idx in invalid_indices:
+        course_data.pop(idx)
+    return test
+
+
+# bump whenever the cached state or the course documents change shape
+cache_version = 3
+
+
+def fingerprint(path, previous=None):
+    """
+    size, mtime and sha256 of path. the hash is reused when size and mtime match the previous run.
+    """
+    stat = os.stat(path)
+    if previous is not None and previous["size"] == stat.st_size and previous["mtime"] == stat.st_mtime:
+        return previous
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    return {"size": stat.st_size, "mtime": stat.st_mtime, "sha256": sha.hexdigest()}
+
+
+def load_cache(cache_dir):
+    """
+    returns (manifest, state) from a previous incremental run, or (None, None) if unusable
+    """
     try:
-        course_data[i]["courseCode"] = int(course_data[i]["courseCode"])
-    except:
-        invalid_indices.append(i)
+        manifest = load_json(os.path.join(cache_dir, "manifest.json"))
+        if manifest["version"] != cache_version or manifest["latest_sem"] != latest_sem:
+            return None, None
+        with open(os.path.join(cache_dir, "state.pickle"), "rb") as f:
+            return manifest, pickle.load(f)
+    except (OSError, ValueError, KeyError, pickle.UnpicklingError):
+        return None, None
+
+
+def save_cache(cache_dir, manifest, state):
+    # manifest goes last: it only describes a state that was fully written
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(os.path.join(cache_dir, "state.pickle.tmp"), "wb") as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(os.path.join(cache_dir, "state.pickle.tmp"), os.path.join(cache_dir, "state.pickle"))
+    with open(os.path.join(cache_dir, "manifest.json.tmp"), "w") as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(os.path.join(cache_dir, "manifest.json.tmp"), os.path.join(cache_dir, "manifest.json"))
+
+
+def changed_inputs(folder, names, previous_names, files, manifest):
+    """
+    names in folder that are new or whose content changed, plus whether the unchanged ones were reordered
+    """
+    changed = [
+        name for name in names
+        if name not in previous_names or manifest["files"].get(folder + name, {}).get("sha256") != files[folder + name]["sha256"]
+    ]
+    kept = [name for name in names if name in previous_names]
+    reordered = kept != [name for name in previous_names if name in names]
+    return changed, reordered
+
+
+def rows_by_crn(rows):
+    grouped = {}
+    for row in rows:
+        if row[:3] in grouped:
+            grouped[row[:3]].append(row)
+        else:
+            grouped[row[:3]] = [row]
+    return grouped
+
+
+def build(args, manifest=None, state=None):
+    """
+    builds every course document (before finalize), keyed by class id.
+    with a previous manifest/state only the inputs that changed are re-read, and only
+    the courses they touch are recomputed. returns (courses, manifest, state).
+    """
+    sem_names = list_inputs(args.folder)
+    grade_names = list_inputs(args.gradefolder)
+
+    # inputs are only fingerprinted when the result is cached for the next incremental run
+    previous_files = manifest["files"] if manifest is not None else {}
+    files = {}
+    if args.incremental:
+        with runreport.stage("fingerprint") as stage:
+            for path in [args.folder + n for n in sem_names] + [args.gradefolder + n for n in grade_names] + [args.genedfile, args.prereqsfile]:
+                files[path] = fingerprint(path, previous_files.get(path))
+            stage.records_out = len(files)
+    new_manifest = {"version": cache_version, "latest_sem": latest_sem, "files": files}
+
+    if state is None:
+        state = {"semesters": {}, "semester_order": [], "grades": {}, "grade_order": [], "gened": {}, "prereqs": {}, "courses": {}}
+        manifest = {"files": {}}
+        full = True
+    else:
+        full = False
+
+    # semester files: a course is touched when its records in a changed or removed file differ
+    changed_sems, sems_reordered = changed_inputs(args.folder, sem_names, state["semester_order"], files, manifest)
+    touched = set()
+    with runreport.stage("read_semesters", records_in=len(changed_sems)) as stage:
+        for name in state["semester_order"]:
+            if name not in sem_names:
+                touched.update(state["semesters"].pop(name))
+        for name in changed_sems:
+            old_groups = state["semesters"].get(name, {})
+            new_groups = read_semester_file(args.folder + name)
+            touched.update(key for key in old_groups.keys() | new_groups.keys() if old_groups.get(key) != new_groups.get(key))
+            state["semesters"][name] = new_groups
+        state["semester_order"] = sem_names
+        grouped = merge_semesters([state["semesters"][name] for name in sem_names])
+        stage.records_out = len(grouped)
+
+    # grade files: a course is touched when rows for one of its CRNs differ in a changed or removed file
+    changed_grades, grades_reordered = changed_inputs(args.gradefolder, grade_names, state["grade_order"], files, manifest)
+    touched_crns = set()
+    for name in state["grade_order"]:
+        if name not in grade_names:
+            touched_crns.update(row[:3] for row in state["grades"].pop(name))
+    print("parsing grades....")
+    with runreport.stage("parse_grades", records_in=len(changed_grades)) as stage:
+        parsed = parse_grade_files([args.gradefolder + name for name in changed_grades], args.workers)
+        for name, rows in zip(changed_grades, parsed):
+            old_rows = rows_by_crn(state["grades"].get(name, []))
+            new_rows = rows_by_crn(rows)
+            touched_crns.update(crn for crn in old_rows.keys() | new_rows.keys() if old_rows.get(crn) != new_rows.get(crn))
+            state["grades"][name] = rows
+        state["grade_order"] = grade_names
+        stage.records_out = sum(len(rows) for rows in parsed)
+
+    # gened and prereqs: every course whose tags or prereqs differ is touched
+    touched_codes = set()
+    if full or manifest["files"].get(args.genedfile, {}).get("sha256") != files[args.genedfile]["sha256"]:
+        gened_data = load_json(args.genedfile)
+        old_tags = gened_tags(state["gened"])
+        new_tags = gened_tags(gened_data)
+        touched_codes.update(code for code in old_tags.keys() | new_tags.keys() if old_tags.get(code) != new_tags.get(code))
+        state["gened"] = gened_data
+    if full or manifest["files"].get(args.prereqsfile, {}).get("sha256") != files[args.prereqsfile]["sha256"]:
+        prereqs_data = load_json(args.prereqsfile)
+        for key in state["prereqs"].keys() | prereqs_data.keys():
+            if state["prereqs"].get(key) != prereqs_data.get(key):
+                touched_codes.add(tuple(key.split()))
+        state["prereqs"] = prereqs_data
+
+    if full or sems_reordered or grades_reordered:
+        touched = set(grouped)
+    elif len(touched_crns) > 0 or len(touched_codes) > 0:
+        for key, records in grouped.items():
+            if key[:2] in touched_codes:
+                touched.add(key)
+                continue
+            for record in records:
+                if any((key[0], key[1], crn) in touched_crns for crn in record["crn"]):
+                    touched.add(key)
+                    break
+
+    print(f"{len(changed_sems)} semester files, {len(changed_grades)} grade files new or changed; recomputing {len(touched)} of {len(grouped)} courses")
+    courses = state["courses"]
+    for key in touched:
+        courses.pop(class_id(key), None)
+    live = {class_id(key) for key in grouped}
+    for cid in [cid for cid in courses if cid not in live]:
+        courses.pop(cid)
+
+    with runreport.stage("sync_classes", records_in=len(touched)) as stage:
+        docs = sync_classes({key: grouped[key] for key in touched if key in grouped})
+        course_data = list(docs.values())
+        stage.records_out = len(course_data)
+    with runreport.stage("add_grades", records_in=len(course_data)):
+        add_grades(course_data, [state["grades"][name] for name in grade_names])
+    with runreport.stage("sync_grades", records_in=len(course_data)):
+        sync_grades(course_data)
+    with runreport.stage("geneds", records_in=len(course_data)):
+        course_index = build_course_index(course_data)
+        add_geneds(course_data, state["gened"], course_index)
+    with runreport.stage("prereqs", records_in=len(course_data)):
+        add_prereqs(course_data, state["prereqs"], course_index)
+    courses.update(docs)
+
+    return courses, new_manifest, state
+
+
+def main():
+    parser = argparse.ArgumentParser(description="in/out files")
+    parser.add_argument(
+        "-folder",
+        default="data/",
+        dest="folder",
+        help="which folder for original class data: format is 'classes_<year>' ",
+    )
+    parser.add_argument(
+        "-grades",
+        default="data/grades/",
+        dest="gradefolder",
+        help="which folder for the grade data",
+    )
+    parser.add_argument(
+        "-gened",
+        default="data/gened/classes_gened.json",
+        dest="genedfile",
+        help="gened JSON file",
+    )
+    parser.add_argument(
+        "-prereqs",
+        default="data/prereqs/classes_prereqs.json",
+        dest="prereqsfile",
+        help="prereqs JSON file",
+    )
+
+    parser.add_argument(
+        "-outfile",
+        default="classes_out.json",
+        dest="outfile",
+        help="where to write result JSON (.jsonl writes one compact course per line)",
+    )
+    parser.add_argument(
+        "-workers",
+        default=None,
+        type=int,
+        dest="workers",
+        help="processes used to parse grade files (default: one per CPU)",
+    )
+    parser.add_argument(
+        "-incremental",
+        action="store_true",
+        dest="incremental",
+        help="only recompute courses touched by inputs that changed since the last incremental run",
+    )
+    parser.add_argument(
+        "-cache",
+        default=".harmonize_cache/",
+        dest="cache",
+        help="where -incremental keeps its input manifest and cached state",
+    )
+    runreport.add_arguments(parser)
+
+    args = parser.parse_args()
+    runreport.start("harmonize", args)
+
+    if args.incremental:
+        with runreport.stage("load_cache"):
+            manifest, state = load_cache(args.cache)
+        if state is None:
+            print("no usable cache, doing a full build")
+        courses, manifest, state = build(args, manifest, state)
+        with runreport.stage("save_cache"):
+            save_cache(args.cache, manifest, state)
+    else:
+        courses, manifest, state = build(args)
 
-for idx in invalid_indices:
-    course_data.pop(idx)
+    # finalize works on copies so the cached documents keep string course codes
+    with runreport.stage("finalize", records_in=len(courses)) as stage:
+        course_data = [dict(courses[cid]) for cid in sorted(courses)]
+        test = finalize(course_data)
+        stage.records_out = len(course_data)
+    with runreport.stage("prereq_graph", records_in=len(course_data)):
+        add_prereq_graph(course_data)
 
-print(f"writing to {args.outfile}...")
-outfile = open(args.outfile, "w")
-json.dump(course_data, outfile, indent=4)
-outfile.close()
-print("done!")
+    print(f"writing to {args.outfile}...")
+    with runreport.stage("write") as stage:
+        stage.records_out = write_records(args.outfile, course_data)
+    print("done!")
 
 
-freq = {}
-for item in test:
-    if (item in freq):
-        freq[item] += 1
-    else:
-        freq[item] = 1
+    freq = {}
+    for item in test:
+        if (item in freq):
+            freq[item] += 1
+        else:
+            freq[item] = 1
+
+    for x in freq:
+        if freq[x] > 1:
+            print(x)
+    print(len(test), len(course_data))
+
 
-for x in freq:
-    if freq[x] > 1:
-        print(x)
-print(len(test), len(course_data))
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+import argparse
+import datetime
+import glob
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from harmonize import fingerprint
+from semesters import semesters, grade_semesters, sem_name
+import runreport
+
+"""
+runs the data pipeline as a graph of nodes, each one script invocation with declared inputs
+and outputs:
+
+  download:gened      download.py -only gened       -> data/gened/classes_gened.json
+  download:grades     download.py -only grades      -> data/grades/classes_<sem>.json
+  download:prereqs    download.py -only prereqs     -> data/prereqs/classes_prereqs.json
+  download:semesters  download.py -only semesters   -> data/classes_<sem>.json
+    or, with -scrape, one scrape:<sem> per semester (scrape.py -sem "<sem>")
+  harmonize           harmonize.py -incremental     data/ -> classes_out.json
+  prereqs             prereqs.py                    classes_out.json -> ../data/prereqs/classes_prereqs.json
+  push                push.py -incremental          classes_out.json -> Redis
+  sitemap             sitemap.py                    classes_out.json -> ../public/sitemap*
+  static_api          static_api.py                 classes_out.json -> ../static_api/
+
+a node whose dependencies have finished is started as soon as a -jobs slot is free, so the
+downloads (or the semester scrapes) run side by side, and so do push, sitemap and static_api.
+
+a node is skipped when its inputs and outputs hash the same as after its last successful run
+(kept in .pipeline/state.json) and it is run with the same arguments. download nodes always
+run, since their input is the bucket; download.py's conditional requests make that cheap and
+leave unchanged files alone, so harmonize still gets skipped. a scrape node only runs while its
+semester file is missing, or when it is named with -force. push also runs when Redis has no
+idx:classes index (e.g. a fresh container).
+
+  python3 pipeline.py                    # push, sitemap and static_api, and what they need
+  python3 pipeline.py sitemap            # one target and whatever it depends on
+  python3 pipeline.py -no-deps push      # just the one stage, on the files already there
+  python3 pipeline.py -scrape -force scrape:fall2026 push
+  python3 pipeline.py -dry-run all       # what would run now, and why
+
+each node's output goes to .pipeline/logs/<node>.log, and each script writes its own run
+report (see runreport.py); this one's report has a stage per node that ran.
+"""
+
+here = os.path.dirname(os.path.abspath(__file__))
+state_dir = ".pipeline"
+print_lock = threading.Lock()
+
+
+def say(*lines):
+    # nodes report from worker threads; keep each message's lines together
+    with print_lock:
+        print("\n".join(lines), flush=True)
+
+
+class Node:
+    def __init__(self, name, command, deps=(), inputs=(), outputs=(), always=False, live=None, group=None):
+        self.name = name
+        # arguments to the python interpreter, run from server/
+        self.command = command
+        self.deps = list(deps)
+        # glob patterns relative to server/, expanded when the node is about to run
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        # run even when nothing local changed (the real input is somewhere else)
+        self.always = always
+        # optional check that whatever the node writes outside the filesystem is still there
+        self.live = live
+        # nodes in the same group share that group's concurrency limit
+        self.group = group
+
+
+def index_live(host, port):
+    try:
+        import redis
+        redis.Redis(host=host, port=port, socket_connect_timeout=2).execute_command("FT.INFO", "idx:classes")
+    except Exception:
+        return False
+    return True
+
+
+def build_graph(args):
+    nodes = []
+    downloads = []
+    for group, outputs in [
+        ("gened", ["data/gened/classes_gened.json"]),
+        ("grades", [f"data/grades/classes_{sem}.json" for sem in grade_semesters]),
+        ("prereqs", ["data/prereqs/classes_prereqs.json"]),
+    ] + ([] if args.scrape else [("semesters", [f"data/classes_{sem_name(sem)}.json" for sem in semesters])]):
+        bucket = ["-bucket", args.bucket] if args.bucket is not None else []
+        nodes.append(Node(f"download:{group}", ["download.py", "-only", group, *bucket], outputs=outputs, always=True))
+        downloads.append(f"download:{group}")
+    if args.scrape:
+        # the scrapes share Purdue's rate limit between them
+        rate = args.scrape_rate / max(1, min(args.scrape_jobs, len(semesters)))
+        for sem in semesters:
+            nodes.append(Node(f"scrape:{sem_name(sem)}", ["scrape.py", "-sem", sem, "-rate", f"{rate:g}"],
+                              outputs=[f"data/classes_{sem_name(sem)}.json"], group="scrape"))
+            downloads.append(f"scrape:{sem_name(sem)}")
+
+    nodes.append(Node("harmonize", ["harmonize.py", "-incremental"], deps=downloads,
+                      inputs=["data/classes_*.*", "data/grades/classes_*.*", "data/gened/classes_gened.json", "data/prereqs/classes_prereqs.json"],
+                      outputs=["classes_out.json"]))
+    # prerequisites are re-scraped into the shared data/ folder for the next upload, they don't
+    # feed back into this run
+    nodes.append(Node("prereqs", ["prereqs.py"], deps=["harmonize"], inputs=["classes_out.json"],
+                      outputs=["../data/prereqs/classes_prereqs.json"]))
+    nodes.append(Node("push", ["push.py", "-incremental", "-host", args.redis_host, "-port", str(args.redis_port)],
+                      deps=["harmonize"], inputs=["classes_out.json"],
+                      live=lambda: index_live(args.redis_host, args.redis_port)))
+    nodes.append(Node("sitemap", ["sitemap.py"], deps=["harmonize"], inputs=["classes_out.json"],
+                      outputs=["../public/sitemap.xml", "../public/sitemap-*.xml.gz"]))
+    nodes.append(Node("static_api", ["static_api.py"], deps=["harmonize"], inputs=["classes_out.json"],
+                      outputs=["../static_api/etags.json"]))
+    return {node.name: node for node in nodes}
+
+
+def select(graph, targets):
+    """
+    the targets and everything they depend on, in dependency order
+    """
+    order = []
+
+    def visit(name):
+        if name in order:
+            return
+        for dep in graph[name].deps:
+            visit(dep)
+        order.append(name)
+
+    for target in targets:
+        visit(target)
+    return order
+
+
+def fingerprints(patterns, previous):
+    files = {}
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)):
+            # partial downloads and atomic-write temp files come and go
+            if os.path.isfile(path) and not path.endswith((".part", ".tmp")) and ".tmp." not in path:
+                files[path] = fingerprint(path, previous.get(path))
+    return files
+
+
+def same_files(a, b):
+    return {path: f["sha256"] for path, f in a.items()} == {path: f["sha256"] for path, f in b.items()}
+
+
+class Pipeline:
+    def __init__(self, graph, args):
+        self.graph = graph
+        self.args = args
+        self.state_path = os.path.join(state_dir, "state.json")
+        try:
+            with open(self.state_path) as f:
+                self.state = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.state = {}
+        self.lock = threading.Lock()
+        self.limits = {"scrape": threading.Semaphore(args.scrape_jobs)}
+
+    def stale(self, node, forced):
+        """
+        (why the node has to run or None, input fingerprints, output fingerprints)
+        """
+        previous = self.state.get(node.name)
+        old_inputs = previous["inputs"] if previous is not None else {}
+        old_outputs = previous["outputs"] if previous is not None else {}
+        inputs = fingerprints(node.inputs, old_inputs)
+        outputs = fingerprints(node.outputs, old_outputs)
+        if forced:
+            return "forced", inputs, outputs
+        if node.always:
+            return "always runs", inputs, outputs
+        if len(node.inputs) == 0:
+            # nothing local to rebuild from: the node only fills in missing outputs
+            return ("outputs missing" if len(outputs) == 0 else None), inputs, outputs
+        if previous is None:
+            return "never ran", inputs, outputs
+        if previous["command"] != node.command:
+            return "arguments changed", inputs, outputs
+        if not same_files(inputs, old_inputs):
+            changed = sorted(set(inputs) ^ set(old_inputs) | {path for path in inputs if path in old_inputs and inputs[path]["sha256"] != old_inputs[path]["sha256"]})
+            return f"inputs changed: {', '.join(changed[:3])}" + (f" and {len(changed) - 3} more" if len(changed) > 3 else ""), inputs, outputs
+        if len(node.outputs) > 0 and len(outputs) == 0:
+            return "outputs missing", inputs, outputs
+        if not same_files(outputs, old_outputs):
+            return "outputs changed since the last run", inputs, outputs
+        if node.live is not None and not node.live():
+            return "output no longer live", inputs, outputs
+        return None, inputs, outputs
+
+    def record(self, node, inputs):
+        with self.lock:
+            self.state[node.name] = {
+                "command": node.command,
+                "inputs": inputs,
+                "outputs": fingerprints(node.outputs, {}),
+                "finished": datetime.datetime.now().isoformat(timespec="seconds"),
+            }
+            os.makedirs(state_dir, exist_ok=True)
+            tmp = self.state_path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(self.state, f, indent=4, sort_keys=True)
+            os.replace(tmp, self.state_path)
+
+    def execute(self, node, forced):
+        """
+        runs node if it is stale; returns "ran", "skipped" or "failed", or in a dry run "would run"
+        or, for a node that always runs, "would check"
+        """
+        reason, inputs, _ = self.stale(node, forced)
+        if reason is None:
+            say(f"{node.name}: up to date")
+            return "skipped"
+        if self.args.dry_run:
+            if node.always and not forced:
+                # downloads only change their outputs when the bucket changed, which a dry run
+                # can't tell, so their dependents are checked against the files there now
+                say(f"{node.name}: would check for changes ({reason})")
+                return "would check"
+            say(f"{node.name}: would run ({reason})")
+            return "would run"
+        say(f"{node.name}: running ({reason})")
+        log_path = os.path.join(state_dir, "logs", node.name.replace(":", "_") + ".log")
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+        limit = self.limits.get(node.group)
+        if limit is not None:
+            limit.acquire()
+        start = time.perf_counter()
+        try:
+            with runreport.stage(node.name) as stage, open(log_path, "w") as log:
+                code = subprocess.run([sys.executable, *node.command], cwd=here, stdout=log, stderr=subprocess.STDOUT).returncode
+                if code != 0:
+                    stage.error = f"exit status {code}"
+        finally:
+            if limit is not None:
+                limit.release()
+        if code != 0:
+            with open(log_path, errors="replace") as log:
+                tail = log.read().splitlines()[-20:]
+            say(f"{node.name}: failed with exit status {code}, last lines of {log_path}:", *[f"  | {line}" for line in tail])
+            return "failed"
+        self.record(node, inputs)
+        say(f"{node.name}: done in {time.perf_counter() - start:.1f}s")
+        return "ran"
+
+    def run(self, targets, forced, with_deps=True):
+        """
+        runs the targets and (unless with_deps is off) their dependencies; returns {node: status}
+        """
+        order = select(self.graph, targets) if with_deps else [name for name in self.graph if name in targets]
+        pending = list(order)
+        status = {}
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.args.jobs) as pool:
+            while len(pending) > 0 or len(running) > 0:
+                for name in list(pending):
+                    deps = [dep for dep in self.graph[name].deps if dep in order]
+                    if any(dep not in status for dep in deps):
+                        continue
+                    pending.remove(name)
+                    if any(status[dep] in ("failed", "blocked") for dep in deps):
+                        say(f"{name}: not run, a dependency failed")
+                        status[name] = "blocked"
+                        continue
+                    if any(status[dep] == "would run" for dep in deps):
+                        # its inputs would be rebuilt first, so the files there now say nothing
+                        say(f"{name}: would run (dependency would run)")
+                        status[name] = "would run"
+                        continue
+                    running[pool.submit(self.execute, self.graph[name], name in forced)] = name
+                if len(running) == 0:
+                    continue
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    status[running.pop(future)] = future.result()
+        return {name: status[name] for name in order}
+
+
+if __name__ == "__main__":
+    os.chdir(here)
+    parser = argparse.ArgumentParser(description="run the data pipeline, skipping whatever is up to date")
+    parser.add_argument("targets", nargs="*", default=["push", "sitemap", "static_api"], help="nodes to bring up to date, with their dependencies (default: push sitemap static_api; 'all' for every node)")
+    parser.add_argument("-scrape", "--scrape", action="store_true", dest="scrape", help="scrape the semester files instead of downloading them")
+    parser.add_argument("-force", action="store_true", dest="force", help="run the named targets even if they are up to date (not their dependencies)")
+    parser.add_argument("-no-deps", action="store_false", dest="with_deps", help="run just the named targets against whatever their inputs are now")
+    parser.add_argument("-jobs", default=4, type=int, dest="jobs", help="nodes run at once")
+    parser.add_argument("-scrape-jobs", default=2, type=int, dest="scrape_jobs", help="semesters scraped at once")
+    parser.add_argument("-scrape-rate", default=4.0, type=float, dest="scrape_rate", help="requests per second to Purdue, split between the running scrapes")
+    parser.add_argument("-bucket", default=None, dest="bucket", help="passed on to download.py")
+    parser.add_argument("-redis-host", default="localhost", dest="redis_host")
+    parser.add_argument("-redis-port", default=6379, type=int, dest="redis_port")
+    parser.add_argument("-dry-run", action="store_true", dest="dry_run", help="print what would run and why, without running it")
+    runreport.add_arguments(parser)
+    args = parser.parse_args()
+
+    graph = build_graph(args)
+    targets = list(graph) if "all" in args.targets else args.targets
+    unknown = [target for target in targets if target not in graph]
+    if len(unknown) > 0:
+        parser.error(f"unknown node {', '.join(unknown)}; nodes are: {', '.join(graph)}")
+    if not args.dry_run:
+        runreport.start("pipeline", args)
+
+    status = Pipeline(graph, args).run(targets, set(targets) if args.force else set(), args.with_deps)
+    counts = {}
+    for name, result in status.items():
+        counts[result] = counts.get(result, 0) + 1
+    print(", ".join(f"{n} {result}" for result, n in sorted(counts.items())))
+    if counts.get("failed", 0) + counts.get("blocked", 0) > 0:
+        exit(1)
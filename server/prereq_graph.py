@@ -0,0 +1,139 @@
+from prereq_parser import courses
+
+"""
+the prerequisite graph over every course: an edge from a course to each catalog course its
+prereqTree mentions. harmonize.py stores per course
+
+  prereqsAll: every course reachable through its prerequisites, at any depth
+  unlocks:    courses that list it directly
+  unlocksAll: courses that need it at any depth
+
+so "what does CS 25100 unlock" and "everything before ECE 43700" are plain lookups. OR
+branches count as well: prereqsAll is everything that can come up on the way, not one path.
+
+prerequisites can loop (courses that are each other's corequisites); each strongly connected
+component is collapsed into one node first, so its members reach each other and the closures
+are computed over a DAG.
+"""
+
+
+def strongly_connected(edges):
+    """
+    tarjan's algorithm without recursion. edges[v] lists the nodes v points to. components
+    come out in reverse topological order: each one after every component it points to.
+    """
+    index = [-1] * len(edges)
+    low = [0] * len(edges)
+    on_stack = [False] * len(edges)
+    stack = []
+    components = []
+    counter = 0
+    for root in range(len(edges)):
+        if index[root] != -1:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        work = [(root, 0)]
+        while work:
+            v, i = work[-1]
+            if i < len(edges[v]):
+                work[-1] = (v, i + 1)
+                w = edges[v][i]
+                if index[w] == -1:
+                    index[w] = low[w] = counter
+                    counter += 1
+                    stack.append(w)
+                    on_stack[w] = True
+                    work.append((w, 0))
+                elif on_stack[w]:
+                    low[v] = min(low[v], index[w])
+                continue
+            work.pop()
+            if len(work) > 0:
+                u = work[-1][0]
+                low[u] = min(low[u], low[v])
+            if low[v] == index[v]:
+                component = []
+                while True:
+                    w = stack.pop()
+                    on_stack[w] = False
+                    component.append(w)
+                    if w == v:
+                        break
+                components.append(component)
+    return components
+
+
+def bits_to_nodes(bits):
+    nodes = []
+    while bits:
+        lowest = bits & -bits
+        nodes.append(lowest.bit_length() - 1)
+        bits ^= lowest
+    return nodes
+
+
+def closures(edges):
+    """
+    (descendants, ancestors, cycles) for a graph given as adjacency lists: bitmasks of the
+    nodes reachable from / reaching each node (never the node itself), and the components
+    with more than one node
+    """
+    reverse = [[] for _ in edges]
+    for v, targets in enumerate(edges):
+        for w in targets:
+            reverse[w].append(v)
+
+    components = strongly_connected(edges)
+    component_of = [0] * len(edges)
+    member_bits = []
+    for c, members in enumerate(components):
+        bits = 0
+        for v in members:
+            component_of[v] = c
+            bits |= 1 << v
+        member_bits.append(bits)
+
+    def spread(order, neighbours):
+        reach = [0] * len(components)
+        for c in order:
+            # members of a cycle reach each other
+            bits = member_bits[c] if len(components[c]) > 1 else 0
+            for v in components[c]:
+                for w in neighbours[v]:
+                    d = component_of[w]
+                    if d != c:
+                        bits |= member_bits[d] | reach[d]
+            reach[c] = bits
+        return reach
+
+    # a component's prerequisites all come before it in tarjan's order, its dependents after
+    down = spread(range(len(components)), edges)
+    up = spread(reversed(range(len(components))), reverse)
+
+    descendants = [down[component_of[v]] & ~(1 << v) for v in range(len(edges))]
+    ancestors = [up[component_of[v]] & ~(1 << v) for v in range(len(edges))]
+    cycles = [members for members in components if len(members) > 1]
+    return descendants, ancestors, cycles
+
+
+def prereq_graph(course_data):
+    """
+    (detailIds, edges) over every course in course_data, detailIds sorted. courses sharing a
+    detailId are one node.
+    """
+    ids = sorted({course["detailId"] for course in course_data})
+    node = {detailId: i for i, detailId in enumerate(ids)}
+    targets = [set() for _ in ids]
+    for course in course_data:
+        tree = course.get("prereqTree")
+        if tree is None:
+            continue
+        v = node[course["detailId"]]
+        for leaf in courses(tree):
+            w = node.get(leaf.get("detailId"))
+            if w is not None and w != v:
+                targets[v].add(w)
+    return ids, [sorted(t) for t in targets]
@@ -0,0 +1,262 @@
+import argparse
+import json
+import re
+import time
+
+"""
+prerequisite expressions as AND/OR trees.
+
+  tree   := course | {"type": "and" | "or", "children": [tree, ..]}
+  course := {"type": "course", "subjectCode": "CS", "courseCode": "18000",
+             "concurrent": false, "detailId": "CS18000ProblemSolvingAndObjectOrientedProgramming"}
+
+detailId is left out when the course isn't in the catalog. "and" binds tighter than "or", and
+nested groups with the same operator are flattened into their parent.
+
+the catalog text ("Undergraduate level CS 18000 Minimum Grade of C and (MA 16100 or ...)") is
+split on parentheses and whole-word and/or by one compiled regex, then parsed by recursive
+descent. the older flat token lists in classes_prereqs.json ("<detailId> <concurrent>",
+"<subject> <number> <concurrent>", "(", ")", "and", "or") go through the same parser, so
+either form turns into the same tree.
+
+benchmark over every detail page in the catalog cache, or over a classes_prereqs.json:
+
+  python3 prereq_parser.py -catalog-cache data/catalog_cache.sqlite
+  python3 prereq_parser.py -prereqs data/prereqs/classes_prereqs.json
+"""
+
+class_codes = ["AAE", "AAS", "ABE", "ACCT", "AD", "AFT", "AGEC", "AGR", "AGRY", "AMST", "ANSC", "ANTH", "ARAB", "ARCH", "ASAM", "ASEC", "ASL", "ASM", "ASTR", "AT", "BAND", "BCHM", "BIOL", "BME", "BMS", "BTNY", "BUS", "CAND", "CCE", "CDIS", "CE", "CEM", "CGT", "CHE", "CHM", "CHNS", "CIT", "CLCS", "CLPH", "CM", "CMGT", "CMPL", "CNIT", "COM", "CPB", "CS", "CSCI", "CSR", "DANC", "DCTC", "DSB", "EAPS", "ECE", "ECET", "ECON", "EDCI", "EDPS", "EDST", "EEE", "ENE", "ENGL", "ENGR", "ENGT", "ENTM", "ENTR", "EPCS", "EXPL", "FIN", "FLM", "FNR", "FR", "FS", "FVS", "GEP", "GER", "GRAD", "GREK", "GS", "GSLA", "HDFS", "HEBR", "HER", "HETM", "HHS", "HIST", "HK", "HONR", "HORT", "HSCI", "HSOP", "HTM", "IBE", "IDE", "IDIS", "IE", "IET", "ILS", "IMPH", "IPPH", "INT", "IT", "ITAL", "JPNS", "JWST", "KOR", "LA", "LALS", "LATN", "LC", "LING", "MA", "MATH", "MCMP", "ME", "MET", "MFET", "MGMT", "MIS", "MKTG", "MSE", "MSL", "MSPE", "MUS", "NRES", "NS", "NUCL", "NUPH", "NUR", "NUTR", "OBHR", "OLS", "OPP", "PES", "PHIL", "PHPR", "PHRM", "PHSC", "PHYS", "POL", "PSY", "PTGS", "PUBH", "QM", "REAL", "REG", "REL", "RPMP", "RUSS", "SA", "SCI", "SCLA", "SCOM", "SFS", "SLHS", "SOC", "SPAN", "STAT", "STRT", "SYS", "TCM", "TDM", "TECH", "THTR", "TLI", "VCS", "VIP", "VM", "WGSS"]
+
+# subject codes are looked up as whole runs of capitals, so "MATH" isn't read as "MA" and
+# "CSCI" not as "CS", and a set lookup is much cheaper than a 170-way regex alternation
+subjects = set(class_codes)
+capitals_re = re.compile("[A-Z]+")
+number_re = re.compile("[A-z0-9][0-9][0-9][0-9][0-9]")
+split_re = re.compile(r"(\(|\)|\band\b|\bor\b)")
+legacy_id_re = re.compile(r"([A-Z]+)(\d{5})")
+
+prereq_re = re.compile(r'Prerequisites:.*?<br>(.*?)<br>', re.DOTALL)
+link_open_re = re.compile(r' <a\s+(?:[^>]*?\s+)?href=(["\'])(.*?)\1>')
+link_close_re = re.compile(r'</a>')
+
+operators = ("(", ")", "and", "or")
+
+
+class ParseError(ValueError):
+    pass
+
+
+def prerequisite_text(content):
+    """
+    the prerequisites paragraph of a catalog entry cell's innerHTML with course links stripped,
+    or None if it has none
+    """
+    if 'Prerequisites' not in content:
+        return None
+    match = prereq_re.search(content)
+    if match is None:
+        return None
+    return link_close_re.sub('', link_open_re.sub('', match.group(1)))
+
+
+def tokenize(text):
+    return [token for token in (piece.strip() for piece in split_re.split(text)) if token]
+
+
+def node(op, children):
+    flat = []
+    for child in children:
+        if child["type"] == op:
+            flat.extend(child["children"])
+        else:
+            flat.append(child)
+    if len(flat) == 1:
+        return flat[0]
+    return {"type": op, "children": flat}
+
+
+def parse_tokens(tokens, leaf):
+    """
+    tree for a token list; leaf turns each non-operator token into a course node
+    """
+    pos = 0
+
+    def peek():
+        return tokens[pos] if pos < len(tokens) else None
+
+    def any_of():
+        nonlocal pos
+        children = [all_of()]
+        while peek() == "or":
+            pos += 1
+            children.append(all_of())
+        return node("or", children)
+
+    def all_of():
+        nonlocal pos
+        children = [atom()]
+        while peek() == "and":
+            pos += 1
+            children.append(atom())
+        return node("and", children)
+
+    def atom():
+        nonlocal pos
+        token = peek()
+        if token is None:
+            raise ParseError("unexpected end of expression")
+        pos += 1
+        if token == "(":
+            tree = any_of()
+            if peek() != ")":
+                raise ParseError("unbalanced parentheses")
+            pos += 1
+            return tree
+        if token in operators:
+            raise ParseError(f"unexpected {token!r}")
+        return leaf(token)
+
+    tree = any_of()
+    if pos != len(tokens):
+        raise ParseError(f"unexpected {tokens[pos]!r}")
+    return tree
+
+
+def course_leaf(clause, resolve=None):
+    """
+    course node for one catalog clause ("Undergraduate level CS 18000 Minimum Grade of C").
+    resolve(subject, number) returns the detailId, or None.
+    """
+    department = [word for word in capitals_re.findall(clause) if word in subjects]
+    num = number_re.findall(clause)
+    if len(department) != 1 or len(num) != 1:
+        raise ParseError(f"not a single course: {clause!r}")
+    leaf = {"type": "course", "subjectCode": department[0], "courseCode": num[0], "concurrent": "concurrent" in clause}
+    if resolve is not None:
+        detailId = resolve(department[0], num[0])
+        if detailId is not None:
+            leaf["detailId"] = detailId
+    return leaf
+
+
+def parse(text, resolve=None):
+    """
+    tree for a prerequisites paragraph, or None if any part of it isn't understood
+    """
+    try:
+        return parse_tokens(tokenize(text), lambda clause: course_leaf(clause, resolve))
+    except ParseError:
+        return None
+
+
+def legacy_leaf(token):
+    parts = token.split(" ")
+    if len(parts) == 2:
+        detailId, concurrent = parts
+        match = legacy_id_re.match(detailId)
+        if match is None:
+            raise ParseError(f"bad detailId {detailId!r}")
+        return {"type": "course", "subjectCode": match.group(1), "courseCode": match.group(2),
+                "concurrent": concurrent == "True", "detailId": detailId}
+    if len(parts) == 3:
+        subject, number, concurrent = parts
+        return {"type": "course", "subjectCode": subject, "courseCode": number, "concurrent": concurrent == "True"}
+    raise ParseError(f"bad token {token!r}")
+
+
+def from_tokens(tokens):
+    """
+    tree for a flat token list from an older classes_prereqs.json
+    """
+    return parse_tokens(tokens, legacy_leaf)
+
+
+def to_tokens(tree):
+    """
+    the flat token list older documents carry in "prereqs"
+    """
+    if tree["type"] == "course":
+        if "detailId" in tree:
+            return [f'{tree["detailId"]} {tree["concurrent"]}']
+        return [f'{tree["subjectCode"]} {tree["courseCode"]} {tree["concurrent"]}']
+    tokens = []
+    for i, child in enumerate(tree["children"]):
+        if i > 0:
+            tokens.append(tree["type"])
+        if child["type"] == "course":
+            tokens.extend(to_tokens(child))
+        else:
+            tokens.extend(["("] + to_tokens(child) + [")"])
+    return tokens
+
+
+def as_tree(prereqs):
+    """
+    tree for a classes_prereqs.json entry: a tree already, or a token list in files written
+    before trees (None if it doesn't parse)
+    """
+    if isinstance(prereqs, list):
+        try:
+            return from_tokens(prereqs)
+        except ParseError:
+            return None
+    return prereqs
+
+
+def courses(tree):
+    """
+    every course node in the tree, left to right
+    """
+    if tree["type"] == "course":
+        yield tree
+        return
+    for child in tree["children"]:
+        yield from courses(child)
+
+
+def bench(texts, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        trees = [parse(text) for text in texts]
+    elapsed = (time.perf_counter() - start) / repeat
+    return trees, elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark the prerequisite parser over the full catalog")
+    parser.add_argument("-catalog-cache", default=None, dest="catalog_cache", help="parse every detail page stored by prereqs.py")
+    parser.add_argument("-prereqs", default=None, dest="prereqs", help="or rebuild the trees in a classes_prereqs.json")
+    parser.add_argument("-repeat", default=5, type=int, dest="repeat", help="passes to average over")
+    args = parser.parse_args()
+
+    if args.catalog_cache is not None:
+        from catalog_cache import CatalogCache
+        from schedule_parser import catalog_html
+
+        cache = CatalogCache(args.catalog_cache)
+        texts = []
+        pages = 0
+        for _, body in cache.pages("bwckctlg.p_disp_course_detail:"):
+            pages += 1
+            content = catalog_html(body)
+            text = None if content is None else prerequisite_text(content)
+            if text is not None:
+                texts.append(text)
+        cache.close()
+        trees, elapsed = bench(texts, args.repeat)
+        parsed = sum(tree is not None for tree in trees)
+        print(f"{pages} detail pages, {len(texts)} with prerequisites, {parsed} parsed")
+        print(f"{elapsed:.3f}s per pass ({elapsed / max(1, len(texts)) * 1e6:.1f} us per expression)")
+    elif args.prereqs is not None:
+        with open(args.prereqs) as f:
+            data = json.load(f)
+        entries = list(data.values())
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            trees = [as_tree(entry) for entry in entries]
+        elapsed = (time.perf_counter() - start) / args.repeat
+        parsed = [tree for tree in trees if tree is not None]
+        print(f"{len(entries)} courses, {len(entries) - len(parsed)} didn't parse, {sum(1 for tree in parsed for _ in courses(tree))} course references")
+        print(f"{elapsed:.3f}s per pass ({elapsed / max(1, len(entries)) * 1e6:.1f} us per course)")
+    else:
+        parser.error("give -catalog-cache or -prereqs")
@@ -1,171 +1,167 @@
 import json
-
-from selenium import webdriver
-from selenium.webdriver.support import ui
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.action_chains import ActionChains
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
-import re
+import argparse
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
-
-import re
-import json
- 
-class Course(object):
-    def __init__(self, dep, num, concurrent):
-        self.department = dep
-        self.course_num = num
-        self.concurrent = concurrent
-    def __repr__(self) -> str:
-        return self.department + " " + str(self.course_num) + " " + str(self.concurrent)
- 
-def group(s):
-    grps = []
-    cur = ""
-    i = 0
-    while i < len(s):
-        if s[i] == ")":
-            grps.append(cur)
-            grps.append(")")
-            cur = ""
-            i += 1
-        elif s[i] == "(":
-            grps.append(cur)
-            grps.append("(")
-            cur = ""
-            i += 1
-        elif i+2 < len(s) and s[i:i+2] == "or":
-            grps.append(cur)
-            grps.append("or")
-            cur = ""
-            i += 2
-        elif i+3 < len(s) and s[i:i+3] == "and":
-            grps.append(cur)
-            grps.append("and")
-            cur = ""
-            i += 3
-        else:
-            cur += s[i]
-            i += 1
-    if len(cur) > 0:
-        grps.append(cur)
-
-    grps = [s.strip() for s in grps]
-    grps = [s for s in grps if len(s) > 0]
-    return grps
- 
-def build_tree(clauses):
-
-    # loop through () --> prereq
-    # or -->  OR\n
-    # and --> & 
- 
-    output = ""
-    cur = ""
-    for x in clauses:
-        if x == "or":
-            cur += " OR "
-        elif x == "and":
-            cur += " & "
-        elif x == "(":
-            cur += "\n( "
-        elif x == ")":
-            cur += ")\n"
-        else:
-            cur += str(x)
-    # print(cur)
-    return cur
- 
-def prereqs(s, link=""):
-    grps = group(s)
-    class_codes = ["AAE", "AAS", "ABE", "ACCT", "AD", "AFT", "AGEC", "AGR", "AGRY", "AMST", "ANSC", "ANTH", "ARAB", "ARCH", "ASAM", "ASEC", "ASL", "ASM", "ASTR", "AT", "BAND", "BCHM", "BIOL", "BME", "BMS", "BTNY", "BUS", "CAND", "CCE", "CDIS", "CE", "CEM", "CGT", "CHE", "CHM", "CHNS", "CIT", "CLCS", "CLPH", "CM", "CMGT", "CMPL", "CNIT", "COM", "CPB", "CS", "CSCI", "CSR", "DANC", "DCTC", "DSB", "EAPS", "ECE", "ECET", "ECON", "EDCI", "EDPS", "EDST", "EEE", "ENE", "ENGL", "ENGR", "ENGT", "ENTM", "ENTR", "EPCS", "EXPL", "FIN", "FLM", "FNR", "FR", "FS", "FVS", "GEP", "GER", "GRAD", "GREK", "GS", "GSLA", "HDFS", "HEBR", "HER", "HETM", "HHS", "HIST", "HK", "HONR", "HORT", "HSCI", "HSOP", "HTM", "IBE", "IDE", "IDIS", "IE", "IET", "ILS", "IMPH", "IPPH", "INT", "IT", "ITAL", "JPNS", "JWST", "KOR", "LA", "LALS", "LATN", "LC", "LING", "MA", "MATH", "MCMP", "ME", "MET", "MFET", "MGMT", "MIS", "MKTG", "MSE", "MSL", "MSPE", "MUS", "NRES", "NS", "NUCL", "NUPH", "NUR", "NUTR", "OBHR", "OLS", "OPP", "PES", "PHIL", "PHPR", "PHRM", "PHSC", "PHYS", "POL", "PSY", "PTGS", "PUBH", "QM", "REAL", "REG", "REL", "RPMP", "RUSS", "SA", "SCI", "SCLA", "SCOM", "SFS", "SLHS", "SOC", "SPAN", "STAT", "STRT", "SYS", "TCM", "TDM", "TECH", "THTR", "TLI", "VCS", "VIP", "VM", "WGSS"]
- 
-    grammar = '|'.join(class_codes) 
- 
-    clauses = []
-    for course in grps:
-        if course in ["(", ")", "and", "or"]:
-            clauses.append(course)
-            continue
-        department = re.findall(grammar, course)
-        if len(department) == 0:
-            return (None, course)
-
-        num = re.findall("[A-z0-9][0-9][0-9][0-9][0-9]", course)
-        if len(num) == 0:
-            return (None, course)
-        
-        if len(department) != 1 or len(num) != 1:
-          return (None, course)
- 
-        concurrent = ("concurrent" in course)
- 
-        c = Course(department[0], num[0], concurrent)
-        clauses.append(str(c))
-
-    return (clauses, -1)
-
-options = Options()
-options.add_experimental_option("detach", True)
-
-options.add_argument("--headless")
-options.add_argument("--disable-extensions")
-driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
-
-f = open('classes_out.json', 'r')
-classes = json.load(f)
+from jsonstream import iter_records
+from catalog_cache import CatalogCache, course_key, default_path, default_ttl
+from schedule_parser import catalog_html
+from ratelimit import HostRateLimiter
+from scheduler import Scheduler, Failed, TransientError, load_failed
+from prereq_parser import prerequisite_text, parse
+import runreport
+
+parser = argparse.ArgumentParser(description='data files')
+parser.add_argument("-data", default="classes_out.json", dest="infile", help="which file to get data from (JSON array or .jsonl)")
+parser.add_argument("-catalog-cache", default=default_path, dest="catalog_cache", help="on-disk catalog page cache shared with scrape.py")
+parser.add_argument("-catalog-ttl", default=default_ttl / 86400, type=float, dest="catalog_ttl", help="days before a cached catalog page is fetched again")
+parser.add_argument("-workers", default=4, type=int, dest="workers", help="detail pages fetched at once, each with its own browser")
+parser.add_argument("-rate", default=4.0, type=float, dest="rate", help="max requests per second across all workers (0 = no limit)")
+parser.add_argument("-retries", default=3, type=int, dest="retries", help="times a detail page is retried before it is recorded as failed")
+parser.add_argument("-offline", action="store_true", dest="offline", help="re-parse the detail pages already in the catalog cache without fetching anything")
+parser.add_argument("-only-failed", action="store_true", dest="only_failed", help="re-run just the courses the last run recorded as failed, keeping the rest of the output")
+runreport.add_arguments(parser)
+
+args = parser.parse_args()
+runreport.start("prereqs", args)
+
+catalog_cache = CatalogCache(args.catalog_cache, args.catalog_ttl * 86400)
+scheduler = Scheduler(args.workers, retries=args.retries, retry_on=(TransientError,))
+
+outfile = '../data/prereqs/classes_prereqs.json'
+failed_file = '../data/prereqs/failed.json'
+
+# one browser per worker thread, started only if a page has to be fetched
+thread_state = threading.local()
+drivers = []
+
+if not args.offline:
+  from selenium import webdriver
+  from selenium.webdriver.chrome.options import Options
+  from selenium.webdriver.chrome.service import Service
+  from selenium.common.exceptions import WebDriverException
+  from webdriver_manager.chrome import ChromeDriverManager
+
+  options = Options()
+  options.add_experimental_option("detach", True)
+
+  options.add_argument("--headless")
+  options.add_argument("--disable-extensions")
+  driver_path = ChromeDriverManager().install()
+  limiter = HostRateLimiter(args.rate)
+  scheduler.retry_on = (WebDriverException, TransientError)
+
+def fetch_detail_page(url, etag, last_modified):
+  if not hasattr(thread_state, "driver"):
+    thread_state.driver = webdriver.Chrome(service=Service(driver_path), options=options)
+    drivers.append(thread_state.driver)
+  # the browser can't send validators, so stale pages are simply loaded again
+  limiter.wait(url)
+  thread_state.driver.get(url)
+  return thread_state.driver.page_source, None, None
+
+# (subject, course number) -> detailId of the first course with that code, which is what a
+# prereq reference resolves to
+detail_ids = {}
+courses = []
+with runreport.stage("read_courses") as stage:
+  for c in iter_records(args.infile):
+    detail_ids.setdefault((c["subjectCode"], str(c["courseCode"])), c["detailId"])
+    courses.append((c["subjectCode"], c["courseCode"]))
+  stage.records_out = len(courses)
 
 def getDetailId(sub, code):
-  for class_data in classes:
-    if class_data["subjectCode"] == sub and str(class_data["courseCode"]) == str(code):
-      return class_data["detailId"]
-  return None
+  return detail_ids.get((sub, str(code)))
+
+def detail_link(subject, code):
+  return f"https://selfservice.mypurdue.purdue.edu/prod/bwckctlg.p_disp_course_detail?cat_term_in=202420&subj_code_in={subject}&crse_numb_in={code}"
+
+def fetch_course(link):
+  # only fills the store; pages are parsed once they are all in. an error page isn't stored
+  # and is fetched again
+  if catalog_html(catalog_cache.get(link, fetch_detail_page)) is None:
+    raise TransientError(f"{link}: detail page has no catalog entry cell")
+
+def parse_course(page):
+    """
+    prereq tree from a stored catalog detail page, or None if it lists none we can read
+    """
+    content = catalog_html(page)
+    if content is None:
+      raise TransientError("detail page has no catalog entry cell")
+    text = prerequisite_text(content)
+    if text is None:
+      return None
+    return parse(text, getDetailId)
 
 data = {}
-done_alr = []
-for i in tqdm(range(len(classes))):
-  try:
-    class_data = classes[i]
-    key_data = f'{class_data["subjectCode"]} {class_data["courseCode"]}'
-    if key_data in done_alr:
+retry_keys = None
+if args.only_failed:
+  # keep what earlier runs found and redo only the failures
+  retry_keys = set(load_failed(failed_file))
+  if os.path.exists(outfile):
+    with open(outfile) as fp:
+      data = json.load(fp)
+
+done = set()
+todo = []
+for subject, code in courses:
+  key_data = f'{subject} {code}'
+  if key_data in done:
+    continue
+  done.add(key_data)
+  if retry_keys is not None and key_data not in retry_keys:
+    continue
+  todo.append((key_data, detail_link(subject, code)))
+
+# fetch every page into the raw catalog store first
+if not args.offline:
+  with runreport.stage("fetch", records_in=len(todo)) as stage:
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+      futures = [pool.submit(scheduler.run, key_data, fetch_course, link) for key_data, link in todo]
+      for future in tqdm(futures, desc="fetching"):
+        try:
+          future.result()
+        except Failed as e:
+          tqdm.write(f"failed {e}")
+    for d in drivers:
+      d.quit()
+    stage.records_out = len(todo) - len(scheduler.failed)
+    runreport.count("catalog cache hits", catalog_cache.hits)
+    runreport.count("catalog pages fetched", catalog_cache.fetched)
+  print(f"catalog pages: {catalog_cache.hits} from cache, {catalog_cache.fetched} fetched")
+  print(f"detail pages: {scheduler.summary()}")
+
+# then parse straight from the store, whatever the age of each page
+missing = 0
+with runreport.stage("parse", records_in=len(todo)) as stage:
+  for key_data, link in tqdm(todo, desc="parsing"):
+    if key_data in scheduler.failed:
       continue
-    done_alr.append(key_data)
-    link = f"https://selfservice.mypurdue.purdue.edu/prod/bwckctlg.p_disp_course_detail?cat_term_in=202420&subj_code_in={class_data['subjectCode']}&crse_numb_in={class_data['courseCode']}"
-    driver.get(link)
-
-    tds_ntdefault = driver.find_elements(By.XPATH, "//td[@class='ntdefault']")
-    td = tds_ntdefault[0]
-
-    content = td.get_attribute('innerHTML')
-    if 'Prerequisites' not in content:
+    entry = catalog_cache.lookup(course_key(link))
+    if entry is None:
+      missing += 1
+      scheduler.record(key_data, TransientError("no stored detail page"))
       continue
-    pattern = r'Prerequisites:.*?<br>(.*?)<br>'
-    match = re.search(pattern, content, re.DOTALL)
-
-    if match:
-      prerequisites_text = match.group(1)
-      pattern = r' <a\s+(?:[^>]*?\s+)?href=(["\'])(.*?)\1>'
-      clean_content = re.sub(pattern, '', prerequisites_text)
-      pattern = r'</a>'
-      clean_content = re.sub(pattern, '', clean_content)
-      
-      s, ecode = prereqs(clean_content, key_data)
-      if s != None:
-          for i in range(len(s)):
-              if len(s[i].split(' ')) == 3:
-                  sub, code, concurrent = s[i].split(' ')
-                  detailId = getDetailId(sub, code)
-                  if detailId != None:
-                    s[i] = f'{detailId} {concurrent}'
-          data[key_data] = s
-  except:
-    continue
-with open('../data/prereqs/classes_prereqs.json', 'w') as fp:
+    try:
+      s = parse_course(entry["body"])
+    except Exception as e:
+      scheduler.record(key_data, e)
+      tqdm.write(f"failed to parse {key_data}: {e}")
+      continue
+    if s is not None:
+      data[key_data] = s
+    else:
+      data.pop(key_data, None)
+  stage.records_out = len(data)
+if missing > 0:
+  print(f"{missing} courses have no stored detail page; run without -offline to fetch them")
+
+catalog_cache.close()
+scheduler.save_failed(failed_file)
+if len(scheduler.failed) > 0:
+  print(f"{len(scheduler.failed)} courses failed and have no prereqs in the output; re-run them with -only-failed (see {failed_file})")
+with runreport.stage("write") as stage, open(outfile, 'w') as fp:
     json.dump(data, fp)
-
-
-
-
+    stage.records_out = len(data)
@@ -4,43 +4,195 @@ import json
 import redis
 from redis.commands.json.path import Path
 from tqdm import tqdm
+from jsonstream import iter_records, content_hash
+import runreport
 # from dotenv import load_dotenv
 import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 # load_dotenv()
 
 # REDIS_HOST = os.getenv('REDIS_HOST')
 # REDIS_PORT = os.getenv('REDIS_PORT')
 # REDIS_PASSWORD = os.getenv('REDIS_PASSWORD')
 
-r = redis.Redis(host='localhost', port=6379)
-r.flushall()
 parser = argparse.ArgumentParser(description='data files')
-parser.add_argument("-data", default="classes_out.json", dest="infile", help="which file to get data from")
+parser.add_argument("-data", default="classes_out.json", dest="infile", help="which file to get data from (JSON array or .jsonl)")
+parser.add_argument("-batch", default=500, type=int, dest="batch", help="documents sent per pipelined round trip")
+parser.add_argument("-connections", default=1, type=int, dest="connections", help="batches in flight at once, each on its own connection")
+parser.add_argument("-incremental", action="store_true", dest="incremental", help="only write/delete documents that changed in the live generation")
+parser.add_argument("-host", default="localhost", dest="host", help="Redis host")
+parser.add_argument("-port", default=6379, type=int, dest="port", help="Redis port")
+runreport.add_arguments(parser)
 
 args = parser.parse_args()
+runreport.start("push", args)
+
+r = redis.Redis(host=args.host, port=args.port, max_connections=args.connections + 1)
+
+# the site always queries the idx:classes alias. each full push loads a new generation under
+# its own key prefix and index, then repoints the alias, so reads never see a half-built index.
+# documents are keyed by detailId, and v<n>:hashes maps each key to a hash of its content.
+alias = "idx:classes"
+
+def index_info(name):
+  info = r.execute_command("FT.INFO", name)
+  if isinstance(info, dict):
+    return info
+  return {info[i].decode() if isinstance(info[i], bytes) else info[i]: info[i + 1] for i in range(0, len(info), 2)}
+
+def decode(value):
+  return value.decode() if isinstance(value, bytes) else value
+
+def unlink_prefix(key_prefix):
+  # UNLINK frees the memory in a background thread on the server
+  pipe = r.pipeline(transaction=False)
+  for key in r.scan_iter(match=key_prefix + "*", count=1000):
+    pipe.unlink(key)
+    if len(pipe) >= 1000:
+      pipe.execute()
+  pipe.execute()
+
+def documents(infile):
+  # a few courses share a detailId; later ones get a :2, :3.. suffix so none are lost
+  seen = {}
+  for classData in iter_records(infile):
+    name = classData["detailId"]
+    if name in seen:
+      seen[name] += 1
+      name = f"{name}:{seen[name]}"
+    else:
+      seen[name] = 1
+    yield name, classData
+
+def push_batch(prefix, batch):
+  # one round trip per batch; transaction=False so Redis doesn't wrap it in MULTI/EXEC
+  pipe = r.pipeline(transaction=False)
+  for name, classData, digest in batch:
+    pipe.json().set(prefix + "classes:" + name, Path.root_path(), classData)
+    pipe.hset(prefix + "hashes", name, digest)
+  pipe.execute()
+  runreport.count("redis round trips")
+  runreport.count("redis commands", 2 * len(batch))
+  return len(batch)
+
+def load(prefix, known):
+  """
+  writes every document whose hash differs from known (name -> hash) under prefix.
+  returns (documents read, documents written, names read).
+  """
+  count = 0
+  written = 0
+  names = set()
+  start = time.perf_counter()
+  bar = tqdm(unit="docs")
+  with runreport.stage("load") as stage, ThreadPoolExecutor(max_workers=args.connections) as executor:
+    pending = set()
+    batch = []
+    for name, classData in documents(args.infile):
+      count += 1
+      names.add(name)
+      digest = content_hash(classData)
+      if known.get(name) == digest:
+        bar.update(1)
+        continue
+      batch.append((name, classData, digest))
+      if len(batch) == args.batch:
+        pending.add(executor.submit(push_batch, prefix, batch))
+        batch = []
+        # keep at most one queued batch per connection so the input is still streamed
+        if len(pending) >= args.connections:
+          done, pending = wait(pending, return_when=FIRST_COMPLETED)
+          for future in done:
+            written += future.result()
+            bar.update(future.result())
+    if len(batch) > 0:
+      pending.add(executor.submit(push_batch, prefix, batch))
+    for future in pending:
+      written += future.result()
+      bar.update(future.result())
+    stage.records_in = count
+    stage.records_out = written
+  bar.close()
+  elapsed = time.perf_counter() - start
+  print(f"read {count} documents, wrote {written} in {elapsed:.2f}s ({written / max(elapsed, 1e-9):.0f} docs/sec)")
+  return count, written, names
+
+try:
+  live = decode(index_info(alias)["index_name"])
+except redis.ResponseError:
+  live = None
+
+if args.incremental and live is not None and live.startswith(alias + ":v"):
+  # RediSearch reindexes the keys we touch, the rest of the live generation stays as is
+  prefix = live[len(alias) + 1:] + ":"
+  known = {decode(k): decode(v) for k, v in r.hgetall(prefix + "hashes").items()}
+  count, written, names = load(prefix, known)
+  removed = [name for name in known if name not in names]
+  with runreport.stage("remove", records_in=len(removed)):
+    pipe = r.pipeline(transaction=False)
+    for name in removed:
+      pipe.unlink(prefix + "classes:" + name)
+      pipe.hdel(prefix + "hashes", name)
+    pipe.execute()
+    runreport.count("redis round trips")
+    runreport.count("redis commands", 2 * len(removed))
+  print(f"{live}: {written} documents written, {len(removed)} removed, {count - written} unchanged")
+  raise SystemExit(0)
+
+if args.incremental:
+  print(f"{alias} has no generation to update, doing a full push")
+
+generation = r.incr("idx:classes:generation")
+prefix = f"v{generation}:"
+index = f"{alias}:v{generation}"
 
 # push all data
-count = 1
-f = open(args.infile)
-data = json.load(f)
-for classData in tqdm(data):
-  key = "classes:" + str(count)
-  r.json().set(key, Path.root_path(), classData)
-  count += 1
-
-r.execute_command("FT.CONFIG", "SET", "MINPREFIX", "1")
-
-# create index
-r.execute_command("FT.CREATE", "idx:classes", "ON", "JSON", "PREFIX", "1", 
-              "classes:", "SCHEMA", 
-              "$.fullTitle", "AS", "fullTitle", "TEXT", "WEIGHT", "50", 
-              "$.detailId", "AS", "detailId", "TAG", 
-              "$.description", "AS", "description", "TEXT", 
-              "$.subjectCode", "AS", "subjectCode", "TAG", 
-              "$.terms[*]", "AS", "terms", "TAG", 
-              "$.courseCode", "AS", "courseCode", "NUMERIC", "SORTABLE",
-              "$.instructor[*][*]", "AS", "instructor", "TEXT", "NOSTEM", 
-              "$.credits[0]", "AS", "creditMin", "NUMERIC", 
-              "$.credits[1]", "as", "creditMax", "NUMERIC", 
-              "$.gened[*]", "AS", "gened", "TAG",
-              "$.sched[*]", "AS", "sched", "TAG")
+load(prefix, {})
+
+with runreport.stage("index") as stage:
+  r.execute_command("FT.CONFIG", "SET", "MINPREFIX", "1")
+
+  # create index
+  r.execute_command("FT.CREATE", index, "ON", "JSON", "PREFIX", "1",
+                prefix + "classes:", "SCHEMA",
+                "$.fullTitle", "AS", "fullTitle", "TEXT", "WEIGHT", "50",
+                "$.detailId", "AS", "detailId", "TAG",
+                "$.description", "AS", "description", "TEXT",
+                "$.subjectCode", "AS", "subjectCode", "TAG",
+                "$.terms[*]", "AS", "terms", "TAG",
+                "$.courseCode", "AS", "courseCode", "NUMERIC", "SORTABLE",
+                "$.instructor[*][*]", "AS", "instructor", "TEXT", "NOSTEM",
+                "$.credits[0]", "AS", "creditMin", "NUMERIC",
+                "$.credits[1]", "as", "creditMax", "NUMERIC",
+                "$.gened[*]", "AS", "gened", "TAG",
+                "$.sched[*]", "AS", "sched", "TAG")
+
+  # the existing keys are indexed in the background; only swap once that is done
+  while True:
+    info = index_info(index)
+    if int(info["indexing"]) == 0 and float(info["percent_indexed"]) >= 1:
+      break
+    time.sleep(0.5)
+  print(f"{index} finished indexing {decode(info['num_docs'])} documents")
+  stage.records_out = int(decode(info["num_docs"]))
+
+with runreport.stage("swap"):
+  if live == alias:
+    # first push since idx:classes was a plain index: it has to go before the alias can take its name
+    r.execute_command("FT.DROPINDEX", alias)
+    r.execute_command("FT.ALIASADD", alias, index)
+    unlink_prefix("classes:")
+  elif live is None:
+    r.execute_command("FT.ALIASADD", alias, index)
+  else:
+    r.execute_command("FT.ALIASUPDATE", alias, index)
+  print(f"{alias} now points at {index}")
+
+  # drop every older generation, including ones left behind by interrupted pushes
+  for name in r.execute_command("FT._LIST"):
+    name = decode(name)
+    if name.startswith(alias + ":v") and name != index:
+      r.execute_command("FT.DROPINDEX", name)
+      unlink_prefix(name[len(alias) + 1:] + ":")
+      print(f"dropped {name}")
@@ -0,0 +1,32 @@
+import threading
+import time
+from urllib.parse import urlsplit
+import runreport
+
+"""
+per-host request pacing shared by every worker thread in a scrape
+"""
+
+
+class HostRateLimiter:
+    def __init__(self, rate):
+        # rate is requests per second per host; 0 or less turns pacing off
+        self.interval = 1 / rate if rate > 0 else 0
+        self.next_slot = {}
+        self.lock = threading.Lock()
+
+    def wait(self, url):
+        """
+        blocks until the caller may send its request to url's host
+        """
+        host = urlsplit(url).netloc
+        # every request the scrapers send passes through here
+        runreport.count(f"requests {host}")
+        if self.interval == 0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
@@ -0,0 +1,253 @@
+import argparse
+import atexit
+import cProfile
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # not on windows; peak RSS and child CPU time are left out there
+    resource = None
+
+"""
+per-stage instrumentation for the pipeline scripts (download, scrape, harmonize, prereqs,
+push, sitemap). a script calls start() once after parsing its arguments, then wraps each
+stage:
+
+    with runreport.stage("sync_classes", records_in=len(grouped)) as s:
+        ...
+        s.records_out = len(out)
+
+and code that talks to the outside world calls runreport.count("redis batches"). calls are
+credited to the stage open at the time, from any thread. without start() all of this is a
+no-op, so library code can be instrumented unconditionally.
+
+each stage records wall time, CPU time (this process and any child processes it waited on),
+RSS at its end and the process's peak RSS so far. -trace-memory adds tracemalloc's peak of
+Python allocations within the stage (slower), -profile writes a cProfile dump per stage
+(main thread only) next to the report.
+
+when the script exits the report is written as JSON to -report (by default
+reports/<script>-<time>-<pid>.json). compare two runs with
+
+    python3 runreport.py reports/harmonize-A.json reports/harmonize-B.json
+"""
+
+current = None
+
+
+def rss_mb():
+    # resident set size right now (linux only, None elsewhere)
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / 2**20, 1)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macOS
+    return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+def cpu_seconds():
+    if resource is None:
+        return time.process_time()
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+class Stage:
+    fields = ["wall", "cpu", "rss_mb", "peak_rss_mb", "traced_peak_mb", "records_in", "records_out", "error", "profile"]
+
+    def __init__(self, name, records_in=None):
+        self.name = name
+        for field in self.fields:
+            setattr(self, field, None)
+        self.records_in = records_in
+        self.calls = {}
+
+    def to_json(self):
+        report = {"name": self.name}
+        for field in self.fields:
+            if getattr(self, field) is not None:
+                report[field] = getattr(self, field)
+        report["calls"] = self.calls
+        return report
+
+
+class RunReport:
+    def __init__(self, script, path, profile=False, trace_memory=False):
+        self.script = script
+        self.path = path
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.started = datetime.datetime.now().isoformat(timespec="seconds")
+        self.start_wall = time.perf_counter()
+        self.start_cpu = cpu_seconds()
+        self.stages = []
+        self.open = []
+        self.calls = {}
+        self.lock = threading.Lock()
+        self.error = None
+        if trace_memory:
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name, records_in=None):
+        stage = Stage(name, records_in)
+        profiler = None
+        if self.profile and threading.current_thread() is threading.main_thread() and not any(s.profile is not None for s in self.open):
+            profiler = cProfile.Profile()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            traced_start = tracemalloc.get_traced_memory()[0]
+        with self.lock:
+            self.open.append(stage)
+        start_wall = time.perf_counter()
+        start_cpu = cpu_seconds()
+        if profiler is not None:
+            stage.profile = f"{os.path.splitext(self.path)[0]}.{name}.prof"
+            profiler.enable()
+        try:
+            yield stage
+        except BaseException as e:
+            stage.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                profiler.dump_stats(stage.profile)
+            stage.wall = round(time.perf_counter() - start_wall, 4)
+            stage.cpu = round(cpu_seconds() - start_cpu, 4)
+            stage.rss_mb = rss_mb()
+            stage.peak_rss_mb = peak_rss_mb()
+            if self.trace_memory:
+                stage.traced_peak_mb = round((tracemalloc.get_traced_memory()[1] - traced_start) / 2**20, 1)
+            with self.lock:
+                self.open.remove(stage)
+                self.stages.append(stage)
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.calls[name] = self.calls.get(name, 0) + n
+            if len(self.open) > 0:
+                calls = self.open[-1].calls
+                calls[name] = calls.get(name, 0) + n
+
+    def to_json(self):
+        return {
+            "script": self.script,
+            "argv": sys.argv[1:],
+            "started": self.started,
+            "python": sys.version.split()[0],
+            "wall": round(time.perf_counter() - self.start_wall, 4),
+            "cpu": round(cpu_seconds() - self.start_cpu, 4),
+            "peak_rss_mb": peak_rss_mb(),
+            "error": self.error,
+            "calls": self.calls,
+            "stages": [stage.to_json() for stage in self.stages],
+        }
+
+    def write(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.to_json(), f, indent=4)
+        os.replace(tmp, self.path)
+
+
+def add_arguments(parser):
+    parser.add_argument("-report", default="reports/", dest="report", help="run report path, or a folder for <script>-<time>-<pid>.json")
+    parser.add_argument("-profile", action="store_true", dest="profile", help="write a cProfile dump per stage next to the report")
+    parser.add_argument("-trace-memory", action="store_true", dest="trace_memory", help="record each stage's peak Python allocations with tracemalloc (slower)")
+
+
+def start(script, args):
+    """
+    starts the run report for this invocation; it is written when the interpreter exits
+    """
+    global current
+    path = args.report
+    if not path.endswith(".json"):
+        # pipeline.py runs several copies of a script at once, so the pid keeps their names apart
+        path = os.path.join(path, f"{script}-{datetime.datetime.now().strftime('%Y%m%dT%H%M%S')}-{os.getpid()}.json")
+    current = RunReport(script, path, args.profile, args.trace_memory)
+
+    previous_hook = sys.excepthook
+
+    def excepthook(kind, value, traceback):
+        current.error = f"{kind.__name__}: {value}"
+        previous_hook(kind, value, traceback)
+
+    sys.excepthook = excepthook
+    atexit.register(current.write)
+    return current
+
+
+@contextmanager
+def stage(name, records_in=None):
+    if current is None:
+        yield Stage(name, records_in)
+        return
+    with current.stage(name, records_in) as s:
+        yield s
+
+
+def count(name, n=1):
+    if current is not None:
+        current.count(name, n)
+
+
+def compare(old, new):
+    """
+    prints the stages of two reports side by side
+    """
+    def change(a, b):
+        if a is None or b is None:
+            return ""
+        return f"{b / max(a, 1e-9) - 1:+.0%}"
+
+    print(f"{old['script']} {old['started']} -> {new['script']} {new['started']}")
+    before = {s["name"]: s for s in old["stages"]}
+    rows = [("run", old, new)] + [(s["name"], before.get(s["name"]), s) for s in new["stages"]]
+    print(f"  {'stage':<18}{'wall':>18}{'cpu':>18}{'peak rss MB':>22}{'records out':>20}")
+    for name, a, b in rows:
+        a = a or {}
+        line = f"  {name:<18}"
+        for key, width in (("wall", 18), ("cpu", 18), ("peak_rss_mb", 22)):
+            value = f"{b.get(key)}" + (f" ({change(a.get(key), b.get(key))})" if a.get(key) is not None and b.get(key) is not None else "")
+            line += f"{value:>{width}}"
+        if a.get("records_out") is not None or b.get("records_out") is not None:
+            line += f"{a.get('records_out')} -> {b.get('records_out')}".rjust(20)
+        print(line)
+        for call in sorted(set(a.get("calls", {})) | set(b.get("calls", {}))):
+            print(f"    {call}: {a.get('calls', {}).get(call, 0)} -> {b.get('calls', {}).get(call, 0)}")
+    for name in before:
+        if name not in {s["name"] for s in new["stages"]}:
+            print(f"  {name} only ran before")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="compare two run reports")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    args = parser.parse_args()
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    compare(old, new)
@@ -0,0 +1,284 @@
+import argparse
+import html
+import json
+import re
+import time
+from urllib.parse import urljoin
+
+import lxml.html
+from lxml import etree
+
+"""
+offline parsing for the selfservice class schedule and catalog pages.
+
+these work on raw page HTML (from requests or driver.page_source), so scrape.py can
+process a results page without one WebDriver round trip per element, and a saved page
+can be re-parsed on its own:
+
+  python3 schedule_parser.py saved_results.html
+  python3 schedule_parser.py saved_results.html --bench 100
+"""
+
+link = "https://selfservice.mypurdue.purdue.edu/prod/bwckschd.p_disp_dyn_sched"
+
+# compiled once and reused for every page
+sections_xpath = etree.XPath("//table[@summary='This layout table is used to present the sections found']")
+# any element carrying the ddlabel class, like By.CLASS_NAME does
+label_xpath = etree.XPath(".//*[contains(concat(' ', normalize-space(@class), ' '), ' ddlabel ')]")
+detail_xpath = etree.XPath("//td[@class='dddefault' and a[text()='View Catalog Entry']]")
+catalog_xpath = etree.XPath("//*[contains(concat(' ', normalize-space(@class), ' '), ' ntdefault ')]")
+link_xpath = etree.XPath(".//a")
+table_xpath = etree.XPath(".//table")
+cell_xpath = etree.XPath(".//td")
+whitespace = re.compile(r"\s+")
+# shown instead of the sections table when a subject has no classes that term
+no_classes_text = "No classes were found"
+
+
+def inner_html(el):
+    """
+    the element's innerHTML as a browser would report it: escaped text and non-breaking spaces as &nbsp;
+    """
+    out = html.escape(el.text or "", quote=False)
+    for child in el:
+        out += lxml.html.tostring(child, encoding="unicode", method="html", with_tail=False)
+        out += html.escape(child.tail or "", quote=False)
+    return out.replace("\xa0", "&nbsp;")
+
+
+def element_text(el):
+    # WebElement.text collapses whitespace and turns &nbsp; into spaces
+    return whitespace.sub(" ", el.text_content()).strip()
+
+
+def parse_section_row(th, td, base_url=link):
+    """
+    one section from its title cell and its detail cell. returns None when the detail cell
+    has no meeting times table.
+    """
+    a = link_xpath(th)[0]
+    fullTitle = inner_html(a).split(" - ")
+    tables = table_xpath(td)
+    if len(tables) == 0:
+        return None
+    curr_table = tables[0]
+    cells = cell_xpath(curr_table)
+    # possible improvement: add prof email
+    instructors = [instr.split("(")[0].strip() for instr in element_text(cells[-1]).split(",")]
+    return {
+        "title": fullTitle[0],
+        "crn": int(fullTitle[-3]),
+        "subjectCode": fullTitle[-2].split(' ')[0],
+        "courseCode": fullTitle[-2].split(' ')[1],
+        "sched": element_text(cells[-2]),
+        "instructors": instructors,
+        "catalogLink": urljoin(base_url, link_xpath(td)[0].get("href")),
+    }
+
+
+def parse_sections(page, base_url=link):
+    """
+    every section row on a results page, or None if the page has no sections table
+    """
+    doc = lxml.html.fromstring(page)
+    table = sections_xpath(doc)
+    if len(table) == 0:
+        return None
+    ths = label_xpath(table[0])
+    tds = detail_xpath(doc)
+    assert(len(ths) == len(tds))
+    rows = []
+    for th, td in zip(ths, tds):
+        row = parse_section_row(th, td, base_url)
+        if row is not None:
+            rows.append(row)
+    return rows
+
+
+def catalog_html(page):
+    """
+    innerHTML of the catalog entry cell, or None if the page has none
+    """
+    cells = catalog_xpath(lxml.html.fromstring(page))
+    if len(cells) == 0:
+        return None
+    return inner_html(cells[0])
+
+
+def parse_catalog(content):
+    """
+    (description, [min credits, max credits]) from the catalog entry cell's innerHTML
+    """
+    desc = content.split("\n")[1]
+    description = desc.split(".00.")[-1].strip()
+    cred = desc.split('.00.')[0].split(': ')[-1]
+    try:
+        if "to" in cred:
+            credits = [int(float(cred.split(" to ")[0])), int(float(cred.split(" to ")[1]))]
+        elif "or" in cred:
+            credits = [int(float(cred.split(" or ")[0])), int(float(cred.split(" or ")[1]))]
+        else:
+            credits = [int(float(cred)), int(float(cred))]
+    except:
+        credits = [0, 0]
+    return description, credits
+
+
+def format_instructors(by_sched):
+    special_sched = ["Laboratory", "Laboratory Preparation", "Recitation", "Practice Study Observation"]
+    count = 0
+    for sched in special_sched:
+        if sched in by_sched:
+            count += 1
+
+    if len(by_sched) == count:
+        return by_sched
+
+    for sched in special_sched:
+        if sched in by_sched:
+            del by_sched[sched]
+
+    return by_sched
+
+
+def course_records(rows, term, catalog_contents):
+    """
+    one record per course from a subject's section rows, as scrape.py writes them to
+    temp_<sem>/<CODE>.json. catalog_contents(links) returns the catalog entry cell for each
+    course's "View Catalog Entry" link, in order, or None for a course to leave out.
+    """
+    doneIds = {}
+    catalogEntries = {}
+    for row in rows:
+        classStruct = {
+            "title": None,
+            "subjectCode": None,
+            "courseCode": None,
+            "instructor": None,
+            "description": None,
+            "capacity": 0,
+            "credits": None,
+            "term": term,
+            "crn": None,
+            "sched": None
+        }
+        classStruct["title"] = row["title"]
+        curr_crn = row["crn"]
+        classStruct["subjectCode"] = row["subjectCode"]
+        classStruct["courseCode"] = row["courseCode"]
+        classfullId = classStruct["courseCode"] + classStruct["title"]
+
+        sched_type = row["sched"]
+        instructors = row["instructors"]
+
+        if classfullId in doneIds:
+            if sched_type in doneIds[classfullId]["instructor"]:
+                doneIds[classfullId]["instructor"][sched_type].extend(instructors)
+            else:
+                doneIds[classfullId]["instructor"][sched_type] = instructors
+            doneIds[classfullId]["crn"].append(curr_crn)
+            doneIds[classfullId]["sched"].append(sched_type)
+            continue
+        else:
+            classStruct["instructor"] = {}
+            classStruct["instructor"][sched_type] = instructors
+            classStruct["crn"] = [curr_crn]
+            classStruct["sched"] = [sched_type]
+            catalogEntries[classfullId] = row["catalogLink"]
+
+            doneIds[classfullId] = classStruct
+
+    for courseId in doneIds:
+        # final processing for instructor
+        doneIds[courseId]["instructor"] = format_instructors(doneIds[courseId]["instructor"])
+        all_instructors = []
+        for x in doneIds[courseId]["instructor"]:
+            all_instructors.extend(doneIds[courseId]["instructor"][x])
+        doneIds[courseId]["instructor"] = set(all_instructors)
+        doneIds[courseId]["sched"] = list(set(doneIds[courseId]["sched"]))
+        if "TBA" in doneIds[courseId]["instructor"] and len(doneIds[courseId]["instructor"]) > 1:
+            doneIds[courseId]["instructor"].remove("TBA")
+        doneIds[courseId]["instructor"] = list(doneIds[courseId]["instructor"])
+
+    contents = catalog_contents(list(catalogEntries.values()))
+    for courseId, content in zip(catalogEntries, contents):
+        if content is None:
+            del doneIds[courseId]
+            continue
+        doneIds[courseId]["description"], doneIds[courseId]["credits"] = parse_catalog(content)
+
+    code_data = []
+    for x in doneIds:
+        doneIds[x]["title"] = doneIds[x]["title"].replace("&amp;", "&")
+        doneIds[x]["title"] = doneIds[x]["title"].replace("&nbsp;", " ")
+        doneIds[x]["title"] = doneIds[x]["title"].strip()
+        doneIds[x]["description"] = doneIds[x]["description"].replace("&nbsp;", " ")
+        doneIds[x]["description"] = doneIds[x]["description"].replace("&amp;", "&")
+        doneIds[x]["description"] = doneIds[x]["description"].strip()
+        code_data.append(doneIds[x])
+    return code_data
+
+
+def form_fields(page, control, choose=None):
+    """
+    the form containing the named control, serialized the way a browser submits it.
+    choose maps a select's name to the option values to select instead of its defaults.
+    returns (action url, [(name, value), ..], {select name: [(value, text), ..]})
+    """
+    choose = choose or {}
+    doc = lxml.html.fromstring(page)
+    form = doc.xpath(f"//form[.//*[@name='{control}']]")[0]
+    fields = []
+    options = {}
+    submitted = False
+    for el in form.xpath(".//input | .//select"):
+        name = el.get("name")
+        kind = (el.get("type") or "text").lower()
+        if el.tag == "input" and kind == "submit":
+            # only the first submit button is clicked, and it is only sent if it has a name
+            if not submitted and name is not None:
+                fields.append((name, el.get("value", "")))
+            submitted = True
+            continue
+        if name is None:
+            continue
+        if el.tag == "select":
+            opts = [(o.get("value", o.text_content()), whitespace.sub(" ", o.text_content()).strip(), o.get("selected") is not None) for o in el.xpath(".//option")]
+            options[name] = [(value, text) for value, text, _ in opts]
+            if name in choose:
+                selected = [value for value, _, _ in opts if value in choose[name]]
+            else:
+                selected = [value for value, _, default in opts if default]
+                if len(selected) == 0 and el.get("multiple") is None and len(opts) > 0:
+                    selected = [opts[0][0]]
+            fields.extend((name, value) for value in selected)
+            continue
+        if kind in ("button", "reset", "image", "file"):
+            continue
+        if kind in ("checkbox", "radio") and el.get("checked") is None:
+            continue
+        fields.append((name, el.get("value", "")))
+    return urljoin(link, form.get("action")), fields, options
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="parse a saved schedule results or catalog page")
+    parser.add_argument("page", help="saved HTML file")
+    parser.add_argument("--catalog", action="store_true", help="parse a catalog entry page instead")
+    parser.add_argument("--bench", default=0, type=int, help="parse the page this many times and report the time per parse")
+    args = parser.parse_args()
+
+    with open(args.page) as f:
+        page = f.read()
+    if args.bench > 0:
+        parse = (lambda: parse_catalog(catalog_html(page))) if args.catalog else (lambda: parse_sections(page))
+        start = time.perf_counter()
+        for _ in range(args.bench):
+            parse()
+        elapsed = time.perf_counter() - start
+        print(f"{args.bench} parses in {elapsed:.3f}s ({elapsed / args.bench * 1000:.2f} ms per page)")
+    elif args.catalog:
+        content = catalog_html(page)
+        print(json.dumps(None if content is None else parse_catalog(content), indent=4))
+    else:
+        print(json.dumps(parse_sections(page), indent=4))
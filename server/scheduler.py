@@ -0,0 +1,159 @@
+import json
+import os
+import random
+import threading
+import time
+
+"""
+retries, backoff and adaptive concurrency for the scrapers (scrape.py, prereqs.py).
+
+a Scheduler sits in front of each unit of work (a subject, a catalog page). every attempt
+takes one of `limit` slots; the limit starts at the worker count and is halved when attempts
+fail and lowered by one when latency climbs well above the best seen, then grows back by one
+per window of healthy attempts. pacing per host is still ratelimit.HostRateLimiter's job.
+
+failed attempts are retried with exponential backoff and full jitter. items that run out of
+attempts are kept in `failed` with their last error, so they can be saved and re-run alone.
+"""
+
+
+class TransientError(Exception):
+    """
+    raised by a task when a page came back incomplete and is worth fetching again
+    """
+
+
+class Failed(Exception):
+    """
+    an item that ran out of attempts. never retried by an enclosing scheduler.
+    """
+    def __init__(self, item, error):
+        super().__init__(f"{item}: {error}")
+        self.item = item
+        self.error = error
+
+
+def describe(error):
+    return f"{type(error).__name__}: {error}"
+
+
+class Scheduler:
+    def __init__(self, max_workers, retries=3, backoff=1.0, max_backoff=60.0, retry_on=(Exception,)):
+        self.max_workers = max(1, max_workers)
+        self.limit = self.max_workers
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retry_on = retry_on
+
+        self.cond = threading.Condition()
+        self.inflight = 0
+        # latency EWMA of successful attempts and the lowest it has been
+        self.latency = None
+        self.best = None
+        # attempts since the limit last changed
+        self.window = 0
+
+        self.attempts = 0
+        self.retried = 0
+        self.failed = {}
+
+    def acquire(self):
+        with self.cond:
+            while self.inflight >= self.limit:
+                self.cond.wait()
+            self.inflight += 1
+
+    def release(self, elapsed=None, error=False):
+        with self.cond:
+            self.inflight -= 1
+            self.attempts += 1
+            self.window += 1
+            if error:
+                # multiplicative decrease, at most once per window so one burst of errors can't
+                # collapse the limit to 1
+                if self.window >= self.limit:
+                    self.limit = max(1, self.limit // 2)
+                    self.window = 0
+            else:
+                self.latency = elapsed if self.latency is None else 0.8 * self.latency + 0.2 * elapsed
+                self.best = self.latency if self.best is None else min(self.best, self.latency)
+                if self.window >= self.limit:
+                    if self.latency > 2 * self.best:
+                        self.limit = max(1, self.limit - 1)
+                    elif self.latency < 1.5 * self.best:
+                        self.limit = min(self.max_workers, self.limit + 1)
+                    self.window = 0
+            self.cond.notify_all()
+
+    def delay(self, attempt):
+        # full jitter: anywhere between 0 and the exponential cap
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def run(self, item, fn, *args, **kwargs):
+        """
+        fn(*args, **kwargs) with retries. errors matching retry_on are retried after a backoff;
+        anything else, or the last retryable error, records item as failed and raises Failed.
+        """
+        for attempt in range(self.retries + 1):
+            self.acquire()
+            start = time.monotonic()
+            try:
+                result = fn(*args, **kwargs)
+            except Failed as e:
+                # an inner item already used up its own attempts
+                self.release(error=True)
+                self.record(item, e)
+                raise Failed(item, e) from e
+            except self.retry_on as e:
+                self.release(error=True)
+                if attempt == self.retries:
+                    self.record(item, e)
+                    raise Failed(item, e) from e
+                with self.cond:
+                    self.retried += 1
+                time.sleep(self.delay(attempt))
+                continue
+            except Exception as e:
+                self.release(error=True)
+                self.record(item, e)
+                raise Failed(item, e) from e
+            self.release(time.monotonic() - start)
+            with self.cond:
+                self.failed.pop(item, None)
+            return result
+
+    def record(self, item, error):
+        with self.cond:
+            self.failed[item] = describe(error)
+
+    def summary(self):
+        return f"{self.attempts} attempts, {self.retried} retried, {len(self.failed)} failed, concurrency {self.limit}/{self.max_workers}"
+
+    def save_failed(self, path):
+        """
+        writes {item: last error} to path, or removes it when nothing failed
+        """
+        save_failed(path, self.failed)
+
+
+def save_failed(path, failed):
+    if len(failed) == 0:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        return
+    with open(path, "w") as f:
+        json.dump(dict(sorted(failed.items())), f, indent=4)
+
+
+def load_failed(path):
+    """
+    items recorded by save_failed, or [] if the last run had no failures
+    """
+    try:
+        with open(path) as f:
+            return list(json.load(f))
+    except FileNotFoundError:
+        return []
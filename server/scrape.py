@@ -1,47 +1,84 @@
 import argparse
-import json
-from selenium import webdriver
-from selenium.webdriver.support import ui
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.action_chains import ActionChains
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 import os
 import shutil
-
-def format_instructors(by_sched):
-  special_sched = ["Laboratory", "Laboratory Preparation", "Recitation", "Practice Study Observation"]
-  count = 0
-  for sched in special_sched:
-    if sched in by_sched:
-      count += 1
-
-  if len(by_sched) == count:
-    return by_sched
-
-  for sched in special_sched:
-    if sched in by_sched:
-      del by_sched[sched]
-
-  return by_sched
+from schedule_parser import link, no_classes_text, parse_sections, catalog_html, course_records
+from ratelimit import HostRateLimiter
+from catalog_cache import CatalogCache, default_path, default_ttl
+from scheduler import Scheduler, Failed, TransientError, load_failed
+from jsonstream import load_records, write_records
+import runreport
 
 parser = argparse.ArgumentParser(description='which semester')
 parser.add_argument("-sem", default="Fall 2026", dest="sem", help="which semester (default: Fall 2026)")
+parser.add_argument("-engine", default="selenium", choices=["selenium", "http"], dest="engine",
+                    help="selenium drives headless Chrome; http submits the same forms directly (no browser needed)")
+parser.add_argument("-workers", default=4, type=int, dest="workers", help="subjects scraped at once, each with its own browser/session")
+parser.add_argument("-catalog-workers", default=None, type=int, dest="catalog_workers",
+                    help="catalog entry pages fetched at once (default: same as -workers)")
+parser.add_argument("-rate", default=4.0, type=float, dest="rate", help="max requests per second to each host across all workers (0 = no limit)")
+parser.add_argument("-catalog-cache", default=default_path, dest="catalog_cache", help="on-disk catalog page cache shared with prereqs.py")
+parser.add_argument("-save-pages", default=None, dest="save_pages", help="directory to keep each subject's raw results page in (for schedule_parser.py)")
+parser.add_argument("-catalog-ttl", default=default_ttl / 86400, type=float, dest="catalog_ttl", help="days before a cached catalog page is revalidated")
+parser.add_argument("-retries", default=3, type=int, dest="retries", help="times a subject or catalog page is retried before it is recorded as failed")
+parser.add_argument("-timeout", default=30, type=float, dest="timeout", help="seconds to wait for a page to be ready")
+parser.add_argument("-only-failed", action="store_true", dest="only_failed", help="re-run just the subjects the last run recorded as failed")
+parser.add_argument("-format", default="json", choices=["json", "msgpack"], dest="format", help="format of the semester file and per-subject checkpoints (see jsonstream.py)")
+runreport.add_arguments(parser)
 
 args = parser.parse_args()
-
-
-options = Options()
-options.add_argument("--headless")
-options.add_experimental_option("detach", True)
-
-link = "https://selfservice.mypurdue.purdue.edu/prod/bwckschd.p_disp_dyn_sched"
-
-driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
+runreport.start("scrape", args)
+if args.catalog_workers is None:
+  args.catalog_workers = args.workers
+if args.save_pages is not None:
+  os.makedirs(args.save_pages, exist_ok=True)
+
+limiter = HostRateLimiter(args.rate)
+
+if args.engine == "selenium":
+  from selenium import webdriver
+  from selenium.webdriver.support import ui
+  from selenium.webdriver.common.by import By
+  from selenium.webdriver.support import expected_conditions
+  from selenium.common.exceptions import WebDriverException, NoSuchElementException
+  from selenium.webdriver.chrome.options import Options
+  from selenium.webdriver.chrome.service import Service
+  from webdriver_manager.chrome import ChromeDriverManager
+
+  options = Options()
+  options.add_argument("--headless")
+  options.add_experimental_option("detach", True)
+  driver_path = ChromeDriverManager().install()
+  retryable = (WebDriverException, TransientError)
+else:
+  from requests import RequestException
+  from selfservice import SelfService
+  retryable = (RequestException, TransientError)
+
+# every worker thread gets its own browser or HTTP session
+thread_state = threading.local()
+sessions = []
+
+def session():
+  if not hasattr(thread_state, "session"):
+    if args.engine == "selenium":
+      thread_state.session = webdriver.Chrome(service=Service(driver_path), options=options)
+    else:
+      thread_state.session = SelfService(timeout=args.timeout, limiter=limiter)
+    sessions.append(thread_state.session)
+  return thread_state.session
+
+def load_page(driver, url):
+  limiter.wait(url)
+  driver.get(url)
+
+def click(driver, element):
+  # submitting a form loads a page from the same host
+  limiter.wait(link)
+  element.click()
 
 
 class_codes = ["AAE", "AAS", "ABE", "ACCT", "AD", "AFT", "AGEC", "AGR", "AGRY", "AMST", "ANSC", "ANTH", "ARAB", "ARCH", "ASAM", "ASEC", "ASL", "ASM", "ASTR", "AT", "BAND", "BCHM", "BIOL", "BME", "BMS", "BTNY", "BUS", "CAND", "CCE", "CDIS", "CE", "CEM", "CGT", "CHE", "CHM", "CHNS", "CIT", "CLCS", "CLPH", "CM", "CMGT", "CMPL", "CNIT", "COM", "CPB", "CS", "CSCI", "CSR", "DANC", "DCTC", "DSB", "EAPS", "ECE", "ECET", "ECON", "EDCI", "EDPS", "EDST", "EEE", "ENE", "ENGL", "ENGR", "ENGT", "ENTM", "ENTR", "EPCS", "EXPL", "FIN", "FLM", "FNR", "FR", "FS", "FVS", "GEP", "GER", "GRAD", "GREK", "GS", "GSLA", "HDFS", "HEBR", "HER", "HETM", "HHS", "HIST", "HK", "HONR", "HORT", "HSCI", "HSOP", "HTM", "IBE", "IDE", "IDIS", "IE", "IET", "ILS", "IMPH", "IPPH", "INT", "IT", "ITAL", "JPNS", "JWST", "KOR", "LA", "LALS", "LATN", "LC", "LING", "MA", "MATH", "MCMP", "ME", "MET", "MFET", "MGMT", "MIS", "MKTG", "MSE", "MSL", "MSPE", "MUS", "NRES", "NS", "NUCL", "NUPH", "NUR", "NUTR", "OBHR", "OLS", "OPP", "PES", "PHIL", "PHPR", "PHRM", "PHSC", "PHYS", "POL", "PSY", "PTGS", "PUBH", "QM", "REAL", "REG", "REL", "RPMP", "RUSS", "SA", "SCI", "SCLA", "SCOM", "SFS", "SLHS", "SOC", "SPAN", "STAT", "STRT", "SYS", "TCM", "TDM", "TECH", "THTR", "TLI", "VCS", "VIP", "VM", "WGSS"]
@@ -50,25 +87,41 @@ none_found = []
 jsonData = []
 sem_name = args.sem.replace(" ", "").lower()
 temp_dir = f"data/temp_{sem_name}"
+failed_file = f"data/failed_{sem_name}.json"
+
+# subjects and catalog pages are scheduled separately so a subject holding a slot never
+# waits on a catalog page that can't get one
+subject_scheduler = Scheduler(args.workers, retries=args.retries, retry_on=retryable)
+catalog_scheduler = Scheduler(args.catalog_workers, retries=args.retries, retry_on=retryable)
 
 def ensure_temp_dir(temp_dir):
     if not os.path.exists(temp_dir):
         os.makedirs(temp_dir)
 
-ensure_temp_dir(temp_dir)
-
-for code in class_codes:
-    temp_file = f"{temp_dir}/{code}.json"
-
-    if os.path.exists(temp_file):
-        print(f"Loading existing data for {code}...")
-        with open(temp_file, 'r') as f:
-            code_data = json.load(f)
-            jsonData.extend(code_data)
-        continue
-
-    print(f"starting {code}...")
-    driver.get(link)
+def save_page(code, page):
+    # keeps the raw results page so the parser can be re-run or benchmarked on it later
+    if args.save_pages is None:
+      return
+    with open(os.path.join(args.save_pages, f"{code}.html"), "w") as f:
+      f.write(page)
+
+def results_rows(page, base_url=link):
+    """
+    section rows on a results page, None if it says no classes were found. a page with
+    neither was cut short and is fetched again.
+    """
+    rows = parse_sections(page, base_url)
+    if rows is None and no_classes_text not in page:
+      raise TransientError("results page has no sections table and no \"no classes\" message")
+    return rows
+
+def selenium_subject_rows(code):
+    """
+    walks the term and subject forms in Chrome for one subject. returns the section rows,
+    None if the results page has no sections table, or False if the subject isn't offered.
+    """
+    driver = session()
+    load_page(driver, link)
 
     dropdown_element = driver.find_element(By.NAME, "p_term")
     dropdown = ui.Select(dropdown_element)
@@ -79,18 +132,15 @@ for code in class_codes:
 
     xpath_expression = "//input[@type='submit']"
     element = driver.find_element(By.XPATH, xpath_expression)
-    element.click()
-
-    time.sleep(1)
+    click(driver, element)
 
-    code_dropdown = driver.find_element(By.XPATH, "//select[@name='sel_subj']")
+    wait = ui.WebDriverWait(driver, args.timeout)
+    code_dropdown = wait.until(expected_conditions.presence_of_element_located((By.XPATH, "//select[@name='sel_subj']")))
     code_dropdown = ui.Select(code_dropdown)
     try:
       code_dropdown.select_by_value(code)
-    except:
-      print("no classes found")
-      none_found.append(code)
-      continue
+    except NoSuchElementException:
+      return False
     # type_dropdown = driver.find_element(By.XPATH, "//select[@name='sel_schd']")
     # type_dropdown = ui.Select(type_dropdown)
     # type_dropdown.deselect_all()
@@ -105,123 +155,142 @@ for code in class_codes:
     campus_dropdown.select_by_value("PWL")
 
     class_search_element = driver.find_element(By.XPATH, xpath_expression)
-    class_search_element.click()
-
-    time.sleep(3)
-
-    table = driver.find_elements(By.XPATH, "//table[@summary='This layout table is used to present the sections found']")
-    if (len(table) == 0):
-      print("no classes found")
-      continue
-    table = table[0]
-    tbody = table.find_element(By.TAG_NAME, "tbody")
-    ths = tbody.find_elements(By.CLASS_NAME, "ddlabel")
-    tds = tbody.find_elements(By.XPATH, "//td[@class='dddefault' and a[text()='View Catalog Entry']]")
-    assert(len(ths) == len(tds))
-    doneIds = {}
-    catalogEntries = {}
-    for i in range(len(ths)):
-      classStruct = {
-        "title": None,
-        "subjectCode": None,
-        "courseCode": None,
-        "instructor": None,
-        "description": None,
-        "capacity": 0,
-        "credits": None,
-        "term": args.sem,
-        "crn": None,
-        "sched": None
-      }
-      th = ths[i]
-      a = th.find_element(By.TAG_NAME, 'a')
-      fullTitle = a.get_attribute('innerHTML').split(" - ")
-      classStruct["title"] = fullTitle[0]
-      curr_crn = int(fullTitle[-3])
-      classStruct["subjectCode"] = fullTitle[-2].split(' ')[0]
-      classStruct["courseCode"] = fullTitle[-2].split(' ')[1]
-      classfullId = classStruct["courseCode"] + classStruct["title"]
+    click(driver, class_search_element)
+
+    # ready once the page has either the sections table or the "no classes" message
+    wait.until(lambda d: d.find_elements(By.XPATH, "//table[@summary='This layout table is used to present the sections found']")
+               or no_classes_text in d.page_source)
+
+    # one snapshot of the results page, parsed offline instead of a WebDriver call per element
+    page = driver.page_source
+    save_page(code, page)
+    return results_rows(page, driver.current_url)
+
+def http_subject_rows(code):
+    # the term form is submitted once per subject worker and reused for every subject it scrapes
+    if not hasattr(thread_state, "search_form"):
+      thread_state.search_form = session().term_form(args.sem)
+    page = session().subject_page(args.sem, code, search_form=thread_state.search_form)
+    if page is None:
+      return False
+    save_page(code, page)
+    return results_rows(page)
+
+def fetch_catalog_page(url, etag, last_modified):
+    if args.engine == "http":
+      return session().fetch(url, etag, last_modified)
+    # the browser can't send validators, so stale pages are simply loaded again
+    driver = session()
+    load_page(driver, url)
+    return driver.page_source, None, None
+
+def catalog_entry(url):
+    """
+    innerHTML of the catalog entry cell on a "View Catalog Entry" page. a page without the
+    cell is an error page and is fetched again; if it keeps coming back Failed is raised.
+    """
+    def fetch():
+      content = catalog_html(catalog_cache.get(url, fetch_catalog_page))
+      if content is None:
+        raise TransientError(f"{url}: catalog page has no catalog entry cell")
+      return content
+    return catalog_scheduler.run(url, fetch)
+
+def scrape_subject(code):
+    """
+    scrapes one subject and checkpoints it to its temp file. returns its courses.
+    """
+    temp_file = f"{temp_dir}/{code}.{args.format}"
+
+    tqdm.write(f"starting {code}...")
+    if args.engine == "http":
+      rows = http_subject_rows(code)
+    else:
+      rows = selenium_subject_rows(code)
+
+    if rows is False:
+      tqdm.write(f"no classes found for {code}")
+      none_found.append(code)
+      return []
+    if rows is None:
+      tqdm.write(f"no classes found for {code}")
+      return []
 
+    def course_entry(url):
+      # one course without a catalog entry leaves that course out, not the whole subject
       try:
-        curr_table = tds[i].find_element(By.TAG_NAME, "table")
-      except:
-        continue
-
-      curr_td = curr_table.find_elements(By.TAG_NAME, "td")[-1]
-      # possible improvement: add prof email
-      sched_type = curr_table.find_elements(By.TAG_NAME, "td")[-2].text
-      instructors = []
-      tmp_instructors = curr_td.text.split(",")
-      for j in range(len(tmp_instructors)):
-        instructors.append(tmp_instructors[j].split("(")[0].strip())
-
-      if classfullId in doneIds:
-        if sched_type in doneIds[classfullId]["instructor"]:
-          doneIds[classfullId]["instructor"][sched_type].extend(instructors)
-        else:
-          doneIds[classfullId]["instructor"][sched_type] = instructors
-        doneIds[classfullId]["crn"].append(curr_crn)
-        doneIds[classfullId]["sched"].append(sched_type)
-        continue
-      else:
-        classStruct["instructor"] = {}
-        classStruct["instructor"][sched_type] = instructors
-        classStruct["crn"] = [curr_crn]
-        classStruct["sched"] = [sched_type]
-        viewCatalog = tds[i].find_elements(By.TAG_NAME, "a")[0]
-        catalogLink = viewCatalog.get_attribute('href')
-        catalogEntries[classfullId] = catalogLink
-
-        doneIds[classfullId] = classStruct
-
-    for courseId in doneIds:
-      # final processing for instructor
-      doneIds[courseId]["instructor"] = format_instructors(doneIds[courseId]["instructor"])
-      all_instructors = []
-      for x in doneIds[courseId]["instructor"]:
-        all_instructors.extend(doneIds[courseId]["instructor"][x])
-      doneIds[courseId]["instructor"] = set(all_instructors)
-      doneIds[courseId]["sched"] = list(set(doneIds[courseId]["sched"]))
-      if "TBA" in doneIds[courseId]["instructor"] and len(doneIds[courseId]["instructor"]) > 1:
-        doneIds[courseId]["instructor"].remove("TBA")
-      doneIds[courseId]["instructor"] = list(doneIds[courseId]["instructor"])
-
-    for courseId in tqdm(catalogEntries):
-      driver.get(catalogEntries[courseId])
-      if len(driver.find_elements(By.CLASS_NAME, "ntdefault")) == 0:
-        continue
-      tds_catalog = driver.find_elements(By.CLASS_NAME, "ntdefault")[0]
-      desc = tds_catalog.get_attribute('innerHTML').split("\n")[1]
-      doneIds[courseId]["description"] = desc.split(".00.")[-1].strip()
-      cred = desc.split('.00.')[0].split(': ')[-1]
-      try:
-        if "to" in cred:
-          doneIds[courseId]["credits"] = [int(float(cred.split(" to ")[0])), int(float(cred.split(" to ")[1]))]
-        elif "or" in cred:
-          doneIds[courseId]["credits"] = [int(float(cred.split(" or ")[0])), int(float(cred.split(" or ")[1]))]
-        else:
-          doneIds[courseId]["credits"] = [int(float(cred)), int(float(cred))]
-      except:
-        doneIds[courseId]["credits"] = [0, 0]
-
-
-    code_data = []
-    for x in doneIds:
-      try:
-        doneIds[x]["title"] = doneIds[x]["title"].replace("&amp;", "&")
-        doneIds[x]["title"] = doneIds[x]["title"].replace("&nbsp;", " ")
-        doneIds[x]["title"] = doneIds[x]["title"].strip()
-        doneIds[x]["description"] = doneIds[x]["description"].replace("&nbsp;", " ")
-        doneIds[x]["description"] = doneIds[x]["description"].replace("&amp;", "&")
-        doneIds[x]["description"] = doneIds[x]["description"].strip()
-        code_data.append(doneIds[x])
-      except:
-        continue
-
-    with open(temp_file, 'w') as f:
-        json.dump(code_data, f, indent=4)
-
-    jsonData.extend(code_data)
-
-outfile = open(f"data/classes_{sem_name}.json", "w")
-json.dump(jsonData, outfile, indent=4)
+        return catalog_entry(url)
+      except Failed as e:
+        tqdm.write(f"{code}: leaving out a course, {e}")
+        missing.append(url)
+        return None
+
+    # catalog pages go to their own pool so a subject worker never waits on its own pool
+    missing = []
+    code_data = course_records(rows, args.sem, lambda links: catalog_pool.map(course_entry, links))
+    if len(missing) > 0:
+      incomplete[code] = missing
+    else:
+      incomplete.pop(code, None)
+
+    write_records(temp_file, code_data)
+
+    return code_data
+
+ensure_temp_dir(temp_dir)
+catalog_cache = CatalogCache(args.catalog_cache, args.catalog_ttl * 86400)
+
+results = {}
+# subjects written without some of their courses -> the catalog pages that failed
+incomplete = {}
+todo = []
+retry_codes = set(load_failed(failed_file)) if args.only_failed else None
+with runreport.stage("load_existing", records_in=len(class_codes)) as stage:
+    for code in class_codes:
+        temp_file = f"{temp_dir}/{code}.{args.format}"
+
+        if os.path.exists(temp_file) and (retry_codes is None or code not in retry_codes):
+            print(f"Loading existing data for {code}...")
+            results[code] = load_records(temp_file)
+            continue
+        if retry_codes is not None and code not in retry_codes:
+            continue
+        todo.append(code)
+    stage.records_out = len(results)
+
+with runreport.stage("scrape", records_in=len(todo)) as stage, ThreadPoolExecutor(max_workers=args.workers) as subject_pool, ThreadPoolExecutor(max_workers=args.catalog_workers) as catalog_pool:
+    futures = {subject_pool.submit(subject_scheduler.run, code, scrape_subject, code): code for code in todo}
+    for future in tqdm(as_completed(futures), total=len(futures), unit="subjects"):
+        try:
+            results[futures[future]] = future.result()
+        except Failed as e:
+            tqdm.write(f"failed {e}")
+    stage.records_out = sum(len(results[code]) for code in todo if code in results)
+    runreport.count("catalog cache hits", catalog_cache.hits)
+    runreport.count("catalog pages revalidated", catalog_cache.revalidated)
+    runreport.count("catalog pages fetched", catalog_cache.fetched)
+
+if args.engine == "selenium":
+  for driver in sessions:
+    driver.quit()
+print(f"catalog pages: {catalog_cache.hits} from cache, {catalog_cache.revalidated} revalidated, {catalog_cache.fetched} fetched")
+catalog_cache.close()
+print(f"subjects: {subject_scheduler.summary()}")
+print(f"catalog pages: {catalog_scheduler.summary()}")
+failed_subjects = len(subject_scheduler.failed)
+for code, urls in incomplete.items():
+    if code not in subject_scheduler.failed:
+        # kept in the output, and listed so -only-failed scrapes the subject again
+        subject_scheduler.record(code, TransientError(f"{len(urls)} courses left out, no catalog entry: {', '.join(urls)}"))
+subject_scheduler.save_failed(failed_file)
+if failed_subjects > 0:
+    print(f"{failed_subjects} subjects failed and are missing from the output; re-run them with -only-failed (see {failed_file})")
+if len(incomplete) > 0:
+    print(f"{sum(len(urls) for urls in incomplete.values())} courses in {len(incomplete)} subjects were left out for lack of a catalog entry; re-run them with -only-failed (see {failed_file})")
+
+# subjects finish in any order; the semester file keeps class_codes order
+with runreport.stage("write") as stage:
+    for code in class_codes:
+        jsonData.extend(results.get(code, []))
+
+    stage.records_out = write_records(f"data/classes_{sem_name}.{args.format}", jsonData)
@@ -1,4 +1,4 @@
 redis-server --daemonize yes --loadmodule /opt/redis-stack/lib/redisearch.so --loadmodule /opt/redis-stack/lib/rejson.so
-python3 push.py
+python3 pipeline.py -no-deps push
 cd ..
 npm run start
\ No newline at end of file
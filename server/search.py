@@ -0,0 +1,311 @@
+import argparse
+import bisect
+import functools
+import heapq
+import math
+import re
+import numpy as np
+from jsonstream import iter_records
+
+"""
+in-memory course search over harmonize.py's output, for local development and as a fallback
+when Redis is down. it mirrors push.py's idx:classes schema:
+
+  fullTitle     TEXT, weight 50
+  description   TEXT
+  instructor    TEXT NOSTEM (every name in every term)
+  subjectCode, terms, gened, sched      TAG
+  courseCode, creditMin, creditMax      NUMERIC
+
+and the query the site sends (src/lib/redis.js): every word of q has to match one of the text
+fields, the last one as a prefix. text is split on RediSearch's default separators and
+lowercased, stopwords are dropped, and fullTitle and description are also indexed by the
+word's stem. matches are ranked roughly like RediSearch's default TFIDF scorer; ties, and
+queries without text, keep the file's order.
+
+  python3 search.py -data classes_out.json -port 5001
+
+serves /api/search and /api/get with the same parameters and response shape as the Next.js
+routes, so the site can be pointed at it.
+"""
+
+fields = [("fullTitle", 50, True), ("description", 1, True), ("instructor", 1, False)]
+stopwords = {"a", "is", "the", "an", "and", "are", "as", "at", "be", "but", "by", "for", "if", "in", "into", "it",
+             "no", "not", "of", "on", "or", "such", "that", "their", "then", "there", "these", "they", "this", "to",
+             "was", "will", "with"}
+# RediSearch's MAXEXPANSIONS default
+max_expansions = 200
+separators = re.compile(r"[\s,.<>{}\[\]\"':;!@#$%^&*()\-+=~]+")
+suffixes = [("ational", "ate"), ("ization", "ize"), ("fulness", "ful"), ("ousness", "ous"), ("iveness", "ive"),
+            ("ies", "y"), ("sses", "ss"), ("ing", ""), ("ed", ""), ("ly", ""), ("s", "")]
+
+
+def tokenize(text):
+    return [token for token in separators.split(text.lower()) if token != ""]
+
+
+# the vocabulary is small next to the number of words in the catalog
+@functools.lru_cache(maxsize=None)
+def stem(word):
+    """
+    a light suffix stripper, standing in for RediSearch's snowball stemmer. the index and the
+    queries go through the same one, so "algorithms" finds "algorithm" and "programming"
+    finds "programs".
+    """
+    if len(word) <= 3 or not word.isalpha():
+        return word
+    for suffix, replacement in suffixes:
+        if word.endswith(suffix) and not (suffix == "s" and word.endswith(("ss", "us", "is"))) and len(word) - len(suffix) >= 3:
+            word = word[:len(word) - len(suffix)] + replacement
+            if suffix in ("ing", "ed") and len(word) > 3 and word[-1] == word[-2] and word[-1] not in "lsz":
+                word = word[:-1]
+            break
+    if word.endswith("e") and len(word) > 4:
+        word = word[:-1]
+    return word
+
+
+def text_values(course, field):
+    if field == "instructor":
+        return [name for names in (course.get("instructor") or {}).values() for name in names]
+    value = course.get(field)
+    return [value] if isinstance(value, str) else []
+
+
+def tag_values(course, field):
+    value = course.get(field)
+    if value is None:
+        return []
+    return [str(v).strip().lower() for v in (value if isinstance(value, list) else [value])]
+
+
+def numeric_value(course, field):
+    credits = course.get("credits") or []
+    value = {"courseCode": course.get("courseCode"),
+             "creditMin": credits[0] if len(credits) > 0 else None,
+             "creditMax": credits[1] if len(credits) > 1 else None}[field]
+    return value if isinstance(value, (int, float)) else None
+
+
+class SearchIndex:
+    def __init__(self, courses):
+        # a few courses share a detailId; they get push.py's :2, :3.. suffixes
+        self.docs = []
+        self.names = []
+        self.by_name = {}
+        seen = {}
+        for course in courses:
+            name = course["detailId"]
+            seen[name] = seen.get(name, 0) + 1
+            if seen[name] > 1:
+                name = f"{name}:{seen[name]}"
+            self.by_name[name] = len(self.docs)
+            self.docs.append(course)
+            self.names.append(name)
+        size = len(self.docs)
+
+        # token -> (documents, weighted term frequency * idf); stems are kept under "+<stem>"
+        postings = {}
+        for doc, course in enumerate(self.docs):
+            counts = {}
+            for field, weight, stemmed in fields:
+                for value in text_values(course, field):
+                    for token in tokenize(value):
+                        if token in stopwords:
+                            continue
+                        counts[token] = counts.get(token, 0) + weight
+                        if stemmed:
+                            stemmed_token = "+" + stem(token)
+                            counts[stemmed_token] = counts.get(stemmed_token, 0) + weight
+            if len(counts) == 0:
+                continue
+            # RediSearch's TFIDF divides by the document's most frequent term
+            top = max(counts.values())
+            for token, count in counts.items():
+                posting = postings.setdefault(token, ([], []))
+                posting[0].append(doc)
+                posting[1].append(count / top)
+        self.postings = {}
+        for token, (docs, tfs) in postings.items():
+            idf = math.log2(1 + size / len(docs))
+            self.postings[token] = (np.array(docs, dtype=np.int32), np.array(tfs) * idf)
+        self.tokens = sorted(token for token in self.postings if not token.startswith("+"))
+
+        # field -> tag -> which documents carry it
+        self.tags = {}
+        for doc, course in enumerate(self.docs):
+            for field in ("subjectCode", "terms", "gened", "sched"):
+                for value in tag_values(course, field):
+                    self.tags.setdefault(field, {}).setdefault(value, []).append(doc)
+        for field, values in self.tags.items():
+            for value, docs in values.items():
+                mask = np.zeros(size, dtype=bool)
+                mask[docs] = True
+                values[value] = mask
+        # missing numbers are NaN, which no range matches
+        self.numbers = {field: np.array([numeric_value(course, field) for course in self.docs], dtype=float)
+                        for field in ("courseCode", "creditMin", "creditMax")}
+        self.none = np.zeros(size, dtype=bool)
+
+    @classmethod
+    def from_file(cls, path):
+        return cls(iter_records(path))
+
+    def get(self, detail_id):
+        doc = self.by_name.get(detail_id)
+        return None if doc is None else self.docs[doc]
+
+    def term_scores(self, term, prefix):
+        """
+        every document's score for term, 0 where it does not match
+        """
+        if prefix:
+            start = bisect.bisect_left(self.tokens, term)
+            forms = []
+            for token in self.tokens[start:start + max_expansions]:
+                if not token.startswith(term):
+                    break
+                forms.append(token)
+        else:
+            forms = [term, "+" + stem(term)]
+        postings = [self.postings[form] for form in forms if form in self.postings]
+        if len(postings) == 0:
+            return np.zeros(len(self.docs))
+        return np.bincount(np.concatenate([docs for docs, _ in postings]), np.concatenate([scores for _, scores in postings]), minlength=len(self.docs))
+
+    def in_range(self, field, low, high):
+        values = self.numbers[field]
+        return (values >= low) & (values <= high)
+
+    def filter_mask(self, subjects, terms, geneds, credits, code_ranges, sched):
+        """
+        which documents pass the filters, or None if there are none
+        """
+        mask = None
+
+        def both(a, b):
+            return b if a is None else a & b
+
+        for field, values in (("subjectCode", subjects), ("terms", terms), ("sched", sched)):
+            if values is not None:
+                tags = self.tags.get(field, {})
+                any_of = self.none
+                for value in values:
+                    any_of = any_of | tags.get(value.strip().lower(), self.none)
+                mask = both(mask, any_of)
+        for value in geneds or []:
+            mask = both(mask, self.tags.get("gened", {}).get(value.strip().lower(), self.none))
+        if credits is not None:
+            mask = both(mask, self.in_range("creditMin", *credits) | self.in_range("creditMax", *credits))
+        if code_ranges is not None:
+            any_of = self.none
+            for low, high in code_ranges:
+                any_of = any_of | self.in_range("courseCode", low, high)
+            mask = both(mask, any_of)
+        return mask
+
+    def search(self, q="", subjects=None, terms=None, geneds=None, credits=None, code_ranges=None, sched=None, limit=10):
+        """
+        (total matches, [(name, course), ..] best first). subjects, terms and sched match any
+        of their values, geneds all of them, credits is a (min, max) range either end of a
+        course's credits may fall in, and code_ranges (low, high) courseCode ranges. None
+        leaves a filter out.
+        """
+        words = tokenize(q)
+        query = [(word, i == len(words) - 1) for i, word in enumerate(words) if i == len(words) - 1 or word not in stopwords]
+        mask = self.filter_mask(subjects, terms, geneds, credits, code_ranges, sched)
+
+        if len(query) == 0:
+            hits = np.arange(len(self.docs)) if mask is None else np.flatnonzero(mask)
+            return len(hits), [(self.names[doc], self.docs[doc]) for doc in hits[:limit]]
+
+        scores = None
+        for word, prefix in query:
+            term = self.term_scores(word, prefix)
+            mask = term > 0 if mask is None else mask & (term > 0)
+            scores = term if scores is None else scores + term
+        hits = np.flatnonzero(mask)
+        if len(hits) > limit:
+            hits = hits[np.argpartition(-scores[hits], limit - 1)[:limit]]
+        # best score first, the file's order between equal scores
+        hits = hits[np.lexsort((hits, -scores[hits]))]
+        return int(np.count_nonzero(mask)), [(self.names[doc], self.docs[doc]) for doc in hits]
+
+
+def level_ranges(levels):
+    # the site's course levels (100, 200..) are ranges of five digit course codes
+    return [(int(level) * 100, int(level) * 100 + 9999) for level in levels]
+
+
+def redis_query(q, subjects, terms, geneds, cmin, cmax, levels, sched):
+    """
+    the query string src/lib/redis.js sends to idx:classes for the same parameters
+    """
+    query = q + ("*" if len(q.strip()) > 0 else "")
+    if len(subjects) > 0:
+        query += f" @subjectCode:{{{'|'.join(subjects)}}}"
+    if len(terms) > 0:
+        query += f" @terms:{{{'|'.join(terms)}}}"
+    for gened in geneds:
+        query += f" @gened:{{{gened}}}"
+    query += f" (@creditMin:[{cmin}, {cmax}] | @creditMax:[{cmin}, {cmax}])"
+    if len(levels) > 0:
+        query += " (" + " | ".join(f"@courseCode:[{low}, {high}]" for low, high in level_ranges(levels)) + ")"
+    else:
+        query += " @courseCode:[0, 0]"
+    query += f" @sched:{{{'|'.join(sched)}}}"
+    return query
+
+
+def make_app(index):
+    from flask import Flask, jsonify, request
+    from flask_cors import CORS
+
+    app = Flask(__name__)
+    CORS(app)
+
+    def listed(name):
+        # the site sends lists comma separated, and "" for an empty one
+        return [value for value in request.args.get(name, "").split(",") if value != ""]
+
+    @app.route("/api/search")
+    def search():
+        levels = listed("levels")
+        sched = listed("sched")
+        if len(sched) == 0:
+            # an empty @sched:{} is a syntax error in RediSearch, which the site answers with no courses
+            return jsonify({"courses": {"total": 0, "documents": []}})
+        total, hits = index.search(
+            request.args.get("q", "").strip(),
+            subjects=listed("sub") or None,
+            terms=listed("term") or None,
+            geneds=listed("gen") or None,
+            credits=(float(request.args.get("cmin", 0)), float(request.args.get("cmax", 18))),
+            # no levels at all asks RediSearch for courseCode 0
+            code_ranges=level_ranges(levels) if len(levels) > 0 else [(0, 0)],
+            sched=sched,
+            limit=int(request.args.get("maxlim", 10)),
+        )
+        return jsonify({"courses": {"total": total, "documents": [{"id": f"classes:{name}", "value": course} for name, course in hits]}})
+
+    @app.route("/api/get")
+    def get():
+        detail_id = request.args.get("detailId", "")
+        course = index.get(detail_id)
+        documents = [] if course is None else [{"id": f"classes:{detail_id}", "value": course}]
+        return jsonify({"course": {"total": len(documents), "documents": documents}})
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="serve course search from memory")
+    parser.add_argument("-data", default="classes_out.json", dest="infile", help="which file to get data from (JSON array, .jsonl or .msgpack)")
+    parser.add_argument("-host", default="127.0.0.1", dest="host")
+    parser.add_argument("-port", default=5001, type=int, dest="port")
+    args = parser.parse_args()
+
+    print(f"indexing {args.infile}...")
+    index = SearchIndex.from_file(args.infile)
+    print(f"{len(index.docs)} courses, {len(index.tokens)} words")
+    make_app(index).run(host=args.host, port=args.port)
@@ -0,0 +1,75 @@
+import requests
+
+from schedule_parser import form_fields, link
+
+"""
+plain HTTP client for selfservice.mypurdue.purdue.edu: submits the same term, subject and
+campus forms the browser flow in scrape.py clicks through, without a browser.
+"""
+
+user_agent = "Mozilla/5.0 (compatible; boilerclasses-scraper)"
+
+
+class SelfService:
+    def __init__(self, timeout=60, limiter=None):
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = user_agent
+        self.timeout = timeout
+        # optional ratelimit.HostRateLimiter shared with other sessions
+        self.limiter = limiter
+
+    def get(self, url):
+        if self.limiter is not None:
+            self.limiter.wait(url)
+        res = self.session.get(url, timeout=self.timeout)
+        res.raise_for_status()
+        return res.text
+
+    def fetch(self, url, etag=None, last_modified=None):
+        """
+        conditional GET for catalog_cache: returns (body, etag, last_modified), body None on 304
+        """
+        headers = {}
+        if etag is not None:
+            headers["If-None-Match"] = etag
+        if last_modified is not None:
+            headers["If-Modified-Since"] = last_modified
+        if self.limiter is not None:
+            self.limiter.wait(url)
+        res = self.session.get(url, headers=headers, timeout=self.timeout)
+        if res.status_code == 304:
+            return None, etag, last_modified
+        res.raise_for_status()
+        return res.text, res.headers.get("ETag"), res.headers.get("Last-Modified")
+
+    def post(self, url, fields):
+        if self.limiter is not None:
+            self.limiter.wait(url)
+        res = self.session.post(url, data=fields, timeout=self.timeout)
+        res.raise_for_status()
+        return res.text
+
+    def term_form(self, term):
+        """
+        submits the term dropdown and returns the class search form page for that term
+        """
+        page = self.get(link)
+        _, _, options = form_fields(page, "p_term")
+        values = [value for value, text in options["p_term"] if text in (term, f"{term} (View only)")]
+        if len(values) == 0:
+            raise ValueError(f"{term} is not offered in the term dropdown")
+        action, fields, _ = form_fields(page, "p_term", {"p_term": values[:1]})
+        return self.post(action, fields)
+
+    def subject_page(self, term, code, campus="PWL", search_form=None):
+        """
+        results page for one subject on one campus, or None if the subject isn't offered that term.
+        pass search_form (from term_form) to reuse it across subjects.
+        """
+        if search_form is None:
+            search_form = self.term_form(term)
+        _, _, options = form_fields(search_form, "sel_subj")
+        if code not in [value for value, _ in options["sel_subj"]]:
+            return None
+        action, fields, _ = form_fields(search_form, "sel_subj", {"sel_subj": [code], "sel_camp": [campus]})
+        return self.post(action, fields)
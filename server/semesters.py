@@ -0,0 +1,11 @@
+"""
+the terms the pipeline fetches, newest first. download.py and pipeline.py both read these.
+"""
+
+semesters = ["Fall 2026", "Spring 2026", "Fall 2025", "Spring 2025", "Fall 2024", "Spring 2024",  "Fall 2023",  "Spring 2023",  "Fall 2022",  "Spring 2022",  "Fall 2021",  "Spring 2021",  "Fall 2020",  "Spring 2020",  "Fall 2019"]
+grade_semesters = ["f21", "s22", "f22", "s23", "f23", "s24", "f24"]
+
+
+def sem_name(sem):
+    # "Fall 2026" -> "fall2026", as in data/classes_fall2026.json
+    return sem.replace(" ", "").lower()
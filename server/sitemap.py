@@ -1,44 +1,191 @@
+import argparse
+import datetime
+import gzip
+import hashlib
 import json
+import math
+import os
+from xml.sax.saxutils import escape
+from jsonstream import iter_records, content_hash
+import runreport
+
+"""
+writes ../public/sitemap.xml as a sitemap index over gzipped shards:
+
+  sitemap-0.xml.gz       the home page and the /dir/ pages
+  sitemap-1..N.xml.gz    course pages, each course in the shard its detailId hashes to
+
+the shard count is the power of two that keeps shards near -shard-size URLs (well under the
+50,000 a sitemap may hold), so it only changes when the catalog doubles or halves, and a
+course stays in the same shard from one deploy to the next.
+
+a course's lastmod is the day its content hash last changed. hashes, and a digest of every
+shard, are kept in .sitemap_cache/state.json; a shard whose digest is unchanged is left alone,
+so only shards holding changed courses are rewritten. a rewritten shard's lastmod in the
+index is the day it was rewritten, an unchanged one keeps its old lastmod.
+"""
+
+parser = argparse.ArgumentParser(description='data files')
+parser.add_argument("-data", default="classes_out.json", dest="infile", help="which file to get data from (JSON array or .jsonl)")
+parser.add_argument("-out", default="../public/", dest="outdir", help="folder the index and shards are written to")
+parser.add_argument("-base", default="https://boilerclasses.com/", dest="base", help="public URL of -out, for the shard links in the index")
+parser.add_argument("-shard-size", default=10000, type=int, dest="shard_size", help="target course URLs per shard")
+parser.add_argument("-state", default=".sitemap_cache/state.json", dest="state", help="course hashes and shard digests from the last run")
+runreport.add_arguments(parser)
+
+args = parser.parse_args()
+runreport.start("sitemap", args)
+
+max_urls = 50000
+today = datetime.date.today().isoformat()
 
-with open('../public/sitemap.xml', 'w') as xml_file:
-  xml_file.write('<?xml version="1.0" encoding="UTF-8"?>\n')
-  xml_file.write('<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
-  xml_file.write('\t<url>\n')
-  xml_file.write(f'\t\t<loc>https://boilerclasses.com/</loc>\n')
-  xml_file.write(f'\t\t<priority>1</priority>\n')
-  xml_file.write('\t</url>\n')
-
-with open('classes_out.json', 'r') as file:
-  data = json.load(file)
-  mx_terms = 0
-  for class_data in data:
-    mx_terms = max(mx_terms, len(class_data['terms']))
-  for class_data in data:
-    with open('../public/sitemap.xml', 'a') as xml_file:
-      # xml_file.write('\t<url>\n')
-      # xml_file.write(f'\t\t<loc>https://www.boilerclasses.com/detail/{class_data["detailId"]}</loc>\n')
-      # xml_file.write(f'\t\t<priority>{round(len(class_data["terms"])/mx_terms, 2)}</priority>\n')
-      # xml_file.write('\t</url>\n')
-      xml_file.write('\t<url>\n')
-      xml_file.write(f'\t\t<loc>https://boilerclasses.com/detail/{class_data["detailId"]}</loc>\n')
-      xml_file.write(f'\t\t<priority>{round(len(class_data["terms"])/mx_terms, 2)}</priority>\n')
-      xml_file.write('\t</url>\n')
-
-
-# Add course directory to sitemap
 class_codes = ["AAE", "AAS", "ABE", "ACCT", "AD", "AFT", "AGEC", "AGR", "AGRY", "AMST", "ANSC", "ANTH", "ARAB", "ARCH", "ASAM", "ASEC", "ASL", "ASM", "ASTR", "AT", "BAND", "BCHM", "BIOL", "BME", "BMS", "BTNY", "BUS", "CAND", "CCE", "CDIS", "CE", "CEM", "CGT", "CHE", "CHM", "CHNS", "CIT", "CLCS", "CLPH", "CM", "CMGT", "CMPL", "CNIT", "COM", "CPB", "CS", "CSCI", "CSR", "DANC", "DCTC", "DSB", "EAPS", "ECE", "ECET", "ECON", "EDCI", "EDPS", "EDST", "EEE", "ENE", "ENGL", "ENGR", "ENGT", "ENTM", "ENTR", "EPCS", "EXPL", "FIN", "FLM", "FNR", "FR", "FS", "FVS", "GEP", "GER", "GRAD", "GREK", "GS", "GSLA", "HDFS", "HEBR", "HER", "HETM", "HHS", "HIST", "HK", "HONR", "HORT", "HSCI", "HSOP", "HTM", "IBE", "IDE", "IDIS", "IE", "IET", "ILS", "IMPH", "IPPH", "INT", "IT", "ITAL", "JPNS", "JWST", "KOR", "LA", "LALS", "LATN", "LC", "LING", "MA", "MATH", "MCMP", "ME", "MET", "MFET", "MGMT", "MIS", "MKTG", "MSE", "MSL", "MSPE", "MUS", "NRES", "NS", "NUCL", "NUPH", "NUR", "NUTR", "OBHR", "OLS", "OPP", "PES", "PHIL", "PHPR", "PHRM", "PHSC", "PHYS", "POL", "PSY", "PTGS", "PUBH", "QM", "REAL", "REG", "REL", "RPMP", "RUSS", "SA", "SCI", "SCLA", "SCOM", "SFS", "SLHS", "SOC", "SPAN", "STAT", "STRT", "SYS", "TCM", "TDM", "TECH", "THTR", "TLI", "VCS", "VIP", "VM", "WGSS"]
-with open('../public/sitemap.xml', 'a') as xml_file:
-  xml_file.write('\t<url>\n')
-  xml_file.write(f'\t\t<loc>https://www.boilerclasses.com/dir/</loc>\n')
-  xml_file.write(f'\t\t<priority>1</priority>\n')
-  xml_file.write('\t</url>\n')
 
-  for class_code in class_codes:
-    xml_file.write('\t<url>\n')
-    xml_file.write(f'\t\t<loc>https://boilerclasses.com/dir/{class_code}</loc>\n')
-    xml_file.write(f'\t\t<priority>1</priority>\n')
-    xml_file.write('\t</url>\n')
 
+def load_state(path):
+  try:
+    with open(path) as f:
+      return json.load(f)
+  except (FileNotFoundError, ValueError):
+    return {"courses": {}, "shards": {}}
+
+def save_state(path, state):
+  os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+  tmp = path + ".tmp"
+  with open(tmp, "w") as f:
+    json.dump(state, f)
+  os.replace(tmp, path)
+
+def shard_of(detailId, shards):
+  return int.from_bytes(hashlib.blake2b(detailId.encode(), digest_size=8).digest(), "big") % shards + 1
+
+
+class Shard:
+  """
+  one sitemap-N.xml.gz, written to a temp file as URLs arrive and only moved into place by
+  finish() if its content differs from the last run
+  """
+  def __init__(self, n):
+    self.name = f"sitemap-{n}.xml.gz"
+    self.path = os.path.join(args.outdir, self.name)
+    self.tmp = self.path + ".tmp"
+    self.raw = open(self.tmp, "wb")
+    # no name or timestamp in the gzip header, so equal content gives equal bytes
+    self.file = gzip.GzipFile(filename="", mode="wb", fileobj=self.raw, mtime=0)
+    self.digest = hashlib.blake2b(digest_size=16)
+    self.urls = 0
+    self.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    self.write('<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
+
+  def write(self, text):
+    data = text.encode()
+    self.file.write(data)
+    self.digest.update(data)
+
+  def url(self, loc, priority, lastmod=None):
+    self.urls += 1
+    self.write('\t<url>\n')
+    self.write(f'\t\t<loc>{escape(loc)}</loc>\n')
+    if lastmod is not None:
+      self.write(f'\t\t<lastmod>{lastmod}</lastmod>\n')
+    self.write(f'\t\t<priority>{priority}</priority>\n')
+    self.write('\t</url>\n')
+
+  def finish(self, previous):
+    """
+    closes the shard and returns its lastmod; previous is its [digest, lastmod] from the last run
+    """
+    if self.urls > max_urls:
+      raise ValueError(f"{self.name} has {self.urls} URLs, over the limit of {max_urls}; lower -shard-size")
+    self.write('</urlset>\n')
+    self.file.close()
+    self.raw.close()
+    digest = self.digest.hexdigest()
+    if previous is not None and previous[0] == digest and os.path.exists(self.path):
+      os.remove(self.tmp)
+      self.changed = False
+      lastmod = previous[1]
+    else:
+      os.replace(self.tmp, self.path)
+      self.changed = True
+      # the newest course lastmod would miss a course that was removed or moved out
+      lastmod = today
+    state["shards"][self.name] = [digest, lastmod]
+    return lastmod
+
+
+state = load_state(args.state)
+previous_shards = state["shards"]
+state["shards"] = {}
+
+# first pass: the priority needs the max term count, the shard count needs the number of
+# courses, and lastmod needs each course's content hash
+mx_terms = 0
+hashes = {}
+with runreport.stage("hash") as stage:
+  for class_data in iter_records(args.infile):
+    mx_terms = max(mx_terms, len(class_data['terms']))
+    # a few courses share a detailId (and a URL); their hashes are combined
+    hashes.setdefault(class_data["detailId"], []).append(content_hash(class_data))
+  stage.records_in = sum(len(digests) for digests in hashes.values())
+  stage.records_out = len(hashes)
+
+courses = {}
+for detailId, digests in hashes.items():
+  digest = digests[0] if len(digests) == 1 else content_hash(digests)
+  previous = state["courses"].get(detailId)
+  courses[detailId] = [digest, previous[1] if previous is not None and previous[0] == digest else today]
+state["courses"] = courses
+
+shards = 2 ** max(0, math.ceil(math.log2(max(1, len(courses)) / args.shard_size)))
+os.makedirs(args.outdir, exist_ok=True)
+
+# home and directory pages
+pages = Shard(0)
+pages.url('https://boilerclasses.com/', 1)
+pages.url('https://www.boilerclasses.com/dir/', 1)
+for class_code in class_codes:
+  pages.url(f'https://boilerclasses.com/dir/{class_code}', 1)
+
+# second pass: each course page into its shard, every shard open once for the whole stream
+course_shards = [Shard(n) for n in range(1, shards + 1)]
+written = set()
+with runreport.stage("write_shards") as stage:
+  for class_data in iter_records(args.infile):
+    detailId = class_data["detailId"]
+    if detailId in written:
+      continue
+    written.add(detailId)
+    course_shards[shard_of(detailId, shards) - 1].url(
+      f'https://boilerclasses.com/detail/{detailId}',
+      round(len(class_data["terms"])/mx_terms, 2),
+      courses[detailId][1],
+    )
+
+  entries = []
+  for shard in [pages] + course_shards:
+    lastmod = shard.finish(previous_shards.get(shard.name))
+    entries.append((shard.name, lastmod))
+  stage.records_out = sum(shard.urls for shard in [pages] + course_shards)
+  runreport.count("shards rewritten", sum(shard.changed for shard in [pages] + course_shards))
+
+# shards left over from a run with more of them
+for name in previous_shards:
+  if name not in state["shards"] and os.path.exists(os.path.join(args.outdir, name)):
+    os.remove(os.path.join(args.outdir, name))
+
+index = os.path.join(args.outdir, "sitemap.xml")
+with open(index + ".tmp", "w") as xml_file:
+  xml_file.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+  xml_file.write('<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
+  for name, lastmod in entries:
+    xml_file.write('\t<sitemap>\n')
+    xml_file.write(f'\t\t<loc>{escape(args.base + name)}</loc>\n')
+    xml_file.write(f'\t\t<lastmod>{lastmod}</lastmod>\n')
+    xml_file.write('\t</sitemap>\n')
+  xml_file.write('</sitemapindex>\n')
+os.replace(index + ".tmp", index)
+save_state(args.state, state)
 
-with open('../public/sitemap.xml', 'a') as xml_file:
-  xml_file.write('</urlset>\n')
+changed = [shard.name for shard in [pages] + course_shards if shard.changed]
+print(f"{len(written)} courses in {shards} shards; rewrote {len(changed)} of {len(entries)} files: {', '.join(changed) or 'none'}")
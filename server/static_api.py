@@ -0,0 +1,133 @@
+import argparse
+import gzip
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import brotli
+from jsonstream import iter_records
+import runreport
+
+"""
+writes the read-only API responses as files, so detail and directory pages can be served
+from disk or a CDN instead of Redis:
+
+  course/<detailId>.json    the /api/get response for the course
+  dir/<SUBJECT>.json        every course in the subject (detailId, subjectCode, courseCode,
+                            title), in the shape /api/search returns, for /dir/<SUBJECT>
+  etags.json                "course/<detailId>" / "dir/<SUBJECT>" -> hash of the file's bytes
+
+each file is compact JSON with a .gz (gzip -9) and .br (brotli, quality 11) copy next to it.
+a file whose hash is unchanged since the last run is left alone, so only changed courses are
+compressed again, and files for courses that went away are removed. the hash is the same for
+every encoding of a file, so it is served as a weak ETag (W/"<hash>").
+"""
+
+
+def serialize(body):
+  return json.dumps(body, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def digest(data):
+  return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def replace(path, data):
+  tmp = path + ".tmp"
+  with open(tmp, "wb") as f:
+    f.write(data)
+  os.replace(tmp, path)
+
+
+def write_file(item):
+  """
+  writes <path>.json and its compressed copies; run in a worker process
+  """
+  path, data = item
+  # no name or timestamp in the gzip header, so equal content gives equal bytes
+  replace(path + ".json.gz", gzip.compress(data, compresslevel=9, mtime=0))
+  replace(path + ".json.br", brotli.compress(data, mode=brotli.MODE_TEXT, quality=11))
+  replace(path + ".json", data)
+  return len(data)
+
+
+def remove_file(path):
+  for suffix in (".json", ".json.gz", ".json.br"):
+    if os.path.exists(path + suffix):
+      os.remove(path + suffix)
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="write course and subject API responses as static files")
+  parser.add_argument("-data", default="classes_out.json", dest="infile", help="which file to get data from (JSON array, .jsonl or .msgpack)")
+  parser.add_argument("-out", default="../static_api/", dest="outdir", help="folder the files and etags.json are written to")
+  parser.add_argument("-workers", default=None, type=int, dest="workers", help="processes compressing files (default: one per CPU)")
+  parser.add_argument("-force", action="store_true", dest="force", help="rewrite every file, even unchanged ones")
+  runreport.add_arguments(parser)
+  args = parser.parse_args()
+  runreport.start("static_api", args)
+
+  etags_path = os.path.join(args.outdir, "etags.json")
+  try:
+    with open(etags_path) as f:
+      previous = json.load(f)
+  except (FileNotFoundError, ValueError):
+    previous = {}
+  for folder in ("course", "dir"):
+    os.makedirs(os.path.join(args.outdir, folder), exist_ok=True)
+
+  etags = {}
+  changed = []
+
+  def add(key, body):
+    data = serialize(body)
+    etags[key] = digest(data)
+    path = os.path.join(args.outdir, key)
+    if args.force or previous.get(key) != etags[key] or not os.path.exists(path + ".json"):
+      changed.append((path, data))
+
+  subjects = {}
+  with runreport.stage("serialize") as stage:
+    count = 0
+    seen = {}
+    for class_data in iter_records(args.infile):
+      count += 1
+      detailId = class_data["detailId"]
+      # like push.py, later courses with a taken detailId get a :2, :3.. suffix; /api/get
+      # answers with the first one
+      seen[detailId] = seen.get(detailId, 0) + 1
+      name = detailId if seen[detailId] == 1 else f"{detailId}:{seen[detailId]}"
+      if seen[detailId] == 1:
+        add(f"course/{detailId}", {"course": {"total": 1, "documents": [{"id": f"classes:{name}", "value": class_data}]}})
+      # only what the directory page shows
+      subjects.setdefault(class_data["subjectCode"], []).append({"id": f"classes:{name}", "value": {
+        "detailId": detailId,
+        "subjectCode": class_data["subjectCode"],
+        "courseCode": class_data["courseCode"],
+        "title": class_data["title"],
+      }})
+    for subject, documents in subjects.items():
+      add(f"dir/{subject}", {"courses": {"total": len(documents), "documents": documents}})
+    stage.records_in = count
+    stage.records_out = len(etags)
+
+  with runreport.stage("write", records_in=len(changed)) as stage:
+    written = 0
+    if len(changed) > 0:
+      with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        for size in executor.map(write_file, changed, chunksize=64):
+          written += size
+    stage.records_out = len(changed)
+    runreport.count("bytes serialized", written)
+
+  with runreport.stage("remove"):
+    removed = [key for key in previous if key not in etags]
+    for key in removed:
+      remove_file(os.path.join(args.outdir, key))
+
+  # written last, so a reader never has an ETag for a file that isn't there yet
+  tmp = etags_path + ".tmp"
+  with open(tmp, "w") as f:
+    json.dump(etags, f, sort_keys=True)
+  os.replace(tmp, etags_path)
+  print(f"{len(etags)} files ({len(subjects)} subjects); rewrote {len(changed)}, removed {len(removed)}")
@@ -0,0 +1,356 @@
+import argparse
+import json
+import os
+import random
+import re
+from harmonize import latest_sem, grade_columns
+from prereq_parser import class_codes, parse
+from jsonstream import write_records
+
+"""
+deterministic fake inputs for harmonize.py, shaped like the real ones:
+
+  data/classes_<fall2026>.json           one per semester, the records scrape.py writes
+  data/grades/classes_<f24>.json         grade rows, with the blank cells that carry over
+                                         from the row above (see parse_grade_file)
+  data/gened/classes_gened.json          {tag: ["SUBJ CODE", ..]}
+  data/prereqs/classes_prereqs.json      prerequisite trees, as prereqs.py writes them
+  data/prereqs/prereq_texts.json         {"SUBJ CODE": catalog prerequisite text} the trees
+                                         were parsed from, for timing the parser
+
+-format msgpack writes the semester and grade files as .msgpack instead (see jsonstream.py).
+the same -seed and scale give byte-identical files. every course is decided up front, so a
+course keeps its code, title and instructors across semesters, and prerequisites mostly
+point at lower-numbered courses (with the odd cycle, like the real catalog).
+
+  python3 synth.py -out bench_data/ -semesters 15 -courses 10000
+  python3 synth.py -out bench_data/ -semesters 60 -courses 100000
+"""
+
+words = ["Introduction", "Principles", "Advanced", "Topics", "Applied", "Modern", "Theory", "Methods",
+         "Analysis", "Design", "Systems", "Structures", "Computing", "Data", "Signals", "Networks",
+         "Chemistry", "Biology", "Physics", "Mechanics", "Materials", "Economics", "Management",
+         "Literature", "History", "Writing", "Culture", "Society", "Statistics", "Calculus", "Algebra",
+         "Engineering", "Programming", "Environment", "Health", "Nutrition", "Music", "Art", "Language",
+         "Research", "Practice", "Laboratory", "Seminar", "Fundamentals", "Probability", "Optimization",
+         "Control", "Energy", "Policy", "Ethics", "Psychology", "Communication", "Media", "Geometry"]
+connectives = ["And", "Of", "In", "For", "&"]
+description_words = ["students", "course", "study", "concepts", "methods", "applications", "including",
+                     "emphasis", "problems", "analysis", "design", "theory", "practice", "topics",
+                     "selected", "introduction", "advanced", "principles", "techniques", "projects",
+                     "laboratory", "experience", "development", "systems", "modern", "fundamental"]
+first_names = ["James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael", "Linda", "David",
+               "Elizabeth", "William", "Barbara", "Wei", "Priya", "Ahmed", "Sofia", "Hiroshi", "Olga",
+               "Carlos", "Fatima", "Min", "Arjun", "Chen", "Ana", "Ivan", "Grace", "Kwame", "Lena"]
+last_names = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez",
+              "Martinez", "Wang", "Li", "Zhang", "Patel", "Kumar", "Kim", "Lee", "Nguyen", "Chen",
+              "Anderson", "Thomas", "Taylor", "Moore", "Jackson", "Martin", "Thompson", "White", "Lopez"]
+middles = ["", "", "A", "B", "C", "D", "E", "J", "K", "M", "R", "S"]
+sched_types = ["Lecture", "Laboratory", "Recitation", "Distance Learning", "Practice Study Observation",
+               "Individual Study", "Presentation", "Clinic"]
+gened_names = ["Behavioral/Social Science", "Humanities", "Information Literacy", "Oral Communication",
+               "Quantitative Reasoning", "Science", "Science, Technology & Society", "Written Communication"]
+levels = ["Undergraduate", "Graduate", "Professional"]
+minimum_grades = ["D-", "C-", "C", "B"]
+
+
+def semester_names(count):
+    """
+    count semesters, newest first, ending at latest_sem (Fall and Spring only, like download.py)
+    """
+    season, year = latest_sem.split(" ")
+    year = int(year)
+    names = []
+    for _ in range(count):
+        names.append(f"{season} {year}")
+        if season == "Fall":
+            season = "Spring"
+        else:
+            season = "Fall"
+            year -= 1
+    return names
+
+
+def file_name(sem):
+    return sem.replace(" ", "").lower()
+
+
+def grade_name(sem):
+    # grade files are named like classes_f24.json
+    season, year = sem.split(" ")
+    return season[0].lower() + year[2:]
+
+
+def title(rng):
+    parts = [rng.choice(words) for _ in range(rng.randint(1, 4))]
+    if len(parts) > 1 and rng.random() < 0.4:
+        parts.insert(rng.randint(1, len(parts) - 1), rng.choice(connectives))
+    if rng.random() < 0.1:
+        parts.append(rng.choice(["I", "II", "III"]))
+    return " ".join(parts)
+
+
+def description(rng, credits):
+    sentences = []
+    for _ in range(rng.randint(2, 5)):
+        sentence = " ".join(rng.choice(description_words) for _ in range(rng.randint(6, 16)))
+        sentences.append(sentence[0].upper() + sentence[1:] + ".")
+    if credits[0] == credits[1]:
+        sentences.append(f"Credit Hours: {credits[0]:.2f}.")
+    else:
+        sentences.append(f"Credit Hours: {credits[0]:.2f} to {credits[1]:.2f}.")
+    return " ".join(sentences)
+
+
+def make_instructors(rng, count):
+    # (first, middle, last); semester files use "First M Last", grade files "Last, First M"
+    return [(rng.choice(first_names), rng.choice(middles), rng.choice(last_names)) for _ in range(count)]
+
+
+def full_name(instructor):
+    return " ".join(part for part in instructor if part)
+
+
+def grade_instructor(instructor):
+    first, middle, last = instructor
+    return f"{last}, {first} {middle}".strip()
+
+
+def make_courses(rng, count):
+    """
+    count courses with a code unique per subject, except for about 1% that reuse a code with
+    a different title (harmonize keeps those apart). subjects get very different sizes.
+    """
+    subject_weights = [rng.uniform(0.2, 5) for _ in class_codes]
+    instructors = make_instructors(rng, max(50, count // 3))
+    used = set()
+    courses = []
+    while len(courses) < count:
+        if len(courses) > 0 and rng.random() < 0.01:
+            base = rng.choice(courses)
+            subject, code = base["subjectCode"], base["courseCode"]
+        else:
+            subject = rng.choices(class_codes, subject_weights)[0]
+            code = f"{rng.randint(100, 699)}{rng.choice(['00', '00', '00', '00', '10', '20', '50', '01'])}"
+            if (subject, code) in used:
+                continue
+        used.add((subject, code))
+        credits = [3, 3] if rng.random() < 0.6 else sorted([rng.randint(0, 4), rng.randint(1, 6)])
+        courses.append({
+            "subjectCode": subject,
+            "courseCode": code,
+            "title": title(rng),
+            "description": description(rng, credits),
+            "credits": credits,
+            "sched": rng.sample(sched_types, rng.choice([1, 1, 1, 2, 2, 3])),
+            "instructors": rng.sample(instructors, rng.randint(1, 4)),
+            "sections": rng.choice([1, 1, 1, 2, 2, 3, 4, 6, 12]),
+            # how often it is offered
+            "rate": rng.uniform(0.3, 1),
+            # a few catalog entries carry links instead of a plain description
+            "linked": rng.random() < 0.03,
+        })
+    return courses
+
+
+def detail_id(course):
+    return re.sub("[^a-zA-Z0-9]", "", " ".join([course["subjectCode"], course["courseCode"], course["title"]]))
+
+
+def semester_records(rng, courses, sem, crn):
+    """
+    (records, offerings, next crn) for one semester. offerings keeps (course, [(crn, instructor)])
+    for the grade file.
+    """
+    records = []
+    offerings = []
+    for course in courses:
+        if rng.random() > course["rate"]:
+            continue
+        sections = []
+        instructors = set()
+        for _ in range(rng.randint(1, course["sections"])):
+            instructor = rng.choice(course["instructors"])
+            instructors.add(full_name(instructor))
+            sections.append((crn, instructor))
+            crn += 1
+        if rng.random() < 0.05:
+            instructors = {"TBA"}
+        desc = course["description"]
+        if course["linked"]:
+            desc = f'{desc} See <a href="https://catalog.purdue.edu/">the catalog</a>.'
+        records.append({
+            "title": course["title"],
+            "subjectCode": course["subjectCode"],
+            "courseCode": course["courseCode"],
+            "instructor": sorted(instructors),
+            "description": desc,
+            "capacity": 0,
+            "credits": list(course["credits"]),
+            "term": sem,
+            "crn": [section[0] for section in sections],
+            "sched": list(course["sched"]),
+        })
+        offerings.append((course, sections))
+    return records, offerings, crn
+
+
+def grade_rows(rng, offerings, sem):
+    """
+    one row per section, the way Purdue's export lists them: semester, subject, course number
+    and title are only filled in where they change
+    """
+    rows = []
+    previous = (None, None, None)
+    for course, sections in sorted(offerings, key=lambda offering: (offering[0]["subjectCode"], offering[0]["courseCode"])):
+        course_title = course["title"]
+        if rng.random() < 0.02:
+            course_title += "-Honors"
+        for i, (crn, instructor) in enumerate(sections):
+            shares = [rng.random() ** 2 for _ in grade_columns]
+            total = sum(shares)
+            row = {
+                "subject": course["subjectCode"] if course["subjectCode"] != previous[1] else "",
+                "course number": course["courseCode"] if i == 0 else "",
+                "title": course_title if i == 0 else "",
+                "academic period desc": sem if previous[0] is None else "",
+                "instructor": grade_instructor(instructor),
+            }
+            if rng.random() < 0.03:
+                # sections without letter grades
+                for col in grade_columns:
+                    row[col] = 0
+                row["avg gpa"] = "NaN"
+            else:
+                for col, share in zip(grade_columns, shares):
+                    row[col] = round(100 * share / total, 1)
+                points = [4, 4, 3.7, 3.3, 3, 2.7, 2.3, 2, 1.7, 1.3, 1, 0.7, 0]
+                row["avg gpa"] = f"{sum(p * s for p, s in zip(points, shares)) / total:.2f}"
+            row["CRN"] = str(crn)
+            rows.append(row)
+            previous = (sem, course["subjectCode"], course["courseCode"])
+    return rows
+
+
+def clause(rng, course):
+    level = rng.choice(levels) if rng.random() < 0.2 else "Undergraduate"
+    text = f"{level} level {course['subjectCode']} {course['courseCode']} Minimum Grade of {rng.choice(minimum_grades)}"
+    if rng.random() < 0.1:
+        text += " [may be taken concurrently]"
+    return text
+
+
+def expression(rng, candidates, depth=0):
+    """
+    catalog-style prerequisite text over candidates: clauses joined by and/or, with
+    parenthesised groups
+    """
+    parts = []
+    for _ in range(rng.randint(1, 4 if depth == 0 else 3)):
+        if depth < 2 and rng.random() < 0.25:
+            parts.append("(" + expression(rng, candidates, depth + 1) + ")")
+        else:
+            parts.append(clause(rng, rng.choice(candidates)))
+    op = rng.choice([" and ", " or ", " or "])
+    return op.join(parts)
+
+
+def prerequisites(rng, courses):
+    """
+    (texts, trees) keyed by "SUBJ CODE" for about 40% of courses
+    """
+    by_subject = {}
+    for course in courses:
+        by_subject.setdefault(course["subjectCode"], []).append(course)
+    for same in by_subject.values():
+        same.sort(key=lambda course: course["courseCode"])
+    # first match wins, like prereqs.py's detail id index
+    ids = {}
+    for course in courses:
+        ids.setdefault((course["subjectCode"], course["courseCode"]), detail_id(course))
+
+    texts = {}
+    trees = {}
+    for course in courses:
+        key = f"{course['subjectCode']} {course['courseCode']}"
+        if key in texts or rng.random() > 0.4:
+            continue
+        same = by_subject[course["subjectCode"]]
+        lower = [other for other in same if other["courseCode"] < course["courseCode"]]
+        # mostly earlier courses in the same subject, some from anywhere (which can loop)
+        candidates = lower if len(lower) > 0 and rng.random() < 0.85 else [rng.choice(courses) for _ in range(5)]
+        text = expression(rng, candidates)
+        texts[key] = text
+        tree = parse(text, lambda subject, number: ids.get((subject, number)))
+        if tree is not None:
+            trees[key] = tree
+    return texts, trees
+
+
+def geneds(rng, courses):
+    tags = {name: [] for name in gened_names}
+    for course in courses:
+        if rng.random() < 0.08:
+            for name in rng.sample(gened_names, rng.choice([1, 1, 2])):
+                tags[name].append(f"{course['subjectCode']} {course['courseCode']}")
+    return tags
+
+
+def dump(path, data, indent=4):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=indent)
+    os.replace(tmp, path)
+
+
+def generate(out, semesters=15, courses=10000, grade_semesters=7, seed=0, format="json"):
+    """
+    writes a full set of inputs under out/data/ and returns the number of records written
+    """
+    rng = random.Random(seed)
+    data = os.path.join(out, "data")
+    for folder in ["", "gened", "grades", "prereqs"]:
+        os.makedirs(os.path.join(data, folder), exist_ok=True)
+
+    catalog = make_courses(rng, courses)
+    sems = semester_names(semesters)
+    # the newest semesters have no grades yet
+    graded = sems[2:2 + grade_semesters]
+
+    records = 0
+    crn = 10000
+    for sem in sems:
+        rows, offerings, crn = semester_records(rng, catalog, sem, crn)
+        records += len(rows)
+        if format == "json":
+            dump(os.path.join(data, f"classes_{file_name(sem)}.json"), rows)
+        else:
+            write_records(os.path.join(data, f"classes_{file_name(sem)}.{format}"), rows)
+        if sem in graded:
+            rows = grade_rows(rng, offerings, sem)
+            if format == "json":
+                dump(os.path.join(data, "grades", f"classes_{grade_name(sem)}.json"), rows, indent=2)
+            else:
+                write_records(os.path.join(data, "grades", f"classes_{grade_name(sem)}.{format}"), rows)
+
+    dump(os.path.join(data, "gened", "classes_gened.json"), geneds(rng, catalog))
+    texts, trees = prerequisites(rng, catalog)
+    dump(os.path.join(data, "prereqs", "classes_prereqs.json"), trees)
+    dump(os.path.join(data, "prereqs", "prereq_texts.json"), texts)
+    # what was generated, so bench.py can tell whether a folder matches the scale it was asked for
+    dump(os.path.join(out, "synth.json"), {"semesters": semesters, "courses": courses, "grade_semesters": grade_semesters, "seed": seed, "format": format, "records": records})
+    return records
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="generate fake harmonize.py inputs")
+    parser.add_argument("-out", default="bench_data/", dest="out", help="folder the data/ tree is written under")
+    parser.add_argument("-semesters", default=15, type=int, dest="semesters", help="semester files, newest first from latest_sem")
+    parser.add_argument("-courses", default=10000, type=int, dest="courses", help="distinct courses in the catalog")
+    parser.add_argument("-grade-semesters", default=7, type=int, dest="grade_semesters", help="semesters with a grade file")
+    parser.add_argument("-seed", default=0, type=int, dest="seed")
+    parser.add_argument("-format", default="json", choices=["json", "msgpack"], dest="format", help="format of the semester and grade files")
+    args = parser.parse_args()
+
+    records = generate(args.out, args.semesters, args.courses, args.grade_semesters, args.seed, args.format)
+    print(f"{args.courses} courses, {records} course records over {args.semesters} semesters in {os.path.join(args.out, 'data')}")
@@ -0,0 +1,129 @@
+import json
+import os
+import re
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from schedule_parser import link, parse_sections, catalog_html, course_records
+from selfservice import SelfService
+
+"""
+runs the HTTP engine's form walk and parsing on saved selfservice pages (tests/fixtures/)
+and checks the records against the temp_<sem>/<CODE>.json scrape.py should write for them.
+
+  python3 -m unittest discover tests
+"""
+
+fixtures = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def fixture(*path):
+    with open(os.path.join(fixtures, *path)) as f:
+        return f.read()
+
+
+def catalog_contents(links):
+    # what scrape.py's catalog_entry returns for each "View Catalog Entry" link
+    return [catalog_html(fixture("catalog", "CS" + re.search(r"sel_crse_strt=(\d+)", url).group(1) + ".html")) for url in links]
+
+
+def normalized(records):
+    # instructors and schedule types come out of a set, so their order isn't fixed
+    for record in records:
+        record["instructor"] = sorted(record["instructor"])
+        record["sched"] = sorted(record["sched"])
+    return records
+
+
+class FixtureSession(SelfService):
+    """
+    SelfService answering from the fixtures instead of the network, keeping every request
+    """
+    def __init__(self):
+        super().__init__()
+        self.requests = []
+
+    def get(self, url):
+        self.requests.append(("GET", url, None))
+        assert url == link
+        return fixture("dyn_sched.html")
+
+    def post(self, url, fields):
+        self.requests.append(("POST", url, fields))
+        if url.endswith("bwckgens.p_proc_term_date"):
+            return fixture("search_form.html")
+        assert url.endswith("bwckschd.p_get_crse_unsec")
+        if ("sel_subj", "CS") in fields:
+            return fixture("results_CS.html")
+        return fixture("no_classes.html")
+
+
+class TestHttpEngine(unittest.TestCase):
+    def test_term_form(self):
+        session = FixtureSession()
+        self.assertEqual(session.term_form("Fall 2024"), fixture("search_form.html"))
+        _, url, fields = session.requests[-1]
+        self.assertEqual(url, "https://selfservice.mypurdue.purdue.edu/prod/bwckgens.p_proc_term_date")
+        self.assertEqual(fields, [("p_calling_proc", "bwckschd.p_disp_dyn_sched"), ("p_term", "202510")])
+
+    def test_view_only_term(self):
+        session = FixtureSession()
+        session.term_form("Summer 2024")
+        self.assertIn(("p_term", "202430"), session.requests[-1][2])
+
+    def test_unknown_term(self):
+        with self.assertRaises(ValueError):
+            FixtureSession().term_form("Fall 1999")
+
+    def test_subject_form(self):
+        session = FixtureSession()
+        page = session.subject_page("Fall 2024", "CS")
+        self.assertEqual(page, fixture("results_CS.html"))
+        _, url, fields = session.requests[-1]
+        self.assertEqual(url, "https://selfservice.mypurdue.purdue.edu/prod/bwckschd.p_get_crse_unsec")
+        # the hidden "dummy" values come first, like the browser sends them, then the choices
+        self.assertEqual(fields, [
+            ("term_in", "202510"),
+            ("sel_subj", "dummy"), ("sel_day", "dummy"), ("sel_schd", "dummy"), ("sel_insm", "dummy"),
+            ("sel_camp", "dummy"), ("sel_levl", "dummy"), ("sel_sess", "dummy"), ("sel_instr", "dummy"),
+            ("sel_ptrm", "dummy"), ("sel_attr", "dummy"),
+            ("sel_subj", "CS"),
+            ("sel_crse", ""), ("sel_title", ""),
+            ("sel_schd", "%"),
+            ("sel_camp", "PWL"),
+            ("begin_hh", "0"), ("begin_mi", "0"), ("begin_ap", "a"),
+            ("SUB_BTN", "Class Search"),
+        ])
+
+    def test_subject_not_offered(self):
+        session = FixtureSession()
+        self.assertIsNone(session.subject_page("Fall 2024", "ZZZ"))
+        # the search form is fetched, but no search is submitted for it
+        self.assertFalse(any(url.endswith("p_get_crse_unsec") for _, url, _ in session.requests))
+
+    def test_reuses_search_form(self):
+        session = FixtureSession()
+        form = session.term_form("Fall 2024")
+        session.requests.clear()
+        session.subject_page("Fall 2024", "MA", search_form=form)
+        self.assertEqual([method for method, _, _ in session.requests], ["POST"])
+
+    def test_temp_records(self):
+        page = FixtureSession().subject_page("Fall 2024", "CS")
+        records = course_records(parse_sections(page), "Fall 2024", catalog_contents)
+        expected = json.loads(fixture("temp_fall2024", "CS.json"))
+        self.assertEqual(normalized(records), expected)
+
+    def test_course_left_out(self):
+        # a course whose catalog entry couldn't be fetched is dropped, the rest are kept
+        def contents(links):
+            return [None if "sel_crse_strt=25100" in url else content for url, content in zip(links, catalog_contents(links))]
+        page = fixture("results_CS.html")
+        records = course_records(parse_sections(page), "Fall 2024", contents)
+        expected = [record for record in json.loads(fixture("temp_fall2024", "CS.json")) if record["courseCode"] != "25100"]
+        self.assertEqual(normalized(records), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
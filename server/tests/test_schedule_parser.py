@@ -0,0 +1,107 @@
+import os
+import sys
+import unittest
+
+import lxml.html
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from schedule_parser import (catalog_html, format_instructors, inner_html, no_classes_text, parse_catalog,
+                             parse_sections)
+
+"""
+unit tests for schedule_parser.py on the saved pages in tests/fixtures/
+"""
+
+fixtures = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def fixture(*path):
+    with open(os.path.join(fixtures, *path)) as f:
+        return f.read()
+
+
+class TestParseSections(unittest.TestCase):
+    def setUp(self):
+        self.rows = parse_sections(fixture("results_CS.html"))
+
+    def test_rows(self):
+        # the CS 29100 seminar has no meeting times table and is left out
+        self.assertEqual([row["crn"] for row in self.rows], [10001, 10002, 20001, 20002, 20003, 29001])
+        self.assertEqual(self.rows[0], {
+            "title": "Problem Solving And Object-Oriented Programming",
+            "crn": 10001,
+            "subjectCode": "CS",
+            "courseCode": "18000",
+            "sched": "Lecture",
+            "instructors": ["Alice M. Baker", "Carl Dunn"],
+            "catalogLink": "https://selfservice.mypurdue.purdue.edu/prod/bwckctlg.p_display_courses?term_in=202510&one_subj=CS&sel_crse_strt=18000&sel_crse_end=18000&sel_subj=&sel_levl=&sel_schd=&sel_coll=&sel_divs=&sel_dept=&sel_attr=",
+        })
+
+    def test_title_is_inner_html(self):
+        # like get_attribute("innerHTML"), entities stay escaped; scrape.py unescapes titles later
+        self.assertEqual(self.rows[-1]["title"], "Independent Study &amp; Research")
+
+    def test_instructor_text(self):
+        # whitespace collapses and the "(P)" primary marker is dropped, as in WebElement.text
+        self.assertEqual(self.rows[2]["instructors"], ["Grace Hall"])
+        self.assertEqual(self.rows[4]["instructors"], ["TBA"])
+
+    def test_last_meeting_row(self):
+        # a section meeting on two patterns takes its schedule type from the last row
+        self.assertEqual(self.rows[2]["sched"], "Lecture")
+        self.assertEqual(self.rows[4]["sched"], "Practice Study Observation")
+
+    def test_base_url(self):
+        rows = parse_sections(fixture("results_CS.html"), "http://localhost:8000/prod/bwckschd.p_get_crse_unsec")
+        self.assertTrue(rows[0]["catalogLink"].startswith("http://localhost:8000/prod/bwckctlg.p_display_courses?"))
+
+    def test_no_classes(self):
+        page = fixture("no_classes.html")
+        self.assertIsNone(parse_sections(page))
+        self.assertIn(no_classes_text, page)
+
+    def test_cut_short(self):
+        # a page that stops before the sections table has neither the table nor the message
+        page = fixture("results_CS.html")
+        page = page[:page.index("<table  CLASS=\"datadisplaytable\" SUMMARY=\"This layout table")]
+        self.assertIsNone(parse_sections(page))
+        self.assertNotIn(no_classes_text, page)
+
+
+class TestCatalog(unittest.TestCase):
+    def test_catalog_html(self):
+        content = catalog_html(fixture("catalog", "CS25100.html"))
+        self.assertTrue(content.startswith("\nCredit Hours: 3.00.  Running time analysis"))
+        self.assertIn("hash tables &amp; balanced search trees", content)
+
+    def test_no_catalog_cell(self):
+        self.assertIsNone(catalog_html(fixture("results_CS.html")))
+        self.assertIsNone(catalog_html("<html><body>Service Unavailable</body></html>"))
+
+    def test_parse_catalog(self):
+        description, credits = parse_catalog(catalog_html(fixture("catalog", "CS18000.html")))
+        self.assertEqual(credits, [4, 4])
+        self.assertTrue(description.startswith("Problem solving and algorithms,"))
+        self.assertTrue(description.endswith("Typically offered Fall Spring Summer.<br>"))
+
+    def test_credit_range(self):
+        self.assertEqual(parse_catalog(catalog_html(fixture("catalog", "CS29000.html")))[1], [1, 3])
+        self.assertEqual(parse_catalog("\nCredit Hours: 3.00 or 4.00.  Either.<br>\n")[1], [3, 4])
+
+    def test_unreadable_credits(self):
+        self.assertEqual(parse_catalog("\nCredit Hours: TBD.  Something.<br>\n"), ("Credit Hours: TBD.  Something.<br>", [0, 0]))
+
+
+class TestHelpers(unittest.TestCase):
+    def test_inner_html(self):
+        el = lxml.html.fromstring("<td>a &amp; b\xa0c <b>d</b> &lt;e&gt;</td>")
+        self.assertEqual(inner_html(el), "a &amp; b&nbsp;c <b>d</b> &lt;e&gt;")
+
+    def test_format_instructors(self):
+        # lab and recitation instructors only count when the course has nothing else
+        self.assertEqual(format_instructors({"Lecture": ["A"], "Laboratory": ["B"], "Recitation": ["C"]}), {"Lecture": ["A"]})
+        self.assertEqual(format_instructors({"Laboratory": ["B"], "Recitation": ["C"]}), {"Laboratory": ["B"], "Recitation": ["C"]})
+
+
+if __name__ == "__main__":
+    unittest.main()
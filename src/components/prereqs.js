@@ -1,96 +1,101 @@
 import { useRouter } from 'next/router';
 import Link from 'next/link';
 
+// course.prereqTree is built by server/prereq_parser.py:
+//   { type: "and" | "or", children: [...] } or
+//   { type: "course", subjectCode, courseCode, concurrent, detailId? }
+// courses without one (older data, or prereqs the parser couldn't read) only have the flat
+// course.prereqs token list, which is turned into the same shape here
 const Prereqs = ({ course, scheduler = false }) => {
   const router = useRouter();
 
-  const prereqCourseElement = (token, i) => {
-    if (token.split(' ').length === 2) {
-      const [detailId, concurrent] = token.split(' ');
-      const subjectCodeMatch = token.match(/[A-Z]+/);
-      const courseNumberMatch = token.match(/\d+/);
-
-      if (!subjectCodeMatch || !courseNumberMatch) {
-        return <li><p>Prereq Error! Check Purdue's official prereq report</p></li>;
-      }
-
-      const subjectCode = subjectCodeMatch[0];
-      const courseNumber = courseNumberMatch[0];
+  const prereqCourseElement = (node, i) => {
+    const concurrent = node.concurrent ? " [may be taken concurrently]" : "";
 
+    if (!node.detailId) {
       return <li className='' key={i}>
-        <a
-          onClick={(e) => {
-            if (scheduler) {
-              window.open(`https://www.boilerclasses.com/detail/${detailId}`, '_blank');
-            } else {
-              router.push(`/detail/${detailId}`);
-            }
-          }}
-          className='underline decoration-dotted cursor-pointer hover:text-blue-700 transition-all duration-300 ease-out text-blue-600'
-        >
-          {subjectCode} {courseNumber}
-        </a>
-        {concurrent === "True" ? " [may be taken concurrently]" : ""}
+        {node.subjectCode} {node.courseCode}{concurrent}
       </li>
-    } else if (token.split(' ').length == 3) {
-      const [subject, number, concurrent] = token.split(' ');
-      return <li className='' key={i}>
-        {subject} {number}{concurrent === "True" ? " [may be taken concurrently]" : ""}
-      </li>
-    } else {
-      return `${"()".includes(token) ? "" : " "}${token}${"()".includes(token) ? "" : " "}`;
     }
-  }
 
-  const generatePrereqTree = (tokens) => {
+    return <li className='' key={i}>
+      <a
+        onClick={(e) => {
+          if (scheduler) {
+            window.open(`https://www.boilerclasses.com/detail/${node.detailId}`, '_blank');
+          } else {
+            router.push(`/detail/${node.detailId}`);
+          }
+        }}
+        className='underline decoration-dotted cursor-pointer hover:text-blue-700 transition-all duration-300 ease-out text-blue-600'
+      >
+        {node.subjectCode} {node.courseCode}
+      </a>
+      {concurrent}
+    </li>
+  }
 
-    const stack = [];
-    let currentOp = null;
-    let i = 0;
+  // tokens are "<detailId> <concurrent>", "<subject> <number> <concurrent>", "and", "or", "(" and ")"
+  const legacyCourse = (token) => {
+    const parts = token.split(' ');
+    if (parts.length === 2) {
+      const [detailId, concurrent] = parts;
+      const subjectCodeMatch = detailId.match(/[A-Z]+/);
+      const courseNumberMatch = detailId.match(/\d{5}/);
+      if (!subjectCodeMatch || !courseNumberMatch) {
+        return { type: "error" };
+      }
+      return { type: "course", subjectCode: subjectCodeMatch[0], courseCode: courseNumberMatch[0], concurrent: concurrent === "True", detailId };
+    }
+    if (parts.length === 3) {
+      const [subjectCode, courseCode, concurrent] = parts;
+      return { type: "course", subjectCode, courseCode, concurrent: concurrent === "True" };
+    }
+    return { type: "error" };
+  };
 
-    while (i < tokens.length) {
+  // returns [tree, index of the token that ended the group]; within a group the last
+  // and/or seen applies to every child
+  const treeFromTokens = (tokens, start) => {
+    const children = [];
+    let op = null;
+    let i = start;
+    while (i < tokens.length && tokens[i] !== ")") {
       const token = tokens[i];
-
       if (token === "(") {
-
-        const [group, consumed] = generatePrereqTree(tokens.slice(i + 1));
-        stack.push(group);
-
-        //Add an offset to remove all the tokens that were consumed in that sublevel
-        i += consumed + 2;
-
-      } else if (token === ")") {
-        break;
+        const [group, end] = treeFromTokens(tokens, i + 1);
+        children.push(group);
+        i = end + 1;
       } else if (token === "and" || token === "or") {
-        currentOp = token;
+        op = token;
         i++;
       } else {
-        stack.push({ type: "course", value: prereqCourseElement(token, i) });
+        children.push(legacyCourse(token));
         i++;
       }
     }
+    return [children.length === 1 ? children[0] : { type: op ?? "and", children }, i];
+  };
 
-    if (stack.length === 1) return [stack[0], i];
-
-    return [
-      {
-        type: "group",
-        op: currentOp ?? "and",
-        children: stack,
-      },
-      i,
-    ];
+  const firstCourse = (node) => {
+    while (node.children) {
+      node = node.children[0];
+    }
+    return node;
   };
 
   const renderNode = (node, i) => {
-    // HTML elements were saved directly to the tree for courses
     if (node.type === "course") {
-      return node.value;
+      return prereqCourseElement(node, i);
+    }
+
+    if (node.type === "error") {
+      return <li key={i}><p>Prereq Error! Check Purdue's official prereq report</p></li>;
     }
 
     return (
-      <li key={i + "-" + node.op + node.children.map(child => child.value?.key || child.value).join("")}>
-        {node.op === "and" ? (node.children.length > 2 ? "ALL of:" : "BOTH of:") : "ONE of:"}
+      <li key={i + "-" + node.type}>
+        {node.type === "and" ? (node.children.length > 2 ? "ALL of:" : "BOTH of:") : "ONE of:"}
         <ul style={{ paddingLeft: "1em" }}>
           {node.children.map((child, i) => (
             renderNode(child, i)
@@ -100,20 +105,10 @@ const Prereqs = ({ course, scheduler = false }) => {
     );
   };
 
-  const parsePrereqs = (prereqs) => {
-
-    const [tree] = generatePrereqTree(prereqs);
-
-    return (
-      <div>
-        <ul>{renderNode(tree, 0)}</ul>
-      </div>
-    );
-  };
-
   try {
+    const tree = course.prereqTree ?? (course.prereqs?.length > 0 ? treeFromTokens(course.prereqs, 0)[0] : null);
     return (
-      (course.prereqs && course.prereqs.length > 0 && course.prereqs[0].split(' ')[0] !== router.query.id) && (
+      (tree && firstCourse(tree).detailId !== router.query.id) && (
         <div className="prerequisites-container">
           {!scheduler && (
             <div className="font-semibold lg:text-sm text-xs text-tertiary border-b border-[rgb(var(--background-secondary-color))] mb-2">
@@ -121,7 +116,9 @@ const Prereqs = ({ course, scheduler = false }) => {
             </div>
           )}
           <div className="lg:text-sm text-xs text-tertiary font-medium">
-            {parsePrereqs(course.prereqs)}
+            <div>
+              <ul>{renderNode(tree, 0)}</ul>
+            </div>
           </div>
         </div>
       )
@@ -132,4 +129,4 @@ const Prereqs = ({ course, scheduler = false }) => {
   }
 };
 
-export default Prereqs;
\ No newline at end of file
+export default Prereqs;
@@ -0,0 +1,68 @@
+import { promises as fs } from 'fs';
+import path from 'path';
+
+// pre-built API responses written by server/static_api.py
+const root = path.join(process.cwd(), 'static_api');
+
+let etags = null;
+let etagsModified = 0;
+
+// etags.json is rewritten by every pipeline run, so reload it whenever it changes
+async function loadEtags() {
+  try {
+    const file = path.join(root, 'etags.json');
+    const modified = (await fs.stat(file)).mtimeMs;
+    if (modified !== etagsModified) {
+      etags = JSON.parse(await fs.readFile(file, 'utf8'));
+      etagsModified = modified;
+    }
+  } catch {
+    etags = null;
+    etagsModified = 0;
+  }
+  return etags;
+}
+
+// answers with the pre-built file for key ("course/<detailId>" or "dir/<SUBJECT>"), compressed
+// the way the client accepts, or a 304 if the client's copy is current. returns false, without
+// touching res, when there is no such file.
+export async function sendStatic(req, res, key) {
+  const known = await loadEtags();
+  if (!known || !Object.prototype.hasOwnProperty.call(known, key)) {
+    return false;
+  }
+
+  // every encoding has the same content, hence a weak ETag
+  const etag = `W/"${known[key]}"`;
+  const accepted = req.headers['accept-encoding'] || '';
+  const [suffix, encoding] = /\bbr\b/.test(accepted) ? ['.json.br', 'br']
+    : /\bgzip\b/.test(accepted) ? ['.json.gz', 'gzip']
+      : ['.json', null];
+
+  const ifNoneMatch = (req.headers['if-none-match'] || '').split(',').map((tag) => tag.trim().replace(/^W\//, ''));
+  const fresh = ifNoneMatch.includes(etag.slice(2)) || ifNoneMatch.includes('*');
+
+  let body = null;
+  if (!fresh) {
+    try {
+      body = await fs.readFile(path.join(root, key + suffix));
+    } catch {
+      return false;
+    }
+  }
+
+  res.setHeader('ETag', etag);
+  res.setHeader('Vary', 'Accept-Encoding');
+  res.setHeader('Cache-Control', 'public, max-age=0, must-revalidate');
+  if (fresh) {
+    res.status(304).end();
+    return true;
+  }
+  res.setHeader('Content-Type', 'application/json; charset=utf-8');
+  if (encoding) {
+    res.setHeader('Content-Encoding', encoding);
+  }
+  res.setHeader('Content-Length', body.length);
+  res.status(200).end(body);
+  return true;
+}
@@ -0,0 +1,18 @@
+import { searchCourses } from "../../lib/redis"
+import { sendStatic } from "../../lib/staticApi"
+
+const levels = ["100", "200", "300", "400", "500", "600", "700", "800", "900"];
+const scheduleTypes = ["Clinic", "Distance Learning", "Experiential", "Individual Study", "Laboratory", "Laboratory Preparation",
+  "Lecture", "Practice Study Observation", "Presentation", "Recitation", "Research", "Studio"];
+
+// every course in a subject, for /dir/<subject>
+export default async function handler(req, res) {
+  if (req.method === 'GET') {
+    const subject = req.query.subject;
+    if (/^[A-Za-z0-9]+$/.test(subject) && await sendStatic(req, res, `dir/${subject}`)) {
+      return;
+    }
+    const courses = await searchCourses("", [subject], [""], [""], 0, 18, levels, scheduleTypes, 1000);
+    res.status(200).json({ courses });
+  }
+}
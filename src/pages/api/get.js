@@ -1,9 +1,14 @@
 import { getCourse } from "../../lib/redis"
+import { sendStatic } from "../../lib/staticApi"
 
 export default async function handler(req, res) {
   if (req.method === 'GET') {
     const detailId = req.query.detailId;
+    // served from disk when the pipeline has written the course out, Redis otherwise
+    if (/^[A-Za-z0-9]+$/.test(detailId) && await sendStatic(req, res, `course/${detailId}`)) {
+      return;
+    }
     const course = await getCourse(detailId);
     res.status(200).json({ course });
   }
-}
\ No newline at end of file
+}
@@ -66,22 +66,8 @@ const SubjectDirectory = ({ courses, subject }) => {
 };
 
 export async function getServerSideProps(context) {
-  const params = new URLSearchParams({
-    q: "", sub: context.params.subj, term: [], gen: [], cmin: 0, cmax: 18, levels: [100, 200, 300, 400, 500, 600, 700, 800, 900], sched: ["Clinic",
-      "Distance Learning",
-      "Experiential",
-      "Individual Study",
-      "Laboratory",
-      "Laboratory Preparation",
-      "Lecture",
-      "Practice Study Observation",
-      "Presentation",
-      "Recitation",
-      "Research",
-      "Studio"],
-    maxlim: 1000
-  });
-  const response = await fetch('http://localhost:3000/api/search?' + params);
+  const params = new URLSearchParams({ subject: context.params.subj });
+  const response = await fetch('http://localhost:3000/api/dir?' + params);
   const data = await response.json();
   return {
     props: {
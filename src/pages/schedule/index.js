@@ -344,7 +344,7 @@ const Schedule = () => {
                     </div>
 
                     {/* Prerequisites Display */}
-                    {selectedCourse.prereqs && (
+                    {(selectedCourse.prereqTree || selectedCourse.prereqs?.length > 0) && (
                       <div className='w-full'>
                         <p className="text-sm font-bold">Prerequisites</p>
                         <Prereqs